@@ -24,5 +24,11 @@ class User(AbstractUser):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]  # keep username required for display
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Admin user list, newest first
+            models.Index(fields=['-date_joined', '-id'], name='user_joined_idx'),
+        ]
+
     def __str__(self):
         return f"{self.username} ({self.role})"
@@ -36,7 +36,7 @@ class LoginView(generics.GenericAPIView):
 
 # Admin endpoint: list users (admin only)
 class AdminUserListView(generics.ListAPIView):
-    queryset = User.objects.all()
+    queryset = User.objects.all().order_by('-date_joined')
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated, IsAdmin]
 
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import AdminOverviewView
+from .views import AdminOverviewView, CacheStatsView
 
 urlpatterns = [
     path('overview/', AdminOverviewView.as_view(), name='admin-overview'),
+    path('cache-stats/', CacheStatsView.as_view(), name='admin-cache-stats'),
 ]
@@ -1,11 +1,10 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from django.db.models import Sum, Count
-from apps.members.models import Member
-from apps.loans.models import Loan
-from apps.savings.models import Deposit, Withdrawal
-from apps.staff.models import Staff
+from apps.core.cache import (
+    cache_stats, cached_response, get_data_version, registry, reset_cache_stats,
+)
+from apps.core.totals import SaccoTotals
 
 
 class AdminOverviewView(APIView):
@@ -15,41 +14,52 @@ class AdminOverviewView(APIView):
     """
     permission_classes = [permissions.IsAdminUser]
 
+    @cached_response("admin-overview")
     def get(self, request):
         try:
-            total_members = Member.objects.count()
-            active_members = Member.objects.filter(is_active=True).count()
-
-            total_loans = Loan.objects.count()
-            approved_loans = Loan.objects.filter(status="APPROVED").count()
-            pending_loans = Loan.objects.filter(status="PENDING").count()
-            total_loan_amount = Loan.objects.aggregate(total=Sum("amount"))["total"] or 0
-
-            total_deposits = Deposit.objects.aggregate(total=Sum("amount"))["total"] or 0
-            total_withdrawals = Withdrawal.objects.aggregate(total=Sum("amount"))["total"] or 0
-            total_balance = total_deposits - total_withdrawals
-
-            staff_count = Staff.objects.count()
+            totals = SaccoTotals.for_request(request)
+            head_counts = totals.head_counts
+            loans = totals.loans
+            total_deposits = totals.deposits.all.total
+            total_withdrawals = totals.withdrawals.all.total
 
             return Response({
                 "members": {
-                    "total": total_members,
-                    "active": active_members
+                    "total": head_counts.members,
+                    "active": head_counts.active_members
                 },
                 "loans": {
-                    "total": total_loans,
-                    "approved": approved_loans,
-                    "pending": pending_loans,
-                    "total_amount": total_loan_amount
+                    "total": loans.all.count,
+                    "approved": loans.status("approved").count,
+                    "pending": loans.status("pending").count,
+                    "total_amount": loans.all.total
                 },
                 "savings": {
                     "total_deposits": total_deposits,
                     "total_withdrawals": total_withdrawals,
-                    "total_balance": total_balance
+                    "total_balance": total_deposits - total_withdrawals
                 },
                 "staff": {
-                    "total": staff_count
+                    "total": head_counts.staff
                 }
             }, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class CacheStatsView(APIView):
+    """
+    Hit/miss/stale/refresh counters of the dashboard response cache.
+    DELETE resets the counters. Accessible to admins only.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            "data_version": get_data_version(),
+            "endpoints": cache_stats(registry),
+        }, status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        reset_cache_stats(registry)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,185 @@
+"""
+Arrears aging and portfolio at risk (PAR).
+
+For each approved loan on a day `as_of`:
+- expected: what its schedule said was due before that day, read from the
+  last overdue LoanInstallment's cumulative_amount
+- paid: its repayments up to the end of the day
+- days in arrears: days since the oldest installment the repayments do not
+  cover (the first whose cumulative_amount exceeds paid)
+
+Loans are processed in chunks of consecutive IDs with one query per chunk:
+each value above is a correlated index seek on the installment and
+repayment tables, so the database does the comparison and only one row per
+loan comes back. The query is raw SQL because it needs a materialized CTE,
+which the ORM cannot express. Results replace the day's snapshot: one
+PortfolioAtRisk row per aging bucket plus one LoanArrears row per loan
+behind schedule, written with insert_rows().
+Loans without a stored schedule (see generate_loan_schedules) are counted
+as current.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+
+from apps.core.dates import day_start
+from apps.core.updates import insert_rows
+from apps.loans.models import Loan, LoanInstallment, LoanRepayment
+
+from .models import LoanArrears, PortfolioAtRisk
+
+CHUNK_SIZE = 20000
+CENTS = Decimal("0.01")
+# bucket -> lowest days in arrears it holds, in ascending order
+BUCKETS = {"current": 0, "1_30": 1, "31_60": 31, "61_90": 61, "90_plus": 91}
+# PARn: share of the outstanding portfolio in loans more than n days behind
+PAR_DAYS = (30, 60, 90)
+
+
+def bucket_for(days):
+    name = "current"
+    for bucket, low in BUCKETS.items():
+        if days >= low:
+            name = bucket
+    return name
+
+
+def _positions_sql(connection):
+    """
+    One row per approved loan in an ID range: (loan_id, member_id,
+    outstanding, expected, paid, oldest_unpaid_due_date). `paid` is
+    computed once per loan in a materialized CTE, so the oldest unpaid
+    installment search compares against it instead of re-summing the
+    repayments for every installment it reads.
+    """
+    quote = connection.ops.quote_name
+    loan, installment, repayment = (quote(m._meta.db_table) for m in (Loan, LoanInstallment, LoanRepayment))
+    materialized = "MATERIALIZED" if connection.vendor in ("postgresql", "sqlite") else ""
+    return f"""
+        WITH positions AS {materialized} (
+            SELECT l.id AS loan_id, l.member_id, l.balance,
+                COALESCE((
+                    SELECT i.cumulative_amount FROM {installment} i
+                    WHERE i.loan_id = l.id AND i.due_date < %s ORDER BY i.number DESC LIMIT 1
+                ), 0) AS expected,
+                COALESCE((
+                    SELECT SUM(r.amount) FROM {repayment} r WHERE r.loan_id = l.id AND r.date < %s
+                ), 0) AS paid
+            FROM {loan} l
+            WHERE l.status = 'approved' AND l.id >= %s AND l.id <= %s
+        )
+        SELECT loan_id, member_id, balance, expected, paid,
+            CASE WHEN expected > paid THEN (
+                SELECT i.due_date FROM {installment} i
+                WHERE i.loan_id = positions.loan_id AND i.due_date < %s AND i.cumulative_amount > positions.paid
+                ORDER BY i.number LIMIT 1
+            ) END
+        FROM positions
+    """
+
+
+def _money(value):
+    # SQLite hands back NUMERIC columns as floats
+    return (value if isinstance(value, Decimal) else Decimal(str(value))).quantize(CENTS)
+
+
+def _date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def loan_positions(as_of, first, last):
+    """
+    (loan_id, member_id, outstanding, expected, paid, oldest_unpaid_due_date)
+    for the approved loans with IDs in [first, last]; the due date is None
+    for loans not behind schedule.
+    """
+    connection = connections[router.db_for_read(Loan)]
+    ops = connection.ops
+    day = ops.adapt_datefield_value(as_of)
+    cutoff = ops.adapt_datetimefield_value(day_start(as_of + timedelta(days=1)))
+    with connection.cursor() as cursor:
+        cursor.execute(_positions_sql(connection), [day, cutoff, first, last, day])
+        for loan_id, member_id, outstanding, expected, paid, oldest in cursor.fetchall():
+            yield loan_id, member_id, _money(outstanding), _money(expected), _money(paid), _date(oldest)
+
+
+ARREARS_COLUMNS = ("as_of", "loan", "member", "days_in_arrears", "bucket", "arrears", "outstanding")
+
+
+def _chunks(chunk_size):
+    last = 0
+    while True:
+        ids = list(
+            Loan.objects.filter(status="approved", pk__gt=last).order_by("pk").values_list("pk", flat=True)[:chunk_size]
+        )
+        if not ids:
+            return
+        yield ids[0], ids[-1]
+        last = ids[-1]
+
+
+def compute(as_of, chunk_size=CHUNK_SIZE):
+    """Replace the snapshot for `as_of`. Returns {bucket: {"loans", "outstanding", "arrears"}}."""
+    zero = Decimal("0")
+    totals = {bucket: {"loans": 0, "outstanding": zero, "arrears": zero} for bucket in BUCKETS}
+    with transaction.atomic():
+        LoanArrears.objects.filter(as_of=as_of).delete()
+        PortfolioAtRisk.objects.filter(as_of=as_of).delete()
+        for first, last in _chunks(chunk_size):
+            behind = []
+            for loan_id, member_id, outstanding, expected, paid, oldest in loan_positions(as_of, first, last):
+                arrears = max(expected - paid, zero)
+                days = (as_of - oldest).days if arrears and oldest else 0
+                bucket = bucket_for(days)
+                row = totals[bucket]
+                row["loans"] += 1
+                row["outstanding"] += outstanding
+                row["arrears"] += arrears
+                if days:
+                    behind.append((as_of, loan_id, member_id, days, bucket, arrears, outstanding))
+            insert_rows(LoanArrears, ARREARS_COLUMNS, behind)
+        PortfolioAtRisk.objects.bulk_create([
+            PortfolioAtRisk(as_of=as_of, bucket=bucket, **row) for bucket, row in totals.items()
+        ])
+    return totals
+
+
+def latest_date():
+    return PortfolioAtRisk.objects.order_by("-as_of").values_list("as_of", flat=True).first()
+
+
+def summary(as_of):
+    """PAR ratios and the aging buckets stored for `as_of`, or None if it was not computed."""
+    rows = {row.bucket: row for row in PortfolioAtRisk.objects.filter(as_of=as_of)}
+    if not rows:
+        return None
+    zero = Decimal("0")
+    portfolio = sum((row.outstanding for row in rows.values()), zero)
+    at_risk = defaultdict(lambda: zero)
+    for row in rows.values():
+        for n in PAR_DAYS:
+            if BUCKETS[row.bucket] > n:
+                at_risk[n] += row.outstanding
+    return {
+        "as_of": as_of,
+        "computed_at": max(row.computed_at for row in rows.values()),
+        "loans": sum(row.loans for row in rows.values()),
+        "portfolio_outstanding": portfolio,
+        "par": {
+            f"par{n}": {
+                "outstanding": at_risk[n],
+                "ratio": (at_risk[n] / portfolio).quantize(Decimal("0.0001")) if portfolio else zero,
+            }
+            for n in PAR_DAYS
+        },
+        "buckets": {
+            bucket: {
+                "loans": rows[bucket].loans if bucket in rows else 0,
+                "outstanding": rows[bucket].outstanding if bucket in rows else zero,
+                "arrears": rows[bucket].arrears if bucket in rows else zero,
+            }
+            for bucket in BUCKETS
+        },
+    }
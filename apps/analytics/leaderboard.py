@@ -0,0 +1,155 @@
+"""
+Top-K savers and borrowers.
+
+All-time rankings read the denormalized Member.savings_balance and
+Member.loan_balance columns through their indexes. Monthly and yearly
+rankings read LeaderboardEntry rows that are kept up to date on every
+deposit/loan write, so no request groups the transaction tables.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncYear
+from django.utils import timezone
+
+from .models import LeaderboardEntry
+from .rollup import increment_many
+
+PERIODS = ("all", "month", "year")
+MAX_K = 100
+
+# model label -> (board, datetime that places the row in a period, statuses that count)
+BOARDS = {
+    "savings.Deposit": ("savers", "created_at", ("approved",)),
+    "loans.Loan": ("borrowers", "approved_on", ("approved", "completed")),
+}
+
+# Column ranked for the all-time boards
+BALANCE_FIELDS = {
+    "savers": "savings_balance",
+    "borrowers": "loan_balance",
+}
+
+# What a board's "total" is, per period: the all-time boards rank current
+# balances, the monthly and yearly ones what was deposited or borrowed
+MEASURES = {
+    "savers": {"all": "savings_balance", "month": "total_deposited", "year": "total_deposited"},
+    "borrowers": {"all": "outstanding_balance", "month": "total_borrowed", "year": "total_borrowed"},
+}
+
+
+def fields_for(label):
+    """Model fields a leaderboard contribution depends on."""
+    spec = BOARDS.get(label)
+    if spec is None:
+        return set()
+    return {"member_id", "amount", "status", spec[1]}
+
+
+def period_start(day, period):
+    if period == "year":
+        return date(day.year, 1, 1)
+    return day.replace(day=1)
+
+
+def contributions(label, state):
+    """Return {(board, period, period_start, member_id): amount} for one row."""
+    spec = BOARDS.get(label)
+    if spec is None or not state:
+        return {}
+    board, when, statuses = spec
+    moment = state.get(when)
+    if moment is None or state["status"] not in statuses:
+        return {}
+    day = timezone.localdate(moment) if timezone.is_aware(moment) else moment.date()
+    amount = Decimal(state["amount"] or 0)
+    return {
+        (board, period, period_start(day, period), state["member_id"]): amount
+        for period in ("month", "year")
+    }
+
+
+def apply_change(label, old_state, new_state):
+    """Move a row's contribution between leaderboard entries."""
+    apply_changes(label, [(old_state, new_state)])
+
+
+def apply_changes(label, changes):
+    """Apply many (old_state, new_state) moves, one update per affected entry."""
+    deltas = defaultdict(Decimal)
+    for old_state, new_state in changes:
+        for key, amount in contributions(label, old_state).items():
+            deltas[key] -= amount
+        for key, amount in contributions(label, new_state).items():
+            deltas[key] += amount
+    changes = [
+        ({"board": board, "period": period, "period_start": start, "member_id": member_id}, {"total": amount})
+        for (board, period, start, member_id), amount in deltas.items()
+        if amount
+    ]
+    if changes:
+        increment_many(LeaderboardEntry, changes)
+
+
+def top(board, period="all", k=5):
+    """
+    Return the top `k` members of `board` ("savers" or "borrowers") for
+    `period` ("all", "month" or "year") as [{"member", "username", "total"}].
+    """
+    if period == "all":
+        Member = apps.get_model("members", "Member")
+        field = BALANCE_FIELDS[board]
+        rows = (
+            Member.objects.filter(**{f"{field}__gt": 0})
+            .order_by(f"-{field}", "id")
+            .values("id", "user__username", field)[:k]
+        )
+        return [{"member": r["id"], "username": r["user__username"], "total": r[field]} for r in rows]
+
+    rows = (
+        LeaderboardEntry.objects.filter(
+            board=board, period=period,
+            period_start=period_start(timezone.localdate(), period),
+            total__gt=0,
+        )
+        .order_by("-total", "member")
+        .values("member_id", "member__user__username", "total")[:k]
+    )
+    return [
+        {"member": r["member_id"], "username": r["member__user__username"], "total": r["total"]}
+        for r in rows
+    ]
+
+
+def rebuild():
+    """
+    Recompute every LeaderboardEntry from history with one grouped query
+    per board and period. Returns the number of rows written.
+    """
+    rows = []
+    for label, (board, when, statuses) in BOARDS.items():
+        model = apps.get_model(label)
+        for period, trunc in (("month", TruncMonth), ("year", TruncYear)):
+            grouped = (
+                model.objects.filter(status__in=statuses, **{f"{when}__isnull": False})
+                .annotate(start=trunc(when))
+                .values("start", "member_id")
+                .annotate(total=Sum("amount"))
+                .order_by()
+            )
+            for row in grouped:
+                start = row["start"]
+                if hasattr(start, "date"):
+                    start = timezone.localdate(start) if timezone.is_aware(start) else start.date()
+                rows.append(LeaderboardEntry(
+                    board=board, period=period, period_start=start,
+                    member_id=row["member_id"], total=row["total"] or 0,
+                ))
+
+    with transaction.atomic():
+        LeaderboardEntry.objects.all().delete()
+        LeaderboardEntry.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from apps.analytics import rollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailyActivityRollup table from transaction history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", help="First day to rebuild (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="end", help="Last day to rebuild (YYYY-MM-DD).")
+        parser.add_argument("--chunk-days", type=int, default=rollup.CHUNK_DAYS,
+                            help="Days rebuilt per transaction.")
+
+    def handle(self, *args, **options):
+        start = self._date(options["start"], "--from")
+        end = self._date(options["end"], "--to")
+        if start and end and start > end:
+            raise CommandError("--from must be on or before --to.")
+        if options["chunk_days"] < 1:
+            raise CommandError("--chunk-days must be at least 1.")
+
+        written = rollup.rebuild(start, end, options["chunk_days"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt activity rollup: {written} rows written."))
+
+    def _date(self, value, name):
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise CommandError(f"{name} must be a date in YYYY-MM-DD format.")
+        return parsed
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.analytics import leaderboard
+
+
+class Command(BaseCommand):
+    help = "Rebuild monthly and yearly LeaderboardEntry rows from deposits and loans."
+
+    def handle(self, *args, **options):
+        written = leaderboard.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt leaderboards: {written} rows written."))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('kind', models.CharField(choices=[('member', 'New member'), ('deposit', 'Deposit'), ('withdrawal', 'Withdrawal'), ('loan', 'Loan'), ('repayment', 'Loan repayment')], max_length=20)),
+                ('status', models.CharField(blank=True, default='', max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+            options={
+                'ordering': ['day', 'kind', 'status'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'kind', 'status'), name='unique_daily_rollup_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('members', '0004_alter_member_loan_balance_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('savers', 'Top savers'), ('borrowers', 'Top borrowers')], max_length=20)),
+                ('period', models.CharField(choices=[('month', 'Month'), ('year', 'Year')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='members.member')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['board', 'period', 'period_start', '-total', 'member'], name='leaderboard_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('board', 'period', 'period_start', 'member'), name='unique_leaderboard_entry')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_leaderboardentry'),
+        ('loans', '0005_loaninstallment_cumulative_amount'),
+        ('members', '0005_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioAtRisk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField()),
+                ('bucket', models.CharField(choices=[('current', 'Current'), ('1_30', '1-30 days'), ('31_60', '31-60 days'), ('61_90', '61-90 days'), ('90_plus', 'Over 90 days')], max_length=10)),
+                ('loans', models.PositiveIntegerField(default=0)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('arrears', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['as_of', 'bucket'],
+                'constraints': [models.UniqueConstraint(fields=('as_of', 'bucket'), name='unique_par_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LoanArrears',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField()),
+                ('days_in_arrears', models.PositiveIntegerField()),
+                ('bucket', models.CharField(choices=[('current', 'Current'), ('1_30', '1-30 days'), ('31_60', '31-60 days'), ('61_90', '61-90 days'), ('90_plus', 'Over 90 days')], max_length=10)),
+                ('arrears', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('outstanding', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='arrears', to='loans.loan')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loan_arrears', to='members.member')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['as_of', '-days_in_arrears', '-id'], name='arrears_days_idx'), models.Index(fields=['as_of', 'bucket', '-days_in_arrears', '-id'], name='arrears_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('as_of', 'loan'), name='unique_loan_arrears')],
+            },
+        ),
+    ]
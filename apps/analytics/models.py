@@ -1,3 +1,125 @@
 from django.db import models
 
-# Create your models here.
+
+class DailyActivityRollup(models.Model):
+    """
+    Pre-aggregated activity per day, transaction kind and status.
+    Maintained incrementally by apps/analytics/signals.py and rebuilt from
+    history with `manage.py rebuild_activity_rollup`.
+    Dashboards read O(days in range) rows instead of scanning every transaction.
+    """
+    KIND_CHOICES = [
+        ("member", "New member"),
+        ("deposit", "Deposit"),
+        ("withdrawal", "Withdrawal"),
+        ("loan", "Loan"),
+        ("repayment", "Loan repayment"),
+    ]
+
+    day = models.DateField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Blank for kinds that have no status (members, repayments)
+    status = models.CharField(max_length=20, blank=True, default="")
+    count = models.BigIntegerField(default=0)
+    total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["day", "kind", "status"]
+        constraints = [
+            models.UniqueConstraint(fields=["day", "kind", "status"], name="unique_daily_rollup_bucket"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.kind}/{self.status or '-'}: {self.count} ({self.total})"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Running per-member totals for one leaderboard period, e.g. the amount a
+    member deposited this month. Maintained incrementally on write so top-K
+    reads walk an index instead of grouping every transaction.
+    All-time rankings read Member.savings_balance / loan_balance directly.
+    """
+    BOARD_CHOICES = [
+        ("savers", "Top savers"),
+        ("borrowers", "Top borrowers"),
+    ]
+    PERIOD_CHOICES = [
+        ("month", "Month"),
+        ("year", "Year"),
+    ]
+
+    board = models.CharField(max_length=20, choices=BOARD_CHOICES)
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    member = models.ForeignKey("members.Member", on_delete=models.CASCADE, related_name="leaderboard_entries")
+    total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["board", "period", "period_start", "member"], name="unique_leaderboard_entry"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["board", "period", "period_start", "-total", "member"], name="leaderboard_rank_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.board} {self.period} {self.period_start}: member #{self.member_id} = {self.total}"
+
+
+class PortfolioAtRisk(models.Model):
+    """
+    Approved loans in one arrears aging bucket on one day: how many, their
+    outstanding balance and the overdue amount. Written by
+    `manage.py compute_portfolio_at_risk` (apps/analytics/arrears.py);
+    PAR30/60/90 are read from these rows.
+    """
+    BUCKET_CHOICES = [
+        ("current", "Current"),
+        ("1_30", "1-30 days"),
+        ("31_60", "31-60 days"),
+        ("61_90", "61-90 days"),
+        ("90_plus", "Over 90 days"),
+    ]
+
+    as_of = models.DateField()
+    bucket = models.CharField(max_length=10, choices=BUCKET_CHOICES)
+    loans = models.PositiveIntegerField(default=0)
+    outstanding = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    arrears = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["as_of", "bucket"]
+        constraints = [
+            models.UniqueConstraint(fields=["as_of", "bucket"], name="unique_par_bucket"),
+        ]
+
+    def __str__(self):
+        return f"{self.as_of} {self.bucket}: {self.loans} loans, {self.outstanding} outstanding"
+
+
+class LoanArrears(models.Model):
+    """An approved loan behind its schedule on `as_of`, with how far behind."""
+    as_of = models.DateField()
+    loan = models.ForeignKey("loans.Loan", on_delete=models.CASCADE, related_name="arrears")
+    member = models.ForeignKey("members.Member", on_delete=models.CASCADE, related_name="loan_arrears")
+    days_in_arrears = models.PositiveIntegerField()
+    bucket = models.CharField(max_length=10, choices=PortfolioAtRisk.BUCKET_CHOICES)
+    arrears = models.DecimalField(max_digits=14, decimal_places=2)
+    outstanding = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["as_of", "loan"], name="unique_loan_arrears"),
+        ]
+        indexes = [
+            # A day's loans in arrears, furthest behind first (id breaks ties)
+            models.Index(fields=["as_of", "-days_in_arrears", "-id"], name="arrears_days_idx"),
+            models.Index(fields=["as_of", "bucket", "-days_in_arrears", "-id"], name="arrears_bucket_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.as_of} loan #{self.loan_id}: {self.days_in_arrears} days, {self.arrears} overdue"
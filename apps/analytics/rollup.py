@@ -0,0 +1,276 @@
+"""
+Incremental maintenance and querying of DailyActivityRollup.
+
+Each tracked model maps to a (day, kind, status) bucket. Writes move one
+unit of count/amount from the old bucket to the new one; reads aggregate
+rollup rows, so their cost depends on the date range, not on table size.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, DecimalField, F, Max, Min, Sum, Value
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from apps.core.dates import datetime_range_filter
+from apps.core.updates import add_by_pk
+
+from .models import DailyActivityRollup
+
+CHUNK_DAYS = 31
+
+# model label -> (rollup kind, datetime field, status field or None, amount field or None)
+TRACKED = {
+    "members.Member": ("member", "joined_on", None, None),
+    "savings.Deposit": ("deposit", "created_at", "status", "amount"),
+    "savings.Withdrawal": ("withdrawal", "created_at", "status", "amount"),
+    "loans.Loan": ("loan", "requested_on", "status", "amount"),
+    "loans.LoanRepayment": ("repayment", "date", None, "amount"),
+}
+
+
+def tracked_models():
+    return [apps.get_model(label) for label in TRACKED]
+
+
+def fields_for(label):
+    """Model fields a rollup bucket depends on."""
+    spec = TRACKED.get(label)
+    if spec is None:
+        return set()
+    _, when, status_field, amount_field = spec
+    return {f for f in (when, status_field, amount_field) if f}
+
+
+def _day(moment):
+    return timezone.localdate(moment) if timezone.is_aware(moment) else moment.date()
+
+
+def bucket_for(state, spec):
+    """
+    Return the (day, kind, status, amount) a row contributes, given a
+    mapping of its field values, or None if it has no timestamp yet.
+    """
+    kind, when, status_field, amount_field = spec
+    moment = state.get(when)
+    if moment is None:
+        return None
+    day = _day(moment)
+    status = state[status_field] if status_field else ""
+    amount = state[amount_field] if amount_field else 0
+    return day, kind, status, Decimal(amount or 0)
+
+
+def diff(old, new):
+    """Build the deltas that move a row from bucket `old` to bucket `new`."""
+    deltas = defaultdict(lambda: [0, Decimal("0")])
+    if old == new:
+        return deltas
+    if old is not None:
+        key = old[:3]
+        deltas[key][0] -= 1
+        deltas[key][1] -= old[3]
+    if new is not None:
+        key = new[:3]
+        deltas[key][0] += 1
+        deltas[key][1] += new[3]
+    return deltas
+
+
+def increment(model, lookup, **amounts):
+    """
+    Add `amounts` to the row matching `lookup` with a single F() update,
+    creating the row if it does not exist yet.
+    """
+    changes = {field: F(field) + value for field, value in amounts.items()}
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **amounts)
+    except IntegrityError:
+        # Another writer created the row first
+        model.objects.filter(**lookup).update(**changes)
+
+
+def increment_many(model, changes, batch_size=500):
+    """
+    Apply many increments at once: `changes` is [(lookup, {field: amount})].
+    Per batch, existing rows are found with one query and updated through
+    one executemany(); missing rows are bulk created.
+    """
+    if len(changes) == 1:
+        lookup, amounts = changes[0]
+        increment(model, lookup, **amounts)
+        return
+    for start in range(0, len(changes), batch_size):
+        _increment_batch(model, changes[start:start + batch_size])
+
+
+def _increment_batch(model, changes):
+    keys = list(changes[0][0])
+    fields = list(changes[0][1])
+    # One IN list per key column: a superset of the rows wanted, matched below
+    candidates = model.objects.filter(**{f"{k}__in": {lookup[k] for lookup, _ in changes} for k in keys})
+    existing = {tuple(row[k] for k in keys): row["pk"] for row in candidates.values("pk", *keys)}
+
+    updates, missing = {}, []
+    for lookup, amounts in changes:
+        pk = existing.get(tuple(lookup[k] for k in keys))
+        if pk is None:
+            missing.append((lookup, amounts))
+        else:
+            updates[pk] = amounts
+
+    with transaction.atomic():
+        add_by_pk(model, updates, fields)
+        if missing:
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create([model(**lookup, **amounts) for lookup, amounts in missing])
+            except IntegrityError:
+                # Another writer created some of the rows first
+                for lookup, amounts in missing:
+                    increment(model, lookup, **amounts)
+
+
+def apply_deltas(deltas):
+    """
+    Apply {(day, kind, status): [count, total]} to the rollup,
+    creating buckets that do not exist yet.
+    """
+    changes = [
+        ({"day": day, "kind": kind, "status": status}, {"count": count, "total": total})
+        for (day, kind, status), (count, total) in deltas.items()
+        if count or total
+    ]
+    if changes:
+        increment_many(DailyActivityRollup, changes)
+
+
+def apply_change(label, old_state, new_state):
+    """Move a row of model `label` from its old bucket to its new one."""
+    apply_changes(label, [(old_state, new_state)])
+
+
+def apply_changes(label, changes):
+    """
+    Apply many (old_state, new_state) moves for model `label`, with one
+    update per affected bucket rather than one per row.
+    """
+    spec = TRACKED.get(label)
+    if spec is None:
+        return
+    deltas = defaultdict(lambda: [0, Decimal("0")])
+    for old_state, new_state in changes:
+        old = bucket_for(old_state, spec) if old_state else None
+        new = bucket_for(new_state, spec) if new_state else None
+        for key, (count, total) in diff(old, new).items():
+            deltas[key][0] += count
+            deltas[key][1] += total
+    apply_deltas(deltas)
+
+
+def _bounds():
+    """(first, last) day of any tracked row or rollup row, or None if there are none."""
+    days = list(DailyActivityRollup.objects.aggregate(first=Min("day"), last=Max("day")).values())
+    for model in tracked_models():
+        when = TRACKED[model._meta.label][1]
+        days += [_day(moment) for moment in model.objects.aggregate(first=Min(when), last=Max(when)).values()
+                 if moment is not None]
+    days = [day for day in days if day is not None]
+    return (min(days), max(days)) if days else None
+
+
+def _rebuild_range(start, end):
+    """Recompute the rollup rows of [start, end] in one transaction. Returns the number written."""
+    rows = []
+    for model in tracked_models():
+        kind, when, status_field, amount_field = TRACKED[model._meta.label]
+        group_by = ["day"] + ([status_field] if status_field else [])
+        amount = Sum(amount_field) if amount_field else Value(0, output_field=DecimalField())
+        grouped = (
+            model.objects.filter(**datetime_range_filter(when, start, end))
+            .annotate(day=TruncDate(when))
+            .values(*group_by)
+            .annotate(n=Count("id"), amount=amount)
+            .order_by()
+        )
+        for row in grouped:
+            rows.append(DailyActivityRollup(
+                day=row["day"],
+                kind=kind,
+                status=row[status_field] if status_field else "",
+                count=row["n"],
+                total=row["amount"] or 0,
+            ))
+
+    with transaction.atomic():
+        DailyActivityRollup.objects.filter(day__gte=start, day__lte=end).delete()
+        DailyActivityRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def rebuild(start=None, end=None, chunk_days=CHUNK_DAYS):
+    """
+    Recompute rollup rows from history, optionally limited to [start, end]
+    (by default from the first to the last day anything happened). Works
+    through `chunk_days` days at a time, each chunk one grouped range scan
+    per tracked model and its own transaction, so neither the queries nor
+    the locks grow with the history. Returns the number of rows written.
+    """
+    if start is None or end is None:
+        bounds = _bounds()
+        if bounds is None:
+            return 0
+        start, end = start or bounds[0], end or bounds[1]
+
+    written = 0
+    while start <= end:
+        chunk_end = min(start + timedelta(days=chunk_days - 1), end)
+        written += _rebuild_range(start, chunk_end)
+        start = chunk_end + timedelta(days=1)
+    return written
+
+
+def summarize(start=None, end=None):
+    """
+    Return {(kind, status): {"count": int, "total": Decimal}} for the
+    inclusive date range, in one query over the rollup.
+    """
+    queryset = DailyActivityRollup.objects.all()
+    if start:
+        queryset = queryset.filter(day__gte=start)
+    if end:
+        queryset = queryset.filter(day__lte=end)
+    rows = queryset.values("kind", "status").annotate(n=Sum("count"), amount=Sum("total")).order_by()
+    return {
+        (row["kind"], row["status"]): {"count": row["n"] or 0, "total": row["amount"] or 0}
+        for row in rows
+    }
+
+
+def summarize_by_month(start=None, end=None):
+    """
+    Like summarize(), but split per calendar month:
+    {month_start: {(kind, status): {"count", "total"}}}, in one query.
+    """
+    queryset = DailyActivityRollup.objects.all()
+    if start:
+        queryset = queryset.filter(day__gte=start)
+    if end:
+        queryset = queryset.filter(day__lte=end)
+    rows = (
+        queryset.annotate(month=TruncMonth("day", output_field=DateField()))
+        .values("month", "kind", "status")
+        .annotate(n=Sum("count"), amount=Sum("total"))
+        .order_by("month")
+    )
+    months = {}
+    for row in rows:
+        months.setdefault(row["month"], {})[(row["kind"], row["status"])] = {
+            "count": row["n"] or 0, "total": row["amount"] or 0,
+        }
+    return months
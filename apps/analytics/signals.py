@@ -0,0 +1,87 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+
+from apps.core.signals import row_updated, rows_updated
+
+from . import leaderboard, rollup
+
+# model label -> fields whose values drive the rollup and leaderboards
+TRACKED_FIELDS = {
+    label: sorted(rollup.fields_for(label) | leaderboard.fields_for(label))
+    for label in set(rollup.TRACKED) | set(leaderboard.BOARDS)
+}
+
+
+def _state(instance, fields):
+    return {field: getattr(instance, field) for field in fields}
+
+
+def _apply(sender, old_state, new_state):
+    label = sender._meta.label
+    rollup.apply_change(label, old_state, new_state)
+    leaderboard.apply_change(label, old_state, new_state)
+
+
+def remember_tracked_state(sender, instance, **kwargs):
+    """
+    Snapshot the tracked fields of rows loaded from the database so a later
+    save can move their contribution without re-reading the row.
+    """
+    if instance.pk is None:
+        return
+    fields = TRACKED_FIELDS[sender._meta.label]
+    if instance.get_deferred_fields().intersection(fields):
+        return  # loaded with only()/defer(); pre_save will fetch what it needs
+    instance._tracked_state = _state(instance, fields)
+
+
+def fetch_missing_tracked_state(sender, instance, **kwargs):
+    if instance.pk is None or hasattr(instance, "_tracked_state"):
+        return
+    fields = TRACKED_FIELDS[sender._meta.label]
+    instance._tracked_state = sender._base_manager.filter(pk=instance.pk).values(*fields).first()
+
+
+def update_aggregates_on_save(sender, instance, created=False, **kwargs):
+    """
+    Move the row's contribution from its previous state to its current one
+    (e.g. a deposit switching from 'pending' to 'approved').
+    """
+    old = getattr(instance, "_tracked_state", None)
+    new = _state(instance, TRACKED_FIELDS[sender._meta.label])
+    if old != new:
+        _apply(sender, old, new)
+    instance._tracked_state = new
+
+
+def update_aggregates_on_bulk_update(sender, instances, **kwargs):
+    """Like update_aggregates_on_save for many rows, batching the aggregate writes."""
+    label = sender._meta.label
+    fields = TRACKED_FIELDS[label]
+    changes = []
+    for instance in instances:
+        old = getattr(instance, "_tracked_state", None)
+        new = _state(instance, fields)
+        if old != new:
+            changes.append((old, new))
+        instance._tracked_state = new
+    if changes:
+        rollup.apply_changes(label, changes)
+        leaderboard.apply_changes(label, changes)
+
+
+def update_aggregates_on_delete(sender, instance, **kwargs):
+    old = getattr(instance, "_tracked_state", None)
+    if old is None:
+        old = _state(instance, TRACKED_FIELDS[sender._meta.label])
+    _apply(sender, old, None)
+
+
+# Connected per tracked model (lazy "app.Model" senders) so untracked
+# models pay nothing for these handlers.
+for label in TRACKED_FIELDS:
+    post_init.connect(remember_tracked_state, sender=label)
+    pre_save.connect(fetch_missing_tracked_state, sender=label)
+    post_save.connect(update_aggregates_on_save, sender=label)
+    row_updated.connect(update_aggregates_on_save, sender=label)
+    rows_updated.connect(update_aggregates_on_bulk_update, sender=label)
+    post_delete.connect(update_aggregates_on_delete, sender=label)
@@ -0,0 +1,12 @@
+"""Background tasks for analytics (run by `manage.py runworker`)."""
+from datetime import date
+
+from apps.core.jobs import task
+
+from . import arrears
+
+
+@task("analytics.compute_portfolio_at_risk", priority=-10)
+def compute_portfolio_at_risk(as_of):
+    totals = arrears.compute(date.fromisoformat(as_of))
+    return {bucket: row["loans"] for bucket, row in totals.items()}
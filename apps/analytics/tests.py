@@ -1,3 +1,361 @@
-from django.test import TestCase
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.loans import schedule
+from apps.loans.models import Loan, LoanRepayment
+from apps.members.models import Member
+from apps.savings.models import Deposit, Withdrawal
+
+from . import arrears, leaderboard, rollup, trends
+from .models import DailyActivityRollup, LeaderboardEntry, LoanArrears
+
+User = get_user_model()
+
+
+def moment(day):
+    return timezone.make_aware(datetime(day.year, day.month, day.day, 12))
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False)
+class PortfolioAtRiskTests(TestCase):
+    """Days in arrears come from the oldest installment repayments do not cover."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        user = User.objects.create_user(username="member", email="member@example.com", password="x", role="member")
+        member = Member.objects.get(user=user)
+        # 6 flat installments of 1060.00 due on the 10th, February to July
+        cls.late, cls.current = Loan.objects.bulk_create([
+            Loan(member=member, amount=Decimal("6000.00"), balance=Decimal(balance), interest_rate=Decimal("12.00"),
+                 duration_months=6, status="approved", approved_on=moment(date(2025, 1, 10)))
+            for balance in ("4800.00", "2000.00")
+        ])
+        schedule.generate([cls.late, cls.current])
+        LoanRepayment.objects.bulk_create(
+            [LoanRepayment(loan=cls.late, amount=Decimal(a), date=moment(d))
+             for a, d in (("1060.00", date(2025, 2, 10)), ("500.00", date(2025, 3, 10)))]
+            + [LoanRepayment(loan=cls.current, amount=Decimal("1060.00"), date=moment(date(2025, m, 10)))
+               for m in (2, 3, 4, 5)]
+        )
+
+    def test_compute_ages_arrears_and_replaces_the_snapshot(self):
+        as_of = date(2025, 5, 15)
+        arrears.compute(as_of)
+        totals = arrears.compute(as_of)  # re-running replaces, not duplicates
+
+        self.assertEqual(totals["current"]["loans"], 1)
+        self.assertEqual(totals["61_90"]["loans"], 1)
+        row = LoanArrears.objects.get(as_of=as_of)
+        # Four installments due (4240.00), 1560.00 paid: the March one is the oldest unpaid
+        self.assertEqual((row.loan_id, row.days_in_arrears, row.arrears), (self.late.pk, 66, Decimal("2680.00")))
+
+        summary = arrears.summary(as_of)
+        self.assertEqual(summary["portfolio_outstanding"], Decimal("6800.00"))
+        self.assertEqual(summary["par"]["par30"]["outstanding"], Decimal("4800.00"))
+        self.assertEqual(summary["par"]["par90"]["outstanding"], Decimal("0"))
+
+    def test_endpoints_serve_the_latest_snapshot(self):
+        arrears.compute(date(2025, 5, 15))
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        data = client.get("/api/analytics/portfolio-at-risk/").data
+        self.assertEqual(data["as_of"], date(2025, 5, 15))
+        self.assertEqual(data["par"]["par60"]["ratio"], Decimal("0.7059"))
+
+        loans = client.get("/api/analytics/portfolio-at-risk/loans/?bucket=61_90").data
+        self.assertEqual([row["loan"] for row in loans["results"]], [self.late.pk])
+        self.assertEqual(client.get("/api/analytics/portfolio-at-risk/?date=2025-01-01").status_code, 404)
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False)
+class TrendsTests(TestCase):
+    """Activity per day, week or month, read from the daily rollup."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        DailyActivityRollup.objects.all().delete()
+        DailyActivityRollup.objects.bulk_create([
+            DailyActivityRollup(day=date(2024, 12, 31), kind="deposit", status="approved", count=1, total=7),
+            DailyActivityRollup(day=date(2025, 1, 6), kind="deposit", status="approved", count=2, total=100),
+            DailyActivityRollup(day=date(2025, 1, 7), kind="deposit", status="pending", count=1, total=50),
+            DailyActivityRollup(day=date(2025, 1, 7), kind="member", count=3),
+            DailyActivityRollup(day=date(2025, 2, 3), kind="loan", status="approved", count=1, total=5000),
+            DailyActivityRollup(day=date(2025, 2, 4), kind="withdrawal", status="approved", count=1, total=30),
+            DailyActivityRollup(day=date(2026, 6, 1), kind="member", count=1),
+        ])
+
+    def get(self, query):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        return client.get(f"/api/analytics/trends/?{query}")
+
+    def test_month_buckets_keep_their_labels(self):
+        response = self.get("from=2025-01-01&to=2025-03-31")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["months"], ["Jan", "Feb", "Mar"])
+        self.assertEqual(response.data["periods"], [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)])
+        self.assertEqual(response.data["new_members"], [3, 0, 0])
+        self.assertEqual(response.data["loans"], [0, 1, 0])
+        self.assertEqual(response.data["deposits"], [Decimal("150.00"), 0, 0])
+        self.assertEqual(response.data["withdrawals"], [0, Decimal("30.00"), 0])
+
+    def test_week_and_day_buckets(self):
+        weeks = trends.build_trends(date(2025, 1, 1), date(2025, 1, 12), "week")
+        # Weeks start on Monday: the range's first bucket starts before it
+        self.assertEqual(weeks["periods"], [date(2024, 12, 30), date(2025, 1, 6)])
+        self.assertEqual(weeks["deposits"], [0, Decimal("150.00")])
+        self.assertNotIn("months", weeks)
+
+        days = trends.build_trends(date(2025, 1, 6), date(2025, 1, 7), "day")
+        self.assertEqual(days["deposits"], [Decimal("100.00"), Decimal("50.00")])
+        self.assertEqual(days["new_members"], [0, 3])
+
+    def test_multi_year_day_range(self):
+        response = self.get("from=2024-01-01&to=2026-12-31&granularity=day")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["periods"]), 366 + 365 + 365)
+        self.assertEqual(sum(response.data["new_members"]), 4)
+
+    def test_invalid_ranges_are_rejected(self):
+        for query in ("granularity=hour", "from=2025-02-30", "from=2025-03-01&to=2025-01-01",
+                      "from=2000-01-01&to=2025-01-01&granularity=day"):
+            self.assertEqual(self.get(query).status_code, 400, query)
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False)
+class LeaderboardTests(TestCase):
+    """Each leaderboard row is labelled with what it is ranked by."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        cls.saver, cls.borrower = (
+            Member.objects.get(user=User.objects.create_user(
+                username=name, email=f"{name}@example.com", password="x", role="member"))
+            for name in ("saver", "borrower")
+        )
+        Member.objects.filter(pk=cls.saver.pk).update(savings_balance=Decimal("900.00"))
+        Member.objects.filter(pk=cls.borrower.pk).update(loan_balance=Decimal("4200.00"))
+        today = timezone.localdate()
+        LeaderboardEntry.objects.bulk_create([
+            LeaderboardEntry(board=board, period=period, period_start=leaderboard.period_start(today, period),
+                             member=member, total=Decimal(total))
+            for board, member, total in (("savers", cls.saver, "150.00"), ("borrowers", cls.borrower, "5000.00"))
+            for period in ("month", "year")
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_dashboard_labels_balances_for_all_time(self):
+        response = self.client.get("/api/analytics/dashboard/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["top_savers"], [{"username": "saver", "savings_balance": Decimal("900.00")}])
+        self.assertEqual(response.data["top_borrowers"],
+                         [{"username": "borrower", "outstanding_balance": Decimal("4200.00")}])
+
+    def test_dashboard_labels_period_amounts(self):
+        for period in ("month", "year"):
+            response = self.client.get(f"/api/analytics/dashboard/?period={period}")
+            self.assertEqual(response.data["top_savers"],
+                             [{"username": "saver", "total_deposited": Decimal("150.00")}], period)
+            self.assertEqual(response.data["top_borrowers"],
+                             [{"username": "borrower", "total_borrowed": Decimal("5000.00")}], period)
+
+    def test_leaderboard_names_its_measures(self):
+        response = self.client.get("/api/analytics/leaderboard/?period=month&board=borrowers")
+        self.assertEqual(response.data["measures"], {"borrowers": "total_borrowed"})
+        self.assertEqual([row["total"] for row in response.data["borrowers"]], [Decimal("5000.00")])
+
+    def test_contributions_accept_naive_datetimes(self):
+        state = {"member_id": 1, "amount": "10.00", "status": "approved"}
+        naive = leaderboard.contributions("savings.Deposit", {**state, "created_at": datetime(2025, 1, 31, 23)})
+        self.assertEqual(naive[("savers", "month", date(2025, 1, 1), 1)], Decimal("10.00"))
+        self.assertEqual(naive[("savers", "year", date(2025, 1, 1), 1)], Decimal("10.00"))
+        self.assertEqual(leaderboard.contributions("savings.Deposit", {**state, "status": "pending",
+                                                                       "created_at": datetime(2025, 1, 31)}), {})
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False)
+class PerformanceMetricsTests(TestCase):
+    """Monthly approval rates and savings growth, read from the daily rollup by calendar month."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        DailyActivityRollup.objects.all().delete()
+        DailyActivityRollup.objects.bulk_create([
+            DailyActivityRollup(day=date(2024, 10, 31), kind="deposit", status="approved", count=1, total=1000),
+            DailyActivityRollup(day=date(2024, 11, 30), kind="deposit", status="approved", count=1, total=200),
+            DailyActivityRollup(day=date(2024, 12, 1), kind="deposit", status="approved", count=1, total=100),
+            DailyActivityRollup(day=date(2024, 12, 31), kind="deposit", status="pending", count=1, total=150),
+            DailyActivityRollup(day=date(2025, 1, 1), kind="deposit", status="approved", count=2, total=500),
+            DailyActivityRollup(day=date(2025, 1, 1), kind="loan", status="approved", count=3, total=9000),
+            DailyActivityRollup(day=date(2025, 1, 1), kind="loan", status="pending", count=1, total=1000),
+            DailyActivityRollup(day=date(2025, 1, 31), kind="loan", status="completed", count=1, total=2000),
+            DailyActivityRollup(day=date(2025, 2, 1), kind="deposit", status="approved", count=1, total=250),
+            DailyActivityRollup(day=date(2025, 3, 1), kind="deposit", status="approved", count=1, total=999),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def performance(self, months, today=date(2025, 2, 15)):
+        with mock.patch("apps.analytics.trends.timezone.localdate", return_value=today):
+            return trends.monthly_performance(months)
+
+    def test_months_are_calendar_months_across_a_year_boundary(self):
+        monthly = self.performance(3)
+        self.assertEqual([m["period"] for m in monthly], [date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1)])
+        self.assertEqual([m["month"] for m in monthly], ["Dec", "Jan", "Feb"])
+        # Rows on the first and last day of a month land in that month only
+        self.assertEqual([m["deposits"] for m in monthly], [Decimal("250.00"), Decimal("500.00"), Decimal("250.00")])
+        self.assertEqual([m["loans"] for m in monthly], [0, 5, 0])
+        self.assertEqual([m["approved_loans"] for m in monthly], [0, 4, 0])
+        self.assertEqual([m["approval_rate"] for m in monthly], [0, 80.0, 0])
+
+    def test_first_month_growth_uses_the_month_before_the_window(self):
+        self.assertEqual([m["savings_growth_percent"] for m in self.performance(3)],
+                         [Decimal("25.00"), Decimal("100.00"), Decimal("-50.00")])
+        self.assertEqual(self.performance(1, today=date(2024, 11, 1))[0]["savings_growth_percent"], Decimal("-80.00"))
+        # With nothing deposited the month before, the first month has no growth
+        self.assertEqual(self.performance(1, today=date(2024, 10, 1))[0]["savings_growth_percent"], 0)
+
+    def test_months_must_be_between_1_and_120(self):
+        for months in ("0", "121", "abc", "2.5"):
+            response = self.client.get(f"/api/analytics/performance/?months={months}")
+            self.assertEqual(response.status_code, 400, months)
+        response = self.client.get("/api/analytics/performance/?months=120")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["approval_trend"]), 120)
+
+    def test_window_costs_two_queries(self):
+        with mock.patch("apps.analytics.trends.timezone.localdate", return_value=date(2025, 2, 15)):
+            with self.assertNumQueries(2):
+                response = self.client.get("/api/analytics/performance/?months=3")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["months"], 3)
+        self.assertEqual([m["deposits"] for m in response.data["savings_trend"]],
+                         [Decimal("250.00"), Decimal("500.00"), Decimal("250.00")])
+        self.assertEqual(response.data["savings_growth_percent"], Decimal("-50.00"))
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False)
+class FinancialSummaryTests(TestCase):
+    """The per-member breakdown is served a page of members at a time."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        cls.members = [
+            Member.objects.get(user=User.objects.create_user(
+                username=f"m{i}", email=f"m{i}@example.com", password="x", role="member"))
+            for i in range(3)
+        ]
+        Deposit.objects.bulk_create([
+            Deposit(member=member, amount=Decimal(amount), status="approved")
+            for member, amount in zip(cls.members, ("10.00", "20.00", "30.00"))
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_member_groups_are_paginated(self):
+        pages, url = [], "/api/analytics/financials/?group_by=member&page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data["groups"]), 2)
+            pages.append(response.data["groups"])
+            url = response.data["next"]
+
+        groups = [group for page in pages for group in page]
+        self.assertEqual([g["member"] for g in groups], sorted(Member.objects.values_list("id", flat=True)))
+        savings = {g["member"]: g["total_savings"] for g in groups}
+        self.assertEqual([savings[m.pk] for m in self.members], [Decimal("10.00"), Decimal("20.00"), Decimal("30.00")])
+        others = set(savings) - {m.pk for m in self.members}
+        self.assertEqual({savings[pk] for pk in others}, {0} if others else set())
+        # The range still applies to the figures
+        response = self.client.get("/api/analytics/financials/?group_by=member&end=2020-01-01")
+        self.assertEqual({g["total_savings"] for g in response.data["groups"]}, {0})
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False, OUTBOX_DISPATCH="worker")
+class RollupTests(TestCase):
+    """The rollup kept up to date on every write matches one rebuilt from history."""
+
+    @classmethod
+    def setUpTestData(cls):
+        members = [
+            Member.objects.get(user=User.objects.create_user(
+                username=f"m{i}", email=f"m{i}@example.com", password="x", role="member"))
+            for i in range(2)
+        ]
+        members[1].joined_on = moment(date(2025, 1, 3))
+        members[1].save()
+        for n, day in enumerate((date(2025, 1, 1), date(2025, 1, 2), date(2025, 1, 2), date(2025, 1, 9))):
+            deposit = Deposit.objects.create(member=members[n % 2], amount=Decimal(10 * (n + 1)))
+            deposit.created_at, deposit.status = moment(day), "approved" if n % 2 else "pending"
+            deposit.save()
+        Deposit.objects.order_by("pk").last().delete()
+        withdrawal = Withdrawal.objects.create(member=members[0], amount=Decimal("5.00"))
+        withdrawal.created_at = moment(date(2025, 1, 4))
+        withdrawal.save()
+        loan = Loan.objects.create(member=members[1], amount=Decimal("900.00"), requested_on=moment(date(2025, 1, 5)))
+        loan.status = "rejected"
+        loan.save()
+        LoanRepayment.objects.create(loan=loan, amount=Decimal("15.00"), date=moment(date(2025, 1, 6)))
+
+    @staticmethod
+    def rollup_rows():
+        return set(
+            DailyActivityRollup.objects.exclude(count=0, total=0).values_list("day", "kind", "status", "count", "total")
+        )
+
+    def test_rebuild_matches_incremental_updates(self):
+        incremental = self.rollup_rows()
+        self.assertIn((date(2025, 1, 2), "deposit", "approved", 1, Decimal("20.00")), incremental)
+        self.assertIn((date(2025, 1, 5), "loan", "rejected", 1, Decimal("900.00")), incremental)
+        DailyActivityRollup.objects.create(day=date(2024, 12, 1), kind="deposit", status="approved", count=9)
+
+        # Chunks of two days, so groups on both sides of a chunk edge are rebuilt
+        written = rollup.rebuild(chunk_days=2)
+        self.assertEqual(self.rollup_rows(), incremental)
+        self.assertEqual(written, len(incremental))
+
+    def test_rebuild_range_leaves_other_days_alone(self):
+        incremental = self.rollup_rows()
+        DailyActivityRollup.objects.filter(day=date(2025, 1, 2)).update(count=99)
+        DailyActivityRollup.objects.filter(day=date(2025, 1, 4)).update(count=99)
+
+        rollup.rebuild(date(2025, 1, 1), date(2025, 1, 3), chunk_days=1)
+        rows = self.rollup_rows()
+        self.assertEqual({row for row in rows if row[0] <= date(2025, 1, 3)},
+                         {row for row in incremental if row[0] <= date(2025, 1, 3)})
+        self.assertEqual([row[3] for row in rows if row[0] == date(2025, 1, 4)], [99])
@@ -1,9 +1,15 @@
 from django.urls import path
-from .views import AdminDashboardAPIView, AnalyticsTrendsView, FinancialSummaryView, PerformanceMetricsView
+from .views import (
+    AdminDashboardAPIView, AnalyticsTrendsView, FinancialSummaryView, LeaderboardView, LoanArrearsListView,
+    PerformanceMetricsView, PortfolioAtRiskView,
+)
 
 urlpatterns = [
     path("dashboard/", AdminDashboardAPIView.as_view(), name="admin-dashboard"),
+    path("leaderboard/", LeaderboardView.as_view(), name="analytics-leaderboard"),
     path("trends/", AnalyticsTrendsView.as_view(), name="analytics-trends"),
     path("financials/", FinancialSummaryView.as_view(), name="analytics-financials"),
     path("performance/", PerformanceMetricsView.as_view(), name="analytics-performance"),
+    path("portfolio-at-risk/", PortfolioAtRiskView.as_view(), name="analytics-portfolio-at-risk"),
+    path("portfolio-at-risk/loans/", LoanArrearsListView.as_view(), name="analytics-loan-arrears"),
 ]
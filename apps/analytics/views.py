@@ -1,225 +1,326 @@
-from datetime import datetime, timedelta
-from django.apps import apps
-from django.db.models import Sum, Count, F
-from django.utils.timezone import now
+from django.utils.dateparse import parse_date
 from rest_framework import status, permissions, views
 from rest_framework.response import Response
 from apps.accounts.permissions import IsAdmin
+from apps.core.cache import cached_response
+from apps.core.pagination import KeysetPagination
+from apps.core.totals import Figure, SaccoTotals, member_totals
+from apps.members.models import Member
+from . import arrears, leaderboard
+from .models import LoanArrears
+from .trends import build_trends, monthly_performance, parse_range
+
+
+def leaderboard_params(params, default_k=10):
+    """Validate ?k= and ?period= for leaderboard reads. Raises ValueError."""
+    period = params.get("period", "all")
+    if period not in leaderboard.PERIODS:
+        raise ValueError(f"period must be one of: {', '.join(leaderboard.PERIODS)}.")
+    try:
+        k = int(params.get("k", default_k))
+    except ValueError:
+        k = 0
+    if not 1 <= k <= leaderboard.MAX_K:
+        raise ValueError(f"k must be an integer between 1 and {leaderboard.MAX_K}.")
+    return k, period
 
 
 class AdminDashboardAPIView(views.APIView):
     """
     Admin-only dashboard summary for SaccoLink.
-    Includes totals, loan status breakdowns, and top savers/borrowers.
+    Includes totals, loan status breakdowns, and top savers/borrowers
+    (?k= entries, ?period=all|month|year). Each leaderboard row names what
+    it ranks by (leaderboard.MEASURES): savings_balance and
+    outstanding_balance for all time, total_deposited and total_borrowed
+    within a month or year.
     """
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
 
+    @cached_response("analytics-dashboard")
     def get(self, request):
-        # Lazy-load models to avoid circular imports
-        Member = apps.get_model("members", "Member")
-        Deposit = apps.get_model("savings", "Deposit")
-        Withdrawal = apps.get_model("savings", "Withdrawal")
-        Loan = apps.get_model("loans", "Loan")
-        LoanRepayment = apps.get_model("loans", "LoanRepayment")
-
-        data = {}
-
-        # Members
-        data["total_members"] = Member.objects.count()
-
-        # Deposits
-        deposits_agg = Deposit.objects.aggregate(total=Sum("amount"), count=Count("id"))
-        data["total_deposits"] = deposits_agg["total"] or 0
-        data["deposits_count"] = deposits_agg["count"] or 0
-
-        # Withdrawals
-        withdrawals_agg = Withdrawal.objects.aggregate(total=Sum("amount"), count=Count("id"))
-        data["total_withdrawals"] = withdrawals_agg["total"] or 0
-        data["withdrawals_count"] = withdrawals_agg["count"] or 0
-
-        # Loans
-        total_loans = Loan.objects.aggregate(total=Sum("amount"))["total"] or 0
-        data["total_loans_amount"] = total_loans
-        status_counts = {
-            item["status"]: item["count"]
-            for item in Loan.objects.values("status").annotate(count=Count("id"))
+        try:
+            k, period = leaderboard_params(request.query_params, default_k=5)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        totals = SaccoTotals.for_request(request)
+        data = {
+            "total_members": totals.members_joined,
+            "total_deposits": totals.deposits.all.total,
+            "deposits_count": totals.deposits.all.count,
+            "total_withdrawals": totals.withdrawals.all.total,
+            "withdrawals_count": totals.withdrawals.all.count,
+            "total_loans_amount": totals.loans.all.total,
+            "loans_status_counts": totals.loans.status_counts(),
+            "total_repayments": totals.repayments.all.total,
+            "repayments_count": totals.repayments.all.count,
         }
-        data["loans_status_counts"] = status_counts
-
-        # Repayments
-        repayments_agg = LoanRepayment.objects.aggregate(total=Sum("amount"), count=Count("id"))
-        data["total_repayments"] = repayments_agg["total"] or 0
-        data["repayments_count"] = repayments_agg["count"] or 0
-
-        # Leaderboards
-        top_savers_qs = (
-            Deposit.objects.values(member_username=F("member__user__username"))
-            .annotate(total=Sum("amount"))
-            .order_by("-total")[:5]
-        )
-        data["top_savers"] = [
-            {"username": r["member_username"] or "unknown", "total_deposited": r["total"]}
-            for r in top_savers_qs
-        ]
 
-        top_borrowers_qs = (
-            Loan.objects.values(borrower_username=F("member__user__username"))
-            .annotate(outstanding=Sum("balance"))
-            .order_by("-outstanding")[:5]
-        )
-        data["top_borrowers"] = [
-            {"username": r["borrower_username"] or "unknown", "outstanding_balance": r["outstanding"]}
-            for r in top_borrowers_qs
-        ]
+        # Leaderboards (?k=, ?period=all|month|year)
+        for key, board in (("top_savers", "savers"), ("top_borrowers", "borrowers")):
+            measure = leaderboard.MEASURES[board][period]
+            data[key] = [
+                {"username": r["username"] or "unknown", measure: r["total"]}
+                for r in leaderboard.top(board, period, k)
+            ]
+
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class LeaderboardView(views.APIView):
+    """
+    Top-K savers and borrowers.
+    Query params: ?k=10&period=all|month|year&board=savers|borrowers (both by default).
+    `measures` names what each board's totals are for the period.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
 
+    @cached_response("analytics-leaderboard")
+    def get(self, request):
+        try:
+            k, period = leaderboard_params(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        boards = list(leaderboard.BALANCE_FIELDS)
+        board = request.query_params.get("board")
+        if board:
+            if board not in boards:
+                return Response({"detail": f"board must be one of: {', '.join(boards)}."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            boards = [board]
+
+        data = {"k": k, "period": period, "measures": {}}
+        for name in boards:
+            data[name] = leaderboard.top(name, period, k)
+            data["measures"][name] = leaderboard.MEASURES[name][period]
         return Response(data, status=status.HTTP_200_OK)
 
 
 class AnalyticsTrendsView(views.APIView):
     """
-    Monthly activity trends: new members, loans, deposits, withdrawals.
+    Activity trends: new members, loans, deposits, withdrawals.
+    Query params: ?from=YYYY-MM-DD&to=YYYY-MM-DD&granularity=day|week|month
+    (defaults to the current year by month). Served from the daily rollup.
     """
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
 
     def get(self, request):
-        Member = apps.get_model("members", "Member")
-        Deposit = apps.get_model("savings", "Deposit")
-        Withdrawal = apps.get_model("savings", "Withdrawal")
-        Loan = apps.get_model("loans", "Loan")
-
-        current_year = now().year
-        data = {"months": [], "new_members": [], "loans": [], "deposits": [], "withdrawals": []}
-
-        for month in range(1, 13):
-            start = datetime(current_year, month, 1)
-            end = (datetime(current_year + (month == 12), (month % 12) + 1, 1)
-                   - timedelta(days=1))
-
-            data["months"].append(start.strftime("%b"))
-            data["new_members"].append(Member.objects.filter(joined_on__range=[start, end]).count())
-            data["loans"].append(Loan.objects.filter(requested_on__range=[start, end]).count())
-            data["deposits"].append(
-                Deposit.objects.filter(date__range=[start, end]).aggregate(Sum("amount"))["amount__sum"] or 0
-            )
-            data["withdrawals"].append(
-                Withdrawal.objects.filter(date__range=[start, end]).aggregate(Sum("amount"))["amount__sum"] or 0
-            )
+        try:
+            start, end, granularity = parse_range(request.query_params)
+            data = build_trends(start, end, granularity)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response(data, status=status.HTTP_200_OK)
 
 
+def financial_figures(totals):
+    """Summary figures for one SaccoTotals (whole range or a single group)."""
+    return {
+        "total_loans": totals.loans.all.total,
+        "total_repaid": totals.repayments.all.total,
+        "total_savings": totals.deposits.all.total,
+        "total_withdrawn": totals.withdrawals.all.total,
+        "outstanding_balance": totals.outstanding,
+        "approval_rate": totals.approval_rate,
+    }
+
+
 class FinancialSummaryView(views.APIView):
     """
     Provides total loaned, repaid, savings, and outstanding balances.
-    Supports date filters 
+    Every figure respects ?start=YYYY-MM-DD&end=YYYY-MM-DD (either may be omitted).
+    ?group_by=month|status|member adds a breakdown of the same range. The
+    member breakdown covers every member, a page at a time in member ID
+    order (KeysetPagination: ?page_size=, ?cursor=, with `next`/`previous`).
     """
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    group_by_choices = ("month", "status", "member")
 
+    @cached_response("analytics-financials")
     def get(self, request):
-        Loan = apps.get_model("loans", "Loan")
-        LoanRepayment = apps.get_model("loans", "LoanRepayment")
-        Deposit = apps.get_model("savings", "Deposit")
-        Withdrawal = apps.get_model("savings", "Withdrawal")
-
         start_date = request.query_params.get("start")
         end_date = request.query_params.get("end")
+        group_by = request.query_params.get("group_by")
+
+        start = parse_date(start_date) if start_date else None
+        end = parse_date(end_date) if end_date else None
+        if (start_date and start is None) or (end_date and end is None):
+            return Response({"detail": "start and end must be dates in YYYY-MM-DD format."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if start and end and start > end:
+            return Response({"detail": "start must be on or before end."}, status=status.HTTP_400_BAD_REQUEST)
+        if group_by and group_by not in self.group_by_choices:
+            return Response({"detail": f"group_by must be one of: {', '.join(self.group_by_choices)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        totals = SaccoTotals.for_request(request, start, end)
+        data = {"date_range": {"start": start_date, "end": end_date}, **financial_figures(totals)}
+
+        if group_by == "month":
+            data["groups"] = [
+                {"month": month, **financial_figures(month_totals)}
+                for month, month_totals in totals.by_month()
+            ]
+        elif group_by == "status":
+            data["groups"] = {
+                name: {s: {"count": f.count, "total": f.total} for s, f in kind.by_status.items()}
+                for name, kind in (("loans", totals.loans), ("savings", totals.deposits),
+                                   ("withdrawals", totals.withdrawals), ("repayments", totals.repayments))
+            }
+        elif group_by == "member":
+            paginator = KeysetPagination()
+            members = [row["id"] for row in paginator.paginate_queryset(
+                Member.objects.order_by("id").values("id"), request, view=self)]
+            totals_by_member = member_totals(start, end, members)
+            page = paginator.get_paginated_response([
+                {"member": member_id, **member_figures(totals_by_member.get(member_id, {}))}
+                for member_id in members
+            ]).data
+            data.update(groups=page["results"], next=page["next"], previous=page["previous"])
 
-        filters = {}
-        if start_date and end_date:
-            filters["requested_on__range"] = [start_date, end_date]
+        return Response(data, status=status.HTTP_200_OK)
 
-        total_loans = Loan.objects.filter(**filters).aggregate(Sum("amount"))["amount__sum"] or 0
-        total_repaid = LoanRepayment.objects.aggregate(Sum("amount"))["amount__sum"] or 0
-        total_savings = Deposit.objects.aggregate(Sum("amount"))["amount__sum"] or 0
-        total_withdrawn = Withdrawal.objects.aggregate(Sum("amount"))["amount__sum"] or 0
 
-        outstanding = total_loans - total_repaid
-        approval_rate = (Loan.objects.filter(status="approved").count() / Loan.objects.count() * 100) if Loan.objects.exists() else 0
+def member_figures(kinds):
+    """Summary figures for one member's {kind: Figure} from member_totals()."""
+    loans = kinds.get("loans", Figure())
+    repaid = kinds.get("repayments", Figure()).total
+    approved = kinds.get("approved_loans", Figure()).count
+    return {
+        "total_loans": loans.total,
+        "total_repaid": repaid,
+        "total_savings": kinds.get("deposits", Figure()).total,
+        "total_withdrawn": kinds.get("withdrawals", Figure()).total,
+        "outstanding_balance": loans.total - repaid,
+        "approval_rate": round(approved / loans.count * 100, 2) if loans.count else 0,
+    }
 
-        return Response({
-            "date_range": {"start": start_date, "end": end_date},
-            "total_loans": total_loans,
-            "total_repaid": total_repaid,
-            "total_savings": total_savings,
-            "total_withdrawn": total_withdrawn,
-            "outstanding_balance": outstanding,
-            "approval_rate": round(approval_rate, 2),
-        }, status=status.HTTP_200_OK)
-    
 
 class PerformanceMetricsView(views.APIView):
     """
     Returns computed performance indicators and ratios
     for quick chart rendering on the admin dashboard.
+    ?months=N sets the trend window in calendar months (default 6, max 120).
+    Runs two queries: all-time totals and a per-month breakdown.
     """
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    default_months = 6
+    max_months = 120
 
+    @cached_response("analytics-performance")
     def get(self, request):
-        Loan = apps.get_model("loans", "Loan")
-        LoanRepayment = apps.get_model("loans", "LoanRepayment")
-        Deposit = apps.get_model("savings", "Deposit")
-
-        # --- Totals ---
-        total_loans = Loan.objects.aggregate(Sum("amount"))["amount__sum"] or 0
-        total_repaid = LoanRepayment.objects.aggregate(Sum("amount"))["amount__sum"] or 0
-        total_deposits = Deposit.objects.aggregate(Sum("amount"))["amount__sum"] or 0
-
-        # --- Ratios ---
-        loan_to_deposit_ratio = (total_loans / total_deposits * 100) if total_deposits > 0 else 0
-        repayment_rate = (total_repaid / total_loans * 100) if total_loans > 0 else 0
-
-        # --- Loan Statuses ---
-        loan_status_counts = (
-            Loan.objects.values("status").annotate(count=Count("id")).order_by()
-        )
-        active_loans = sum(i["count"] for i in loan_status_counts if i["status"] == "approved")
-        closed_loans = sum(i["count"] for i in loan_status_counts if i["status"] == "repaid")
-
-        # --- Savings Growth (last 2 months) ---
-        current_month_start = now().replace(day=1)
-        prev_month_end = current_month_start - timedelta(days=1)
-        prev_month_start = prev_month_end.replace(day=1)
-
-        current_total = (
-            Deposit.objects.filter(date__gte=current_month_start)
-            .aggregate(Sum("amount"))["amount__sum"] or 0
-        )
-        previous_total = (
-            Deposit.objects.filter(date__range=[prev_month_start, prev_month_end])
-            .aggregate(Sum("amount"))["amount__sum"] or 0
-        )
-
-        savings_growth = (
-            ((current_total - previous_total) / previous_total * 100)
-            if previous_total > 0 else 0
-        )
-
-        # --- Loan Approval Trend (last 6 months) ---
-        approval_trend = []
-        for i in range(5, -1, -1):
-            start = (now().replace(day=1) - timedelta(days=30 * i)).replace(day=1)
-            end = (start + timedelta(days=31)).replace(day=1) - timedelta(seconds=1)
-
-            total_month_loans = Loan.objects.filter(requested_on__range=[start, end]).count()
-            approved_month_loans = Loan.objects.filter(
-                requested_on__range=[start, end], status="approved"
-            ).count()
-
-            approval_rate = (
-                approved_month_loans / total_month_loans * 100
-                if total_month_loans > 0 else 0
-            )
-            approval_trend.append({
-                "month": start.strftime("%b"),
-                "approval_rate": round(approval_rate, 2)
-            })
+        try:
+            months = int(request.query_params.get("months", self.default_months))
+        except ValueError:
+            months = 0
+        if not 1 <= months <= self.max_months:
+            return Response({"detail": f"months must be an integer between 1 and {self.max_months}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        totals = SaccoTotals.for_request(request)
+        loan_status_counts = totals.loans.status_counts()
+
+        # --- Monthly trend (approval rate, deposits, savings growth) ---
+        monthly = monthly_performance(months)
+        approval_trend = [
+            {"month": m["month"], "period": m["period"], "approval_rate": m["approval_rate"]}
+            for m in monthly
+        ]
+        savings_trend = [
+            {"month": m["month"], "period": m["period"], "deposits": m["deposits"],
+             "growth_percent": m["savings_growth_percent"]}
+            for m in monthly
+        ]
 
         # --- Response Payload ---
         return Response({
-            "loan_to_deposit_ratio": round(loan_to_deposit_ratio, 2),
-            "repayment_rate": round(repayment_rate, 2),
-            "savings_growth_percent": round(savings_growth, 2),
-            "active_loans": active_loans,
-            "closed_loans": closed_loans,
+            "months": months,
+            "loan_to_deposit_ratio": totals.loan_to_deposit_ratio,
+            "repayment_rate": totals.repayment_rate,
+            "savings_growth_percent": monthly[-1]["savings_growth_percent"],
+            "active_loans": loan_status_counts.get("approved", 0),
+            "closed_loans": loan_status_counts.get("completed", 0),
+            "loan_status_counts": loan_status_counts,
             "approval_trend": approval_trend,
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+            "savings_trend": savings_trend,
+        }, status=status.HTTP_200_OK)
+
+
+def snapshot_date(params):
+    """?date= of a portfolio at risk snapshot, defaulting to the latest. Raises ValueError."""
+    if params.get("date"):
+        as_of = parse_date(params["date"])
+        if as_of is None:
+            raise ValueError("date must be in YYYY-MM-DD format.")
+        return as_of
+    as_of = arrears.latest_date()
+    if as_of is None:
+        raise LookupError("No portfolio at risk snapshot has been computed yet.")
+    return as_of
+
+
+class PortfolioAtRiskView(views.APIView):
+    """
+    PAR30/PAR60/PAR90 and arrears aging buckets of approved loans, from the
+    snapshot written nightly by `manage.py compute_portfolio_at_risk`.
+    Query params: ?date=YYYY-MM-DD (default: latest snapshot).
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+
+    def get(self, request):
+        try:
+            as_of = snapshot_date(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except LookupError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        data = arrears.summary(as_of)
+        if data is None:
+            return Response({"detail": f"No portfolio at risk snapshot for {as_of}."},
+                            status=status.HTTP_404_NOT_FOUND)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class LoanArrearsListView(views.APIView):
+    """
+    Loans behind schedule in a snapshot, furthest behind first (paginated).
+    Query params: ?date=YYYY-MM-DD (default: latest snapshot), ?bucket=1_30|31_60|61_90|90_plus.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+
+    def get(self, request):
+        try:
+            as_of = snapshot_date(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except LookupError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+
+        queryset = LoanArrears.objects.filter(as_of=as_of).select_related("member__user")
+        bucket = request.query_params.get("bucket")
+        if bucket:
+            choices = [name for name in arrears.BUCKETS if name != "current"]
+            if bucket not in choices:
+                return Response({"detail": f"bucket must be one of: {', '.join(choices)}."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(bucket=bucket)
+
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset.order_by("-days_in_arrears"), request, view=self)
+        response = paginator.get_paginated_response([
+            {
+                "loan": row.loan_id,
+                "member": row.member_id,
+                "username": row.member.user.username,
+                "days_in_arrears": row.days_in_arrears,
+                "bucket": row.bucket,
+                "arrears": row.arrears,
+                "outstanding": row.outstanding,
+            }
+            for row in page
+        ])
+        response.data["as_of"] = as_of
+        return response
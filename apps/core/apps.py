@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
+
+    def ready(self):
+        import apps.core.signals
+        # Register every app's background tasks (apps/<app>/tasks.py)
+        autodiscover_modules("tasks")
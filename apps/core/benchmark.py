@@ -0,0 +1,198 @@
+"""
+Endpoint benchmarks.
+
+Every GET endpoint reachable from the root URLconf is requested through
+DRF's APIClient (the full middleware stack included) and timed; the report
+records p50/p95/p99 latency and the query count of each endpoint as JSON,
+keyed by URL name so reports from two releases can be diffed or compared
+with compare_reports().
+"""
+import math
+import re
+from time import perf_counter
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+# Endpoints that only make sense for a member rather than an admin
+MEMBER_ENDPOINTS = {"member-profile"}
+SKIPPED_NAMESPACES = {"admin"}
+DATASET_MODELS = (
+    "accounts.User", "members.Member", "staff.Staff", "savings.Deposit",
+    "savings.Withdrawal", "loans.Loan", "loans.LoanRepayment",
+)
+
+_ROUTE_PARAM = re.compile(r"<(?:\w+:)?(\w+)>")
+_REGEX_PARAM = re.compile(r"\(\?P<(\w+)>[^)]*\)")
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def _view_class(callback):
+    return getattr(callback, "cls", None) or getattr(callback, "view_class", None)
+
+
+def _allows_get(callback):
+    actions = getattr(callback, "actions", None)
+    if actions is not None:
+        return "get" in actions
+    view_class = _view_class(callback)
+    return view_class is not None and hasattr(view_class, "get")
+
+
+def iter_patterns(patterns=None, prefix=""):
+    """Yield (name, route, callback) for every URL pattern, depth first."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for entry in patterns:
+        route = prefix + str(entry.pattern).lstrip("^").rstrip("$")
+        if isinstance(entry, URLResolver):
+            if entry.namespace in SKIPPED_NAMESPACES:
+                continue
+            yield from iter_patterns(entry.url_patterns, route)
+        elif isinstance(entry, URLPattern):
+            yield entry.name, route, entry.callback
+
+
+def discover_endpoints():
+    """
+    Return ([{"name", "route", "params", "model"}], {name: reason skipped})
+    for GET endpoints. Routes with a format suffix are left out.
+    """
+    endpoints, skipped, seen = [], {}, set()
+    for name, route, callback in iter_patterns():
+        if "format" in route or not _allows_get(callback):
+            continue
+        params = _REGEX_PARAM.findall(route) + _ROUTE_PARAM.findall(_REGEX_PARAM.sub("", route))
+        name = name or route
+        if name in seen:
+            continue
+        seen.add(name)
+
+        queryset = getattr(_view_class(callback), "queryset", None)
+        model = queryset.model if queryset is not None else None
+        if params and (params != ["pk"] or model is None):
+            skipped[name] = f"cannot fill URL parameters {params}"
+            continue
+        endpoints.append({"name": name, "route": route, "params": params, "model": model})
+    return endpoints, skipped
+
+
+def build_path(endpoint):
+    """Fill an endpoint's route with sample values; None if there is no row to use."""
+    route = endpoint["route"]
+    if endpoint["params"]:
+        pk = endpoint["model"].objects.order_by("pk").values_list("pk", flat=True).first()
+        if pk is None:
+            return None
+        route = _ROUTE_PARAM.sub(str(pk), _REGEX_PARAM.sub(str(pk), route))
+    return "/" + route
+
+
+def _clients():
+    User = get_user_model()
+    admin, _ = User.objects.get_or_create(
+        username="benchmark-admin",
+        defaults={"email": "benchmark-admin@example.com", "role": "admin", "is_staff": True, "is_superuser": True},
+    )
+    admin_client = APIClient(SERVER_NAME="localhost", raise_request_exception=False)
+    admin_client.force_authenticate(admin)
+
+    member_client = None
+    Member = apps.get_model("members", "Member")
+    member = Member.objects.select_related("user").order_by("pk").first()
+    if member is not None:
+        member_client = APIClient(SERVER_NAME="localhost", raise_request_exception=False)
+        member_client.force_authenticate(member.user)
+    return admin_client, member_client
+
+
+def _request(client, path):
+    response = client.get(path)
+    if response.streaming:
+        b"".join(response.streaming_content)
+    return response
+
+
+def time_endpoint(client, path, iterations, warmup=1, cold=False):
+    """Time `iterations` GETs of `path`; return the endpoint's report entry."""
+    for _ in range(warmup):
+        _request(client, path)
+
+    samples, queries, status = [], 0, None
+    for _ in range(iterations):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = perf_counter()
+            response = _request(client, path)
+            samples.append((perf_counter() - started) * 1000)
+        queries = max(queries, len(captured))
+        status = response.status_code
+
+    return {
+        "path": path,
+        "status": status,
+        "queries": queries,
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "mean_ms": round(sum(samples) / len(samples), 3),
+    }
+
+
+def run_benchmarks(iterations=20, warmup=1, cold=False, only=None):
+    """Benchmark every discovered endpoint (or those named in `only`) and return the report."""
+    endpoints, skipped = discover_endpoints()
+    admin_client, member_client = _clients()
+
+    results = {}
+    for endpoint in endpoints:
+        name = endpoint["name"]
+        if only and name not in only:
+            continue
+        client = member_client if name in MEMBER_ENDPOINTS else admin_client
+        path = build_path(endpoint)
+        if client is None or path is None:
+            skipped[name] = "no sample data"
+            continue
+        results[name] = time_endpoint(client, path, iterations, warmup, cold)
+
+    return {
+        "generated_at": timezone.now().isoformat(),
+        "database": connection.vendor,
+        "iterations": iterations,
+        "cold_cache": cold,
+        "dataset": {label: apps.get_model(label).objects.count() for label in DATASET_MODELS},
+        "endpoints": results,
+        "skipped": skipped,
+    }
+
+
+def compare_reports(baseline, current, threshold=20.0):
+    """
+    List regressions of `current` against `baseline`: p95 slower by more
+    than `threshold` percent, more queries, or a changed status code.
+    """
+    regressions = []
+    for name, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if before is None:
+            continue
+        if now["status"] != before["status"]:
+            regressions.append(f"{name}: status {before['status']} -> {now['status']}")
+        if now["queries"] > before["queries"]:
+            regressions.append(f"{name}: queries {before['queries']} -> {now['queries']}")
+        if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + threshold / 100):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {now['p95_ms']}ms")
+    return regressions
@@ -0,0 +1,149 @@
+"""
+Versioned response cache for read-heavy admin endpoints.
+
+Cached payloads are stamped with a global data version that is bumped
+(after commit) whenever a deposit, withdrawal, loan or repayment changes.
+An entry is fresh while its version is current and it is younger than
+RESPONSE_CACHE_TTL. Stale entries are kept for RESPONSE_CACHE_STALE_TTL:
+one request takes a short lock and recomputes while concurrent requests
+keep serving the stale payload (stale-while-revalidate).
+
+Only portable cache operations (get/set/add/incr/delete) are used, so any
+Django backend works, including local-memory and file-based caches.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+KEY_PREFIX = "saccolink"
+DATA_VERSION_KEY = f"{KEY_PREFIX}:data-version"
+STATS = ("hit", "miss", "stale", "refresh")
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# --- Data version ---
+
+def get_data_version():
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        cache.add(DATA_VERSION_KEY, 1, timeout=None)
+        version = cache.get(DATA_VERSION_KEY, 1)
+    return version
+
+
+def bump_data_version():
+    """Invalidate every cached response by moving to a new data version."""
+    try:
+        return cache.incr(DATA_VERSION_KEY)
+    except ValueError:
+        # Key missing (cold cache or evicted): start a fresh sequence
+        cache.add(DATA_VERSION_KEY, 1, timeout=None)
+        return cache.incr(DATA_VERSION_KEY)
+
+
+# --- Hit/miss counters ---
+
+def _record(name, outcome):
+    key = f"{KEY_PREFIX}:stats:{name}:{outcome}"
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def cache_stats(names):
+    """Return {name: {"hit": n, "miss": n, "stale": n, "refresh": n}}."""
+    keys = {f"{KEY_PREFIX}:stats:{name}:{outcome}": (name, outcome) for name in names for outcome in STATS}
+    found = cache.get_many(list(keys))
+    stats = {name: dict.fromkeys(STATS, 0) for name in names}
+    for key, value in found.items():
+        name, outcome = keys[key]
+        stats[name][outcome] = value
+    return stats
+
+
+def reset_cache_stats(names):
+    cache.delete_many([f"{KEY_PREFIX}:stats:{name}:{outcome}" for name in names for outcome in STATS])
+
+
+# --- Response caching ---
+
+# Names of every endpoint registered with @cached_response, for cache_stats()
+registry = []
+
+
+def _entry_key(name, request):
+    params = sorted(request.query_params.lists())
+    digest = hashlib.md5(repr(params).encode()).hexdigest()
+    return f"{KEY_PREFIX}:response:{name}:{digest}"
+
+
+def _store(key, version, data):
+    ttl = _setting("RESPONSE_CACHE_TTL", 60)
+    stale_ttl = _setting("RESPONSE_CACHE_STALE_TTL", 300)
+    cache.set(key, {"version": version, "stored_at": time.time(), "data": data}, timeout=ttl + stale_ttl)
+
+
+def _respond(data, outcome):
+    response = Response(data, status=status.HTTP_200_OK)
+    response["X-Cache"] = outcome.upper()
+    return response
+
+
+def cached_response(name):
+    """
+    Cache the payload of a DRF `get` handler under `name` + query params.
+    Only 200 responses are cached; errors always pass straight through.
+    """
+    registry.append(name)
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            key = _entry_key(name, request)
+            version = get_data_version()
+            entry = cache.get(key)
+
+            if entry is not None:
+                fresh = (
+                    entry["version"] == version
+                    and time.time() - entry["stored_at"] < _setting("RESPONSE_CACHE_TTL", 60)
+                )
+                if fresh:
+                    _record(name, "hit")
+                    return _respond(entry["data"], "hit")
+
+                # Stale: let exactly one request recompute, everyone else serves stale
+                lock_key = f"{key}:lock"
+                if not cache.add(lock_key, 1, timeout=_setting("RESPONSE_CACHE_LOCK_TTL", 30)):
+                    _record(name, "stale")
+                    return _respond(entry["data"], "stale")
+                try:
+                    response = method(view, request, *args, **kwargs)
+                    if response.status_code == status.HTTP_200_OK:
+                        _store(key, version, response.data)
+                finally:
+                    cache.delete(lock_key)
+                _record(name, "refresh")
+                response["X-Cache"] = "REFRESH"
+                return response
+
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                _store(key, version, response.data)
+            _record(name, "miss")
+            response["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,32 @@
+"""
+Date helpers shared by reporting code.
+"""
+import calendar
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def day_start(day):
+    """Aware datetime for midnight at the start of `day` in the current timezone."""
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def datetime_range_filter(field, start=None, end=None):
+    """
+    Filter kwargs selecting `field` within the inclusive date range, written
+    as half-open datetime bounds so an index on `field` can be used.
+    """
+    filters = {}
+    if start:
+        filters[f"{field}__gte"] = day_start(start)
+    if end:
+        filters[f"{field}__lt"] = day_start(end + timedelta(days=1))
+    return filters
+
+
+def add_months(day, months):
+    """`day` moved `months` calendar months on, clamped to the end of a shorter month."""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
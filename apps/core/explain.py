@@ -0,0 +1,66 @@
+"""
+Query plan checks for hot queries.
+
+plan_problems() runs EXPLAIN on one captured query and reports the steps
+that do not scale with table size:
+- "full scan": a table read from start to end without an index
+- "sort": rows sorted at query time instead of read in index order
+
+On PostgreSQL the planner is told to avoid sequential scans and sorts
+while explaining, so on a small test database a Seq Scan or Sort is only
+reported when no index could serve the query.
+"""
+import json
+
+SUPPORTED_VENDORS = ("sqlite", "postgresql")
+
+
+def _sqlite_problems(cursor, sql, params):
+    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    problems = []
+    for row in cursor.fetchall():
+        detail = row[-1]
+        if detail.startswith("SCAN ") and " USING " not in detail and "CONSTANT ROW" not in detail:
+            problems.append(f"full scan: {detail}")
+        elif detail.startswith("USE TEMP B-TREE FOR") and "ORDER BY" in detail:
+            problems.append(f"sort: {detail}")
+    return problems
+
+
+def _postgresql_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _postgresql_nodes(child)
+
+
+def _postgresql_problems(cursor, sql, params):
+    cursor.execute("SET LOCAL enable_seqscan = off")
+    cursor.execute("SET LOCAL enable_sort = off")
+    try:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    finally:
+        cursor.execute("RESET enable_seqscan")
+        cursor.execute("RESET enable_sort")
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    problems = []
+    for node in _postgresql_nodes(plan[0]["Plan"]):
+        if node["Node Type"] == "Seq Scan":
+            problems.append(f"full scan: Seq Scan on {node['Relation Name']}")
+        elif node["Node Type"] in ("Sort", "Incremental Sort"):
+            problems.append(f"sort: {node['Node Type']} by {', '.join(node.get('Sort Key', []))}")
+    return problems
+
+
+def plan_problems(connection, sql, params=()):
+    """
+    Return the full scans and sorts in the plan of `sql` as short strings.
+    Raises NotImplementedError for database vendors without a checker.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            return _sqlite_problems(cursor, sql, params)
+        if connection.vendor == "postgresql":
+            return _postgresql_problems(cursor, sql, params)
+    raise NotImplementedError(f"No query plan checks for {connection.vendor}.")
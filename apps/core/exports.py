@@ -0,0 +1,217 @@
+"""
+Streaming bulk exports of transaction history (CSV or NDJSON).
+
+Rows are read as values() tuples in primary-key order through a chunked
+iterator() (a server-side cursor on PostgreSQL) and written out one chunk
+at a time, so memory stays flat however many rows are exported.
+"""
+import csv
+import json
+
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .dates import datetime_range_filter
+
+CHUNK_SIZE = 2000
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# kind -> model, timestamp used for date filters, path to the member id, output columns
+EXPORTS = {
+    "deposits": {
+        "model": "savings.Deposit",
+        "timestamp": "created_at",
+        "member": "member_id",
+        "columns": {
+            "id": "id",
+            "member_id": "member_id",
+            "member_username": "member__user__username",
+            "amount": "amount",
+            "status": "status",
+            "approved_by_id": "approved_by_id",
+            "approved_on": "approved_on",
+            "created_at": "created_at",
+        },
+    },
+    "withdrawals": {
+        "model": "savings.Withdrawal",
+        "timestamp": "created_at",
+        "member": "member_id",
+        "columns": {
+            "id": "id",
+            "member_id": "member_id",
+            "member_username": "member__user__username",
+            "amount": "amount",
+            "status": "status",
+            "approved_by_id": "approved_by_id",
+            "approved_on": "approved_on",
+            "created_at": "created_at",
+        },
+    },
+    "loans": {
+        "model": "loans.Loan",
+        "timestamp": "requested_on",
+        "member": "member_id",
+        "columns": {
+            "id": "id",
+            "member_id": "member_id",
+            "member_username": "member__user__username",
+            "amount": "amount",
+            "interest_rate": "interest_rate",
+            "duration_months": "duration_months",
+            "status": "status",
+            "requested_on": "requested_on",
+            "approved_on": "approved_on",
+            "due_date": "due_date",
+            "balance": "balance",
+        },
+    },
+    "repayments": {
+        "model": "loans.LoanRepayment",
+        "timestamp": "date",
+        "member": "loan__member_id",
+        "columns": {
+            "id": "id",
+            "loan_id": "loan_id",
+            "member_id": "loan__member_id",
+            "member_username": "loan__member__user__username",
+            "amount": "amount",
+            "date": "date",
+        },
+    },
+}
+
+
+def parse_filters(params):
+    """
+    Read from/to (inclusive dates), status and member filters from a
+    mapping of strings. Raises ValueError on malformed input.
+    """
+    filters = {}
+    for name in ("from", "to"):
+        value = params.get(name)
+        if value:
+            parsed = parse_date(value)
+            if parsed is None:
+                raise ValueError(f"'{name}' must be a date in YYYY-MM-DD format.")
+            filters[name] = parsed
+    if filters.get("from") and filters.get("to") and filters["from"] > filters["to"]:
+        raise ValueError("'from' must be on or before 'to'.")
+    if params.get("status"):
+        filters["status"] = params["status"]
+    if params.get("member"):
+        try:
+            filters["member"] = int(params["member"])
+        except (TypeError, ValueError):
+            raise ValueError("'member' must be a member id.")
+    return filters
+
+
+def export_queryset(kind, filters=None):
+    """Return the values() queryset for an export kind, filtered and ordered by id."""
+    spec = EXPORTS[kind]
+    model = apps.get_model(spec["model"])
+    filters = filters or {}
+
+    queryset = model.objects.filter(
+        **datetime_range_filter(spec["timestamp"], filters.get("from"), filters.get("to"))
+    )
+    if filters.get("status"):
+        if "status" not in spec["columns"]:
+            raise ValueError(f"{kind} have no status to filter on.")
+        queryset = queryset.filter(status=filters["status"])
+    if filters.get("member"):
+        queryset = queryset.filter(**{spec["member"]: filters["member"]})
+
+    columns = spec["columns"]
+    plain = [name for name, path in columns.items() if name == path]
+    aliased = {name: F(path) for name, path in columns.items() if name != path}
+    return queryset.order_by("id").values(*plain, **aliased)
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset, columns, fmt, chunk_size=CHUNK_SIZE):
+    """Yield encoded output lines (header first for CSV)."""
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for row in queryset.iterator(chunk_size=chunk_size):
+            yield writer.writerow([row[c] for c in columns])
+    else:
+        for row in queryset.iterator(chunk_size=chunk_size):
+            yield json.dumps({c: row[c] for c in columns}, cls=DjangoJSONEncoder) + "\n"
+
+
+def iter_chunks(lines, lines_per_chunk=500):
+    """Group lines so the server writes fewer, larger chunks."""
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= lines_per_chunk:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+def streaming_export(kind, filters, fmt):
+    """Build a StreamingHttpResponse exporting `kind` as `fmt`."""
+    columns = list(EXPORTS[kind]["columns"])
+    queryset = export_queryset(kind, filters)
+    response = StreamingHttpResponse(
+        iter_chunks(iter_rows(queryset, columns, fmt)),
+        content_type=FORMATS[fmt],
+    )
+    stamp = timezone.now().strftime("%Y%m%d%H%M%S")
+    response["Content-Disposition"] = f'attachment; filename="{kind}-{stamp}.{fmt}"'
+    return response
+
+
+class ExportMixin:
+    """
+    Adds GET .../export/ to a viewset. Admins export every member's rows;
+    anyone else only their own, and ?member= of another member is refused.
+    Query params: ?output=csv|ndjson&from=&to=&status=&member=
+    """
+    export_kind = None
+
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
+    def export(self, request):
+        fmt = request.query_params.get("output", "csv")
+        if fmt not in FORMATS:
+            return Response({"detail": f"output must be one of: {', '.join(FORMATS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            filters = parse_filters(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not request.user.is_staff:
+            member = getattr(request.user, "member_profile", None)
+            if not member:
+                return Response({"detail": "No member profile found."}, status=status.HTTP_404_NOT_FOUND)
+            if filters.get("member", member.pk) != member.pk:
+                return Response({"detail": "You can only export your own records."},
+                                status=status.HTTP_403_FORBIDDEN)
+            filters["member"] = member.pk
+
+        try:
+            return streaming_export(self.export_kind, filters, fmt)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,108 @@
+"""
+Idempotency-Key support for create endpoints.
+
+A client retrying a POST sends the same Idempotency-Key header. The first
+request inserts an IdempotencyKey row in the same transaction as the
+create and stores the response on it; the unique (user, key) constraint
+makes concurrent retries wait on that insert:
+- if the first request committed, they replay its stored response without
+  running the create, its signals or any other write
+- if it rolled back (validation error, crash), the key is free and the
+  retry runs normally, so only successful responses are ever replayed
+
+Keys expire after IDEMPOTENCY_KEY_TTL seconds; purge_idempotency_keys
+deletes expired rows.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+CLAIM_ATTEMPTS = 3
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, "IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+
+
+def fingerprint(request):
+    """sha256 of the request method, path and body."""
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def _replay(record, digest):
+    if record.fingerprint != digest:
+        return Response({"detail": f"{HEADER} was already used for a different request."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    response = Response(record.response_body, status=record.response_status)
+    response[REPLAY_HEADER] = "true"
+    return response
+
+
+def purge_expired(now=None, chunk_size=1000):
+    """Delete expired keys in chunks. Returns the number deleted."""
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
+
+
+class IdempotentCreateMixin:
+    """
+    Makes a viewset's create() honour the Idempotency-Key header.
+    Requests without the header behave exactly as before.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"detail": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        digest = fingerprint(request)
+        for _ in range(CLAIM_ATTEMPTS):
+            now = timezone.now()
+            with transaction.atomic():
+                try:
+                    # Blocks while another request holding this key is in flight
+                    with transaction.atomic():
+                        record = IdempotencyKey.objects.create(
+                            user=request.user, key=key, fingerprint=digest, expires_at=now + key_ttl(),
+                        )
+                except IntegrityError:
+                    record = None
+
+                if record is not None:
+                    response = super().create(request, *args, **kwargs)
+                    record.response_status = response.status_code
+                    record.response_body = response.data
+                    record.save(update_fields=["response_status", "response_body"])
+                    return response
+
+            existing = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if existing is None:
+                continue  # the holder rolled back: claim the key ourselves
+            if existing.expires_at <= now:
+                IdempotencyKey.objects.filter(pk=existing.pk, expires_at__lte=now).delete()
+                continue
+            return _replay(existing, digest)
+
+        return Response({"detail": f"Could not claim the {HEADER}; retry the request."},
+                        status=status.HTTP_409_CONFLICT)
@@ -0,0 +1,286 @@
+"""
+Database-backed background jobs.
+
+Work that does not have to finish inside a request is queued as a Job row
+with enqueue() and run by `manage.py runworker`, no broker needed:
+- tasks are functions registered with @task in an app's tasks.py, which
+  is imported when the project starts
+- ready jobs are claimed highest priority first, with SELECT ... FOR
+  UPDATE SKIP LOCKED where the database supports it, and otherwise with a
+  claiming UPDATE, so any number of workers can share the queue
+- a task registered with batch_size > 1 is called once with the kwargs of
+  up to batch_size ready jobs of that task
+- a failing job is queued again after an exponential backoff and marked
+  failed after max_attempts
+- a worker refreshes the lock of the jobs it is running every
+  JOB_HEARTBEAT seconds; jobs whose lock is older than JOB_LOCK_TIMEOUT
+  were left running by a dead worker and are queued again
+
+Jobs run at least once: a worker dying after the task's writes committed
+runs it again, so tasks must be safe to repeat.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+PURGE_CHUNK_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class Task:
+    name: str
+    func: object
+    priority: int
+    max_attempts: int
+    batch_size: int
+
+
+# name -> Task
+registry = {}
+
+
+def task(name=None, priority=0, max_attempts=MAX_ATTEMPTS, batch_size=1):
+    """
+    Register a function as a task. It is called with a job's kwargs, or, if
+    batch_size > 1, with a list of the kwargs of several jobs.
+    """
+    def decorator(func):
+        task_name = name or f"{func.__module__}.{func.__name__}"
+        registry[task_name] = Task(task_name, func, priority, max_attempts, batch_size)
+        func.task_name = task_name
+        return func
+    return decorator
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def backoff(attempts):
+    """Delay before retrying a job that has failed `attempts` times, with some jitter."""
+    base = _setting("JOB_BACKOFF_BASE", 10)
+    delay = min(base * 2 ** (attempts - 1), _setting("JOB_BACKOFF_MAX", 60 * 60))
+    return timedelta(seconds=delay + random.uniform(0, base))
+
+
+def enqueue(task_or_name, priority=None, delay=None, user=None, **kwargs):
+    """
+    Queue a job in the current transaction; a worker can only see it once
+    that commits. `delay` is a timedelta; kwargs must be JSON serialisable.
+    """
+    name = getattr(task_or_name, "task_name", task_or_name)
+    if name not in registry:
+        raise LookupError(f"No task named {name!r}.")
+    spec = registry[name]
+    now = timezone.now()
+    return Job.objects.create(
+        name=name,
+        kwargs=kwargs,
+        priority=spec.priority if priority is None else priority,
+        max_attempts=spec.max_attempts,
+        run_after=now + delay if delay else now,
+        created_by=user,
+    )
+
+
+# --- Claiming ---
+
+def _ready(now):
+    return Job.objects.filter(status="queued", run_after__lte=now).order_by("-priority", "run_after", "id")
+
+
+def _batch_size(name):
+    spec = registry.get(name)
+    return spec.batch_size if spec else 1
+
+
+def _mark_running(queryset, worker, now):
+    return queryset.update(status="running", locked_by=worker, locked_at=now, attempts=F("attempts") + 1)
+
+
+def claim(worker, now=None):
+    """
+    Claim the next ready job and, for a batching task, more ready jobs of
+    the same task. Returns the claimed jobs (an empty list if none is ready).
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            head = _ready(now).select_for_update(skip_locked=True).first()
+            if head is None:
+                return []
+            jobs = [head]
+            size = _batch_size(head.name)
+            if size > 1:
+                more = _ready(now).filter(name=head.name).exclude(pk=head.pk)
+                jobs += more.select_for_update(skip_locked=True)[:size - 1]
+            _mark_running(Job.objects.filter(pk__in=[job.pk for job in jobs]), worker, now)
+            ids = [job.pk for job in jobs]
+        else:
+            # A write first takes the database write lock, serialising claims
+            if not _mark_running(Job.objects.filter(pk__in=_ready(now).values("pk")[:1]), worker, now):
+                return []
+            head = Job.objects.filter(status="running", locked_by=worker, locked_at=now).get()
+            size = _batch_size(head.name)
+            if size > 1:
+                _mark_running(
+                    Job.objects.filter(pk__in=_ready(now).filter(name=head.name).values("pk")[:size - 1]), worker, now,
+                )
+            ids = None
+        claimed = Job.objects.filter(status="running", locked_by=worker, locked_at=now)
+        if ids is not None:
+            claimed = claimed.filter(pk__in=ids)
+        return list(claimed.order_by("-priority", "run_after", "id"))
+
+
+# --- Running ---
+
+def _finish(jobs, result=None):
+    Job.objects.filter(pk__in=[job.pk for job in jobs], status="running").update(
+        status="done", result=result, last_error="", locked_by="", locked_at=None, finished_at=timezone.now(),
+    )
+
+
+def _fail(jobs, error):
+    now = timezone.now()
+    for job in jobs:
+        job.locked_by, job.locked_at, job.last_error = "", None, error
+        if job.attempts >= job.max_attempts:
+            job.status, job.finished_at = "failed", now
+        else:
+            job.status, job.run_after = "queued", now + backoff(job.attempts)
+        job.save(update_fields=["status", "run_after", "locked_by", "locked_at", "last_error", "finished_at"])
+
+
+def run(jobs):
+    """Run claimed jobs of one task, then record their outcome."""
+    spec = registry.get(jobs[0].name)
+    try:
+        if spec is None:
+            raise LookupError(f"No task named {jobs[0].name!r}.")
+        if spec.batch_size > 1:
+            result = spec.func([job.kwargs for job in jobs])
+        else:
+            result = spec.func(**jobs[0].kwargs)
+    except Exception as exc:
+        logger.exception("Job %s failed (%d jobs)", jobs[0].name, len(jobs))
+        _fail(jobs, f"{type(exc).__name__}: {exc}")
+        return False
+    _finish(jobs, result if spec.batch_size == 1 else None)
+    return True
+
+
+def heartbeat(worker, ids, now=None):
+    """Refresh the lock of the jobs `worker` is still running, so requeue_stale() leaves them be."""
+    return Job.objects.filter(pk__in=ids, status="running", locked_by=worker).update(
+        locked_at=now or timezone.now(),
+    )
+
+
+def requeue_stale(now=None):
+    """Queue again the jobs whose lock has not been refreshed for JOB_LOCK_TIMEOUT."""
+    now = now or timezone.now()
+    stale = Job.objects.filter(
+        status="running", locked_at__lt=now - timedelta(seconds=_setting("JOB_LOCK_TIMEOUT", 15 * 60)),
+    )
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status="failed", locked_by="", locked_at=None, finished_at=now, last_error="Worker lost.",
+    )
+    return failed + stale.update(status="queued", locked_by="", locked_at=None, run_after=now)
+
+
+def purge_finished(now=None, chunk_size=PURGE_CHUNK_SIZE):
+    """Delete done and failed jobs older than JOB_RETENTION, in chunks. Returns the number deleted."""
+    cutoff = (now or timezone.now()) - timedelta(seconds=_setting("JOB_RETENTION", 7 * 24 * 60 * 60))
+    deleted = 0
+    for status in ("done", "failed"):
+        while True:
+            ids = list(
+                Job.objects.filter(status=status, finished_at__lt=cutoff).values_list("pk", flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            deleted += Job.objects.filter(pk__in=ids).delete()[0]
+    return deleted
+
+
+class Worker:
+    """
+    Claims jobs on the calling thread and runs them on a pool of `threads`
+    threads, never holding more claimed jobs than it has free threads. The
+    calling thread also sends the running jobs' heartbeats.
+    """
+    HOUSEKEEPING_INTERVAL = 60
+
+    def __init__(self, threads=4, interval=1.0, name=None):
+        self.threads = threads
+        self.interval = interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = threading.Event()
+
+    def stop(self):
+        """Finish the running jobs and return from run()."""
+        self._stopping.set()
+
+    def _execute(self, jobs):
+        try:
+            return run(jobs)
+        finally:
+            close_old_connections()
+
+    def _wait(self, running):
+        """Wait for a job to finish, at most a heartbeat interval. Returns the jobs still running."""
+        not_done = wait(running, timeout=_setting("JOB_HEARTBEAT", 60), return_when=FIRST_COMPLETED).not_done
+        return {future: running[future] for future in not_done}
+
+    def run(self, burst=False):
+        """Process jobs until stop() is called, or with burst=True until the queue has no ready jobs."""
+        # future -> IDs of the jobs it runs
+        running = {}
+        beat = timedelta(seconds=_setting("JOB_HEARTBEAT", 60))
+        housekept_at, beat_at = None, timezone.now()
+        with ThreadPoolExecutor(self.threads, thread_name_prefix="job") as pool:
+            try:
+                while True:
+                    now = timezone.now()
+                    if running and now - beat_at >= beat:
+                        heartbeat(self.name, [pk for ids in running.values() for pk in ids], now)
+                        beat_at = now
+                    if self._stopping.is_set():
+                        if not running:
+                            break
+                        running = self._wait(running)
+                        continue
+                    if housekept_at is None or now - housekept_at >= timedelta(seconds=self.HOUSEKEEPING_INTERVAL):
+                        requeue_stale(now)
+                        purge_finished(now)
+                        housekept_at = now
+                    if len(running) >= self.threads:
+                        running = self._wait(running)
+                        continue
+                    jobs = claim(self.name)
+                    if jobs:
+                        running[pool.submit(self._execute, jobs)] = [job.pk for job in jobs]
+                    elif burst:
+                        if not running:
+                            break
+                        running = self._wait(running)
+                    else:
+                        self._stopping.wait(self.interval)
+            finally:
+                close_old_connections()
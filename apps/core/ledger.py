@@ -0,0 +1,390 @@
+"""
+Append-only member ledger.
+
+Every approved money movement is posted as a LedgerEntry carrying the
+running balance of its (member, account), with entries kept in time order:
+- balance_at() is one index seek: the last entry at or before a moment
+- statement() is that seek plus the entries inside the range
+- total_at() sums the nearest LedgerCheckpoint rows plus the entries posted
+  since, instead of re-summing the whole history
+
+What gets posted:
+- savings: approved deposits (+), approved withdrawals (-)
+- loan: approved loan principal (+), accrued interest (+), repayments (-,
+  never below zero)
+Deposit/withdrawal reviews and repayments post inside the request's
+transaction; loan approvals and savings rows created already approved are
+posted by the outbox handlers that move their balances
+(apps/savings/signals.py, apps/loans/signals.py).
+
+rebuild() recreates the ledger from those rows, member chunk by chunk;
+rebuild_members() does it for a few members.
+post_history() appends movements recorded after the fact (accrued interest)
+at their own times, rebuilding the members they would land in the middle of.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import F, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .dates import datetime_range_filter, day_start
+from .models import LedgerCheckpoint, LedgerEntry
+from .updates import insert_rows
+
+ACCOUNTS = ("savings", "loan")
+CHUNK_SIZE = 500
+POST_RETRIES = 5
+
+
+def _head(member_id, account):
+    """(seq, balance, occurred_at) of the member's latest entry, or None."""
+    return (
+        LedgerEntry.objects.filter(member_id=member_id, account=account)
+        .order_by("-seq")
+        .values_list("seq", "balance", "occurred_at")
+        .first()
+    )
+
+
+def _heads(account, member_ids):
+    """
+    {member_id: (seq, balance, occurred_at)} of the latest entries, in one
+    query driven from the members: three index seeks per member instead of
+    a subquery per entry the members have ever had.
+    """
+    latest = LedgerEntry.objects.filter(member_id=OuterRef("pk"), account=account).order_by("-seq")
+    rows = apps.get_model("members", "Member").objects.filter(pk__in=member_ids).annotate(
+        head_seq=Subquery(latest.values("seq")[:1]),
+        head_balance=Subquery(latest.values("balance")[:1]),
+        head_at=Subquery(latest.values("occurred_at")[:1]),
+    ).filter(head_seq__isnull=False).values_list("pk", "head_seq", "head_balance", "head_at")
+    return {member_id: (seq, balance, when) for member_id, seq, balance, when in rows}
+
+
+def _next_entry(head, member_id, account, amount, source_type, source_id, occurred_at, floor):
+    seq, balance, last_at = head or (0, Decimal("0"), None)
+    amount = Decimal(amount)
+    if floor is not None and balance + amount < floor:
+        amount = floor - balance
+    occurred_at = occurred_at or timezone.now()
+    if last_at and occurred_at < last_at:
+        occurred_at = last_at  # keep seq order and time order the same
+    return LedgerEntry(
+        member_id=member_id, account=account, seq=seq + 1, occurred_at=occurred_at,
+        amount=amount, balance=balance + amount, source_type=source_type, source_id=source_id,
+    )
+
+
+def post(member_id, account, amount, source_type, source_id=None, occurred_at=None, floor=None):
+    """
+    Append one entry and return it. Call it inside the transaction that
+    moves the money. With `floor`, the amount is reduced so the running
+    balance does not drop below it (used for loan repayments).
+    """
+    for attempt in range(POST_RETRIES):
+        entry = _next_entry(_head(member_id, account), member_id, account, amount,
+                            source_type, source_id, occurred_at, floor)
+        try:
+            with transaction.atomic():
+                entry.save()
+            return entry
+        except IntegrityError:
+            # A concurrent post took this seq; read the new head and retry
+            if attempt == POST_RETRIES - 1:
+                raise
+
+
+ENTRY_FIELDS = ("member", "account", "seq", "occurred_at", "amount", "balance", "source_type", "source_id",
+                "created_at")
+CHECKPOINT_FIELDS = ("member", "account", "as_of", "seq", "balance")
+
+
+def _insert_entries(entries):
+    now = timezone.now()
+    return insert_rows(LedgerEntry, ENTRY_FIELDS, [
+        (e.member_id, e.account, e.seq, e.occurred_at, e.amount, e.balance, e.source_type, e.source_id, now)
+        for e in entries
+    ])
+
+
+def post_many(movements):
+    """
+    Append many entries with one head lookup per account and one
+    executemany() insert. `movements` is a list of dicts with the arguments
+    of post(); the returned entries have no primary keys.
+    """
+    return _post_many(movements, {})
+
+
+def _post_many(movements, heads_by_account):
+    by_account = defaultdict(list)
+    for movement in movements:
+        by_account[movement["account"]].append(movement)
+
+    entries = []
+    for account, items in by_account.items():
+        heads = heads_by_account.get(account)
+        if heads is None:
+            heads = _heads(account, {m["member_id"] for m in items})
+        for m in items:
+            entry = _next_entry(heads.get(m["member_id"]), m["member_id"], account, m["amount"],
+                                m["source_type"], m.get("source_id"), m.get("occurred_at"), m.get("floor"))
+            heads[m["member_id"]] = (entry.seq, entry.balance, entry.occurred_at)
+            entries.append(entry)
+
+    try:
+        with transaction.atomic():
+            _insert_entries(entries)
+        return entries
+    except IntegrityError:
+        # Raced with single posts for some member: fall back to one at a time
+        return [post(**m) for m in movements]
+
+
+def post_history(movements):
+    """
+    Append movements recorded after the fact, at their own times. A member
+    whose new entries would fall before their latest entry, or inside the
+    latest checkpoint, is rebuilt from history instead (the rows behind the
+    movements must be saved already), so entries stay in time order and
+    checkpoints stay right; the other members get post_many().
+    """
+    earliest = {}
+    for m in movements:
+        key = (m["member_id"], m["account"])
+        earliest[key] = min(m["occurred_at"], earliest.get(key, m["occurred_at"]))
+
+    backdated, heads_by_account = set(), {}
+    for account in {account for _, account in earliest}:
+        members = {member_id for member_id, a in earliest if a == account}
+        heads = heads_by_account[account] = _heads(account, members)
+        checkpoint = (
+            LedgerCheckpoint.objects.filter(account=account).order_by("-as_of")
+            .values_list("as_of", flat=True).first()
+        )
+        settled = day_start(checkpoint + timedelta(days=1)) if checkpoint else None
+        for member_id in members:
+            when, head = earliest[(member_id, account)], heads.get(member_id)
+            if (head and when < head[2]) or (settled and when < settled):
+                backdated.add(member_id)
+
+    _post_many([m for m in movements if m["member_id"] not in backdated], heads_by_account)
+    if backdated:
+        ends = sorted(set(LedgerCheckpoint.objects.order_by().values_list("as_of", flat=True).distinct()))
+        ids = sorted(backdated)
+        for first in range(0, len(ids), CHUNK_SIZE):
+            rebuild_members(ids[first:first + CHUNK_SIZE], ends)
+
+
+# --- Reads ---
+
+def balance_at(member_id, account, moment):
+    """Balance of the account at `moment` (inclusive)."""
+    balance = (
+        LedgerEntry.objects.filter(member_id=member_id, account=account, occurred_at__lte=moment)
+        .order_by("-occurred_at", "-seq")
+        .values_list("balance", flat=True)
+        .first()
+    )
+    return balance if balance is not None else Decimal("0")
+
+
+def statement(member_id, account, start=None, end=None):
+    """
+    Opening balance, entries and closing balance for the inclusive date range.
+    Costs one index seek plus the entries in the range.
+    """
+    opening = Decimal("0")
+    if start:
+        opening = balance_at(member_id, account, day_start(start) - timedelta(microseconds=1))
+    entries = list(
+        LedgerEntry.objects.filter(
+            member_id=member_id, account=account, **datetime_range_filter("occurred_at", start, end)
+        )
+        .order_by("seq")
+        .values("seq", "occurred_at", "amount", "balance", "source_type", "source_id")
+    )
+    return {
+        "opening_balance": opening,
+        "closing_balance": entries[-1]["balance"] if entries else opening,
+        "entries": entries,
+    }
+
+
+def total_at(account, moment):
+    """
+    Sum of every member's balance on `account` at `moment`: the latest
+    checkpoint before it plus the amounts posted since.
+    """
+    checkpoint = (
+        LedgerCheckpoint.objects.filter(account=account, as_of__lt=timezone.localdate(moment))
+        .order_by("-as_of")
+        .values_list("as_of", flat=True)
+        .first()
+    )
+    total = Decimal("0")
+    since = LedgerEntry.objects.filter(account=account, occurred_at__lte=moment)
+    if checkpoint is not None:
+        total = LedgerCheckpoint.objects.filter(account=account, as_of=checkpoint).aggregate(
+            total=Sum("balance"))["total"] or Decimal("0")
+        since = since.filter(occurred_at__gte=day_start(checkpoint + timedelta(days=1)))
+    return total + (since.aggregate(total=Sum("amount"))["total"] or Decimal("0"))
+
+
+# --- Checkpoints and rebuild ---
+
+def _member_id_chunks(chunk_size):
+    Member = apps.get_model("members", "Member")
+    last = 0
+    while True:
+        ids = list(Member.objects.filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def write_checkpoints(as_of, chunk_size=CHUNK_SIZE):
+    """
+    (Re)write the checkpoints for the end of day `as_of`: one row per member
+    account with entries up to then. Returns the number of rows written.
+    """
+    end = day_start(as_of + timedelta(days=1))
+    written = 0
+    LedgerCheckpoint.objects.filter(as_of=as_of).delete()
+    for ids in _member_id_chunks(chunk_size):
+        checkpoints = []
+        for account in ACCOUNTS:
+            latest = LedgerEntry.objects.filter(
+                member_id=OuterRef("member_id"), account=account, occurred_at__lt=end,
+            ).order_by("-seq")
+            rows = LedgerEntry.objects.filter(
+                account=account, member_id__in=ids, seq=Subquery(latest.values("seq")[:1]),
+            ).values_list("member_id", "seq", "balance")
+            checkpoints += [
+                LedgerCheckpoint(member_id=member_id, account=account, as_of=as_of, seq=seq, balance=balance)
+                for member_id, seq, balance in rows
+            ]
+        LedgerCheckpoint.objects.bulk_create(checkpoints)
+        written += len(checkpoints)
+    return written
+
+
+# (model label, account, sign, timestamp, member path, filter)
+HISTORY = [
+    ("savings.Deposit", "savings", 1, Coalesce("approved_on", "created_at"), "member_id",
+     {"status": "approved"}),
+    ("savings.Withdrawal", "savings", -1, Coalesce("approved_on", "created_at"), "member_id",
+     {"status": "approved"}),
+    ("loans.Loan", "loan", 1, Coalesce("approved_on", "requested_on"), "member_id",
+     {"status__in": ("approved", "completed")}),
+    ("loans.InterestAccrual", "loan", 1, F("posted_at"), "loan__member_id", {}),
+    ("loans.LoanRepayment", "loan", -1, F("date"), "loan__member_id", {}),
+]
+SOURCE_TYPES = {
+    "savings.Deposit": "deposit",
+    "savings.Withdrawal": "withdrawal",
+    "loans.Loan": "loan",
+    "loans.InterestAccrual": "interest",
+    "loans.LoanRepayment": "repayment",
+}
+
+
+def _history(ids):
+    """Yield (member_id, account, occurred_at, order, amount, source_type, source_id) for a member chunk."""
+    for order, (label, account, sign, when, member_path, filters) in enumerate(HISTORY):
+        rows = (
+            apps.get_model(label).objects.filter(**{f"{member_path}__in": ids}, **filters)
+            .annotate(when=when, member_key=F(member_path))
+            .values_list("member_key", "when", "amount", "id")
+        )
+        for member_id, occurred_at, amount, pk in rows:
+            yield member_id, account, occurred_at, order, sign * amount, SOURCE_TYPES[label], pk
+
+
+def _history_start():
+    """Earliest timestamp of anything rebuild() posts, or None."""
+    starts = [
+        apps.get_model(label).objects.filter(**filters).aggregate(start=Min(when))["start"]
+        for label, _, _, when, _, filters in HISTORY
+    ]
+    return min((start for start in starts if start), default=None)
+
+
+def _checkpoint_rows(entries, ends):
+    """
+    CHECKPOINT_FIELDS tuples at each day of `ends` for one member account,
+    given its entries in seq (and so time) order.
+    """
+    times = [entry.occurred_at for entry in entries]
+    rows = []
+    for as_of in ends:
+        covered = bisect_left(times, day_start(as_of + timedelta(days=1)))
+        if covered:
+            last = entries[covered - 1]
+            rows.append((last.member_id, last.account, as_of, last.seq, last.balance))
+    return rows
+
+
+def rebuild_members(ids, ends=()):
+    """
+    Recreate the entries of members `ids` from history, and their
+    checkpoints for the days in `ends`, in one transaction: readers see the
+    old ledger or the new one, never a partial one. Entries keep the times
+    of the rows they come from. Returns (entries written, checkpoints written).
+    """
+    events = sorted(_history(ids), key=lambda e: (e[0], e[1], e[2], e[3], e[6]))
+    accounts = defaultdict(list)
+    for member_id, account, occurred_at, _, amount, source_type, source_id in events:
+        floor = 0 if account == "loan" and amount < 0 else None
+        entries = accounts[(member_id, account)]
+        head = (entries[-1].seq, entries[-1].balance, entries[-1].occurred_at) if entries else None
+        entries.append(_next_entry(head, member_id, account, amount, source_type, source_id, occurred_at, floor))
+    entries = [entry for items in accounts.values() for entry in items]
+    checkpoints = [row for items in accounts.values() for row in _checkpoint_rows(items, ends)]
+
+    with transaction.atomic():
+        LedgerCheckpoint.objects.filter(member_id__in=ids).delete()
+        LedgerEntry.objects.filter(member_id__in=ids).delete()
+        _insert_entries(entries)
+        insert_rows(LedgerCheckpoint, CHECKPOINT_FIELDS, checkpoints)
+    return len(entries), len(checkpoints)
+
+
+def rebuild(chunk_size=CHUNK_SIZE, checkpoints=True):
+    """
+    Recreate the ledger from approved deposits, withdrawals, loans, accrued
+    interest and repayments, with checkpoints at every month end since the
+    first of them. Each chunk of members is replaced in one transaction, so
+    the ledger is never empty while this runs. Returns (entries written,
+    checkpoints written).
+    """
+    ends = month_ends(_history_start()) if checkpoints else ()
+    written = checkpointed = 0
+    for ids in _member_id_chunks(chunk_size):
+        entries, rows = rebuild_members(ids, ends)
+        written += entries
+        checkpointed += rows
+    return written, checkpointed
+
+
+def month_ends(first=None):
+    """Last day of every complete month since `first`, by default the ledger's first entry."""
+    if first is None:
+        first = LedgerEntry.objects.order_by("occurred_at").values_list("occurred_at", flat=True).first()
+    if first is None:
+        return []
+    day = timezone.localdate(first).replace(day=1)
+    this_month = timezone.localdate().replace(day=1)
+    ends = []
+    while day < this_month:
+        following = (day + timedelta(days=32)).replace(day=1)
+        ends.append(following - timedelta(days=1))
+        day = following
+    return ends
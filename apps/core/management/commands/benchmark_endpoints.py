@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.benchmark import compare_reports, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every GET endpoint in config/urls.py (p50/p95/p99, query count) and write a JSON report. "
+        "Run against SQLite with DB_ENGINE=sqlite after seed_sacco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20, help="Timed requests per endpoint.")
+        parser.add_argument("--warmup", type=int, default=1, help="Untimed requests per endpoint first.")
+        parser.add_argument("--cold", action="store_true", help="Clear the cache before every timed request.")
+        parser.add_argument("--endpoint", action="append", dest="only", help="Only this URL name (repeatable).")
+        parser.add_argument("--output", "-o", help="File to write the JSON report to (defaults to stdout).")
+        parser.add_argument("--compare", help="Earlier report to check for regressions.")
+        parser.add_argument("--threshold", type=float, default=20.0, help="Allowed p95 slowdown in percent.")
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be at least 1.")
+
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+
+        report = run_benchmarks(options["iterations"], options["warmup"], options["cold"], options["only"])
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+            for name, entry in sorted(report["endpoints"].items()):
+                self.stdout.write(
+                    f"{name:<32} {entry['status']} p50={entry['p50_ms']}ms p95={entry['p95_ms']}ms "
+                    f"p99={entry['p99_ms']}ms queries={entry['queries']}"
+                )
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = compare_reports(baseline, report, options["threshold"])
+            if regressions:
+                raise CommandError("Regressions found:\n" + "\n".join(regressions))
+            self.stderr.write(self.style.SUCCESS("No regressions against the baseline."))
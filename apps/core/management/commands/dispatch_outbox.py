@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.core.outbox import BATCH_SIZE, drain
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply pending outbox events. Run once to drain the backlog, or with --loop "
+        "as the dispatcher when OUTBOX_DISPATCH='worker'. Several copies can run at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Events claimed per transaction.")
+        parser.add_argument("--loop", action="store_true", help="Keep polling for new events.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            dispatched = drain(options["batch_size"])
+            if dispatched or not options["loop"]:
+                self.stdout.write(self.style.SUCCESS(f"Dispatched {dispatched} outbox events."))
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.exports import EXPORTS, FORMATS, export_queryset, iter_chunks, iter_rows, parse_filters
+
+
+class Command(BaseCommand):
+    help = "Stream deposits, withdrawals, loans or repayments to CSV/NDJSON with flat memory use."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(EXPORTS))
+        parser.add_argument("--format", dest="fmt", choices=list(FORMATS), default="csv")
+        parser.add_argument("--output", "-o", help="File to write (defaults to stdout).")
+        parser.add_argument("--from", dest="from", help="First day to include (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="to", help="Last day to include (YYYY-MM-DD).")
+        parser.add_argument("--status", help="Only rows with this status.")
+        parser.add_argument("--member", help="Only rows for this member id.")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows fetched per database round trip.")
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_filters(options)
+            queryset = export_queryset(options["kind"], filters)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        columns = list(EXPORTS[options["kind"]]["columns"])
+        lines = iter_rows(queryset, columns, options["fmt"], chunk_size=options["chunk_size"])
+
+        if options["output"]:
+            with open(options["output"], "w", newline="") as out:
+                for chunk in iter_chunks(lines):
+                    out.write(chunk)
+        else:
+            for chunk in iter_chunks(lines):
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired Idempotency-Key records. Safe to run from cron at any frequency."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Rows deleted per statement.")
+
+    def handle(self, *args, **options):
+        deleted = purge_expired(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys."))
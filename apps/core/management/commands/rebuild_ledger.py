@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core import ledger
+
+
+class Command(BaseCommand):
+    help = "Rebuild the member ledger from approved transactions, in member chunks, with month-end checkpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=ledger.CHUNK_SIZE, help="Members per transaction.")
+        parser.add_argument("--no-checkpoints", action="store_true", help="Skip writing month-end checkpoints.")
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        entries, checkpoints = ledger.rebuild(options["chunk_size"], checkpoints=not options["no_checkpoints"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt ledger: {entries} entries, {checkpoints} checkpoints written."
+        ))
@@ -0,0 +1,45 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute member savings and loan balances from the transaction history, "
+        "report drift and optionally fix it. Runs in member chunks with flat memory use."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Correct drifted balances.")
+        parser.add_argument("--report", help="Write every drifted account to this CSV file.")
+        parser.add_argument("--chunk-size", type=int, default=reconcile.CHUNK_SIZE, help="Members per chunk.")
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        report = reconcile.ReconciliationReport()
+        drifts = reconcile.iter_drift(options["chunk_size"], fix=options["fix"], report=report)
+        if options["report"]:
+            with open(options["report"], "w", newline="") as out:
+                writer = csv.writer(out)
+                writer.writerow(["member_id", "account", "recorded", "expected", "difference", "fixed", "in_flight"])
+                for drift in drifts:
+                    writer.writerow([drift.member_id, drift.account, drift.recorded, drift.expected,
+                                     drift.difference, drift.fixed, drift.in_flight])
+        else:
+            for _ in drifts:
+                pass
+
+        self.stdout.write(f"Checked {report.members_checked} members.")
+        for account, count in report.drifted.items():
+            self.stdout.write(f"  {account}: {count} drifted, net drift {report.net_drift[account]}")
+        if report.in_flight:
+            self.stdout.write(self.style.WARNING(
+                f"  {report.in_flight} accounts have balance changes in flight (outbox events not "
+                "dispatched yet) and were left alone."
+            ))
+        style = self.style.SUCCESS if not any(report.drifted.values()) or options["fix"] else self.style.WARNING
+        self.stdout.write(style(f"Fixed {report.fixed} balances." if options["fix"] else "Run with --fix to correct."))
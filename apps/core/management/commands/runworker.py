@@ -0,0 +1,26 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from apps.core.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs on a pool of threads until stopped (SIGINT/SIGTERM finish the "
+        "running jobs first). Any number of workers can share the queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4, help="Jobs run at once.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds between polls of an empty queue.")
+        parser.add_argument("--burst", action="store_true", help="Exit once no job is ready.")
+        parser.add_argument("--name", help="Worker name recorded on claimed jobs (default host:pid).")
+
+    def handle(self, *args, **options):
+        worker = Worker(threads=options["threads"], interval=options["interval"], name=options["name"])
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: worker.stop())
+        self.stdout.write(f"Worker {worker.name} running {worker.threads} threads.")
+        worker.run(burst=options["burst"])
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker.name} stopped."))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.synthetic import SaccoSeeder, SeedConfig
+
+
+class Command(BaseCommand):
+    help = "Seed a synthetic SACCO (users, members, savings, loans) with bulk inserts for benchmarking."
+
+    def add_arguments(self, parser):
+        defaults = SeedConfig()
+        parser.add_argument("--members", type=int, default=defaults.members, help="Members to create.")
+        parser.add_argument("--staff", type=int, default=defaults.staff, help="Staff users acting as approvers.")
+        parser.add_argument("--months", type=int, default=defaults.months, help="Months of history to spread activity over.")
+        parser.add_argument("--deposits", type=float, default=defaults.deposits, help="Mean deposits per member.")
+        parser.add_argument("--withdrawals", type=float, default=defaults.withdrawals, help="Mean withdrawals per member.")
+        parser.add_argument("--loan-share", type=float, default=defaults.loan_share, help="Share of members who borrow (0-1).")
+        parser.add_argument("--prefix", default=defaults.prefix, help="Username prefix for seeded users.")
+        parser.add_argument("--password", help="Password for seeded users (unusable if omitted).")
+        parser.add_argument("--seed", type=int, default=defaults.seed, help="Random seed, for reproducible data.")
+        parser.add_argument("--no-interest", action="store_true",
+                            help="Skip writing the daily interest accrued on loans.")
+        parser.add_argument("--batch-size", type=int, default=defaults.batch_size, help="Members written per transaction.")
+
+    def handle(self, *args, **options):
+        if options["members"] < 0 or options["batch_size"] < 1 or options["months"] < 1:
+            raise CommandError("--members must be >= 0, --batch-size and --months >= 1.")
+        if not 0 <= options["loan_share"] <= 1:
+            raise CommandError("--loan-share must be between 0 and 1.")
+
+        config = SeedConfig(
+            members=options["members"],
+            staff=options["staff"],
+            months=options["months"],
+            deposits=options["deposits"],
+            withdrawals=options["withdrawals"],
+            loan_share=options["loan_share"],
+            prefix=options["prefix"],
+            password=options["password"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            interest=not options["no_interest"],
+        )
+        result = SaccoSeeder(config).run()
+        summary = ", ".join(f"{n} {name}" for name, n in result.counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded: {summary}."))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apps.core import ledger
+
+
+class Command(BaseCommand):
+    help = "Write ledger balance checkpoints for the end of a day (yesterday by default). Safe to re-run."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Day to checkpoint (YYYY-MM-DD).")
+        parser.add_argument("--chunk-size", type=int, default=ledger.CHUNK_SIZE, help="Members per batch.")
+
+    def handle(self, *args, **options):
+        as_of = timezone.localdate() - timedelta(days=1)
+        if options["date"]:
+            as_of = parse_date(options["date"])
+            if as_of is None:
+                raise CommandError("--date must be a date in YYYY-MM-DD format.")
+        if as_of >= timezone.localdate():
+            raise CommandError("Only days that have ended can be checkpointed.")
+
+        written = ledger.write_checkpoints(as_of, options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} ledger checkpoints for {as_of}."))
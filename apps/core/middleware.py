@@ -0,0 +1,150 @@
+"""
+Per-request query and timing instrumentation.
+
+RequestTimingMiddleware wraps every database connection with an execute
+wrapper for the duration of the request and reports:
+
+- db:     number of queries and total SQL time
+- dup:    queries repeated with identical SQL and parameters
+- render: time spent rendering the response (DRF renderers)
+- app:    remaining view time, including serializer work
+- total:  wall time through the rest of the middleware stack
+
+Figures go out in a Server-Timing header and one structured log line;
+requests slower than REQUEST_TIMING_SLOW_MS are logged as warnings, the
+others at INFO, which the default REQUEST_TIMING_LOG_LEVEL (WARNING)
+drops. A streaming response (e.g. an export) is timed until its last
+chunk is sent, queries made while streaming included; its headers are
+gone by then, so it is only logged.
+Overhead is a counter and a perf_counter() pair per query.
+"""
+import json
+import logging
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class RequestStats:
+    """Counters for one request; also the execute wrapper passed to each connection."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.duplicates = 0
+        self.render_time = 0.0
+        self._render_started = None
+        self._seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += perf_counter() - started
+            self.queries += 1
+            try:
+                key = hash((sql, tuple(params) if params is not None and not many else None))
+            except TypeError:
+                key = hash((sql, repr(params)))
+            if key in self._seen:
+                self.duplicates += 1
+            else:
+                self._seen.add(key)
+
+    def render_started(self):
+        self._render_started = perf_counter()
+
+    def render_finished(self, response):
+        if self._render_started is not None:
+            self.render_time = perf_counter() - self._render_started
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class RequestTimingMiddleware:
+    """
+    Instruments every request without changes to the views.
+    Settings: REQUEST_TIMING_ENABLED, REQUEST_TIMING_HEADER, REQUEST_TIMING_SLOW_MS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "REQUEST_TIMING_ENABLED", True)
+        self.send_header = getattr(settings, "REQUEST_TIMING_HEADER", True)
+        self.slow_ms = getattr(settings, "REQUEST_TIMING_SLOW_MS", 500)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        stats = RequestStats()
+        request.timing_stats = stats
+        started = perf_counter()
+        with self.instrument(stats):
+            response = self.get_response(request)
+
+        if response.streaming and not response.is_async:
+            content = response.streaming_content
+            response.streaming_content = self.timed_stream(request, response, content, stats, started)
+            return response
+        self.report(request, response, stats, perf_counter() - started)
+        return response
+
+    @staticmethod
+    def instrument(stats):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(stats))
+        return stack
+
+    def timed_stream(self, request, response, content, stats, started):
+        """Pass a streaming response's chunks through, reporting once the last one is sent."""
+        try:
+            with self.instrument(stats):
+                yield from content
+        finally:
+            self.report(request, response, stats, perf_counter() - started, send_header=False)
+
+    def process_template_response(self, request, response):
+        # DRF responses render after this hook; time the render itself
+        stats = getattr(request, "timing_stats", None)
+        if stats is not None:
+            stats.render_started()
+            response.add_post_render_callback(stats.render_finished)
+        return response
+
+    def report(self, request, response, stats, total, send_header=True):
+        app_time = max(total - stats.sql_time - stats.render_time, 0)
+        if self.send_header and send_header:
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={_ms(stats.sql_time)};desc="{stats.queries} queries"',
+                f'dup;desc="{stats.duplicates} duplicate queries"',
+                f"render;dur={_ms(stats.render_time)}",
+                f"app;dur={_ms(app_time)}",
+                f"total;dur={_ms(total)}",
+            ])
+
+        slow = _ms(total) >= self.slow_ms
+        if not slow and not logger.isEnabledFor(logging.INFO):
+            return
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": _ms(total),
+            "db_ms": _ms(stats.sql_time),
+            "queries": stats.queries,
+            "duplicate_queries": stats.duplicates,
+            "render_ms": _ms(stats.render_time),
+            "app_ms": _ms(app_time),
+            "streaming": response.streaming,
+            "slow": slow,
+        }
+        logger.log(logging.WARNING if slow else logging.INFO, json.dumps(record), extra={"timing": record})
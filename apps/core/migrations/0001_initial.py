@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('members', '0004_alter_member_loan_balance_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(choices=[('savings', 'Savings'), ('loan', 'Loan')], max_length=10)),
+                ('as_of', models.DateField()),
+                ('seq', models.PositiveBigIntegerField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_checkpoints', to='members.member')),
+            ],
+            options={
+                'ordering': ['as_of', 'member', 'account'],
+                'indexes': [models.Index(fields=['account', 'as_of'], name='ledger_checkpoint_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('member', 'account', 'as_of'), name='unique_ledger_checkpoint')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(choices=[('savings', 'Savings'), ('loan', 'Loan')], max_length=10)),
+                ('seq', models.PositiveBigIntegerField()),
+                ('occurred_at', models.DateTimeField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('source_type', models.CharField(choices=[('deposit', 'Deposit'), ('withdrawal', 'Withdrawal'), ('loan', 'Loan disbursement'), ('repayment', 'Loan repayment'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('source_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='members.member')),
+            ],
+            options={
+                'ordering': ['member', 'account', 'seq'],
+                'indexes': [models.Index(fields=['member', 'account', 'occurred_at'], name='ledger_member_time_idx'), models.Index(fields=['account', 'occurred_at'], name='ledger_account_time_idx')],
+                'constraints': [models.UniqueConstraint(fields=('member', 'account', 'seq'), name='unique_ledger_seq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_job'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='source_type',
+            field=models.CharField(choices=[('deposit', 'Deposit'), ('withdrawal', 'Withdrawal'), ('loan', 'Loan disbursement'), ('repayment', 'Loan repayment'), ('interest', 'Loan interest'), ('adjustment', 'Adjustment')], max_length=20),
+        ),
+    ]
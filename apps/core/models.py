@@ -1,3 +1,182 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
-# Create your models here.
+
+class LedgerEntry(models.Model):
+    """
+    One movement of money on a member's savings or loan account.
+    Entries are append-only: `seq` numbers them per (member, account) and
+    `balance` is the running balance after the entry, so the balance at any
+    moment is the last entry at or before it (apps/core/ledger.py).
+    """
+    ACCOUNT_CHOICES = [
+        ("savings", "Savings"),
+        ("loan", "Loan"),
+    ]
+    SOURCE_CHOICES = [
+        ("deposit", "Deposit"),
+        ("withdrawal", "Withdrawal"),
+        ("loan", "Loan disbursement"),
+        ("repayment", "Loan repayment"),
+        ("interest", "Loan interest"),
+        ("adjustment", "Adjustment"),
+    ]
+
+    member = models.ForeignKey("members.Member", on_delete=models.CASCADE, related_name="ledger_entries")
+    account = models.CharField(max_length=10, choices=ACCOUNT_CHOICES)
+    seq = models.PositiveBigIntegerField()
+    occurred_at = models.DateTimeField()
+    # Signed: credits to the account are positive, debits negative
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    source_type = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    source_id = models.PositiveBigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["member", "account", "seq"]
+        constraints = [
+            models.UniqueConstraint(fields=["member", "account", "seq"], name="unique_ledger_seq"),
+        ]
+        indexes = [
+            models.Index(fields=["member", "account", "occurred_at"], name="ledger_member_time_idx"),
+            models.Index(fields=["account", "occurred_at"], name="ledger_account_time_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.member_id} {self.account} {self.seq}: {self.amount} -> {self.balance}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only; post a new entry instead.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries are append-only and cannot be deleted.")
+
+
+class LedgerCheckpoint(models.Model):
+    """
+    A member's account balance at the end of `as_of`, with the seq of the
+    last entry it covers. Sacco-wide balances as of a date are read from the
+    nearest checkpoint plus the entries posted since.
+    """
+    member = models.ForeignKey("members.Member", on_delete=models.CASCADE, related_name="ledger_checkpoints")
+    account = models.CharField(max_length=10, choices=LedgerEntry.ACCOUNT_CHOICES)
+    as_of = models.DateField()
+    seq = models.PositiveBigIntegerField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        ordering = ["as_of", "member", "account"]
+        constraints = [
+            models.UniqueConstraint(fields=["member", "account", "as_of"], name="unique_ledger_checkpoint"),
+        ]
+        indexes = [
+            models.Index(fields=["account", "as_of"], name="ledger_checkpoint_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.member_id} {self.account} @ {self.as_of}: {self.balance}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The stored response of a create request sent with an Idempotency-Key
+    header. The row is inserted in the same transaction as the write, so a
+    retry either waits for it and replays the response, or (if the write
+    rolled back) runs again. See apps/core/idempotency.py.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="idempotency_keys")
+    key = models.CharField(max_length=255)
+    # sha256 of method, path and body: a key may not be reused for a different request
+    fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_idempotency_key"),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"], name="idempotency_expiry_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} (user #{self.user_id}): {self.response_status}"
+
+
+class OutboxEvent(models.Model):
+    """
+    A side effect recorded in the same transaction as the write that caused
+    it, applied after commit by apps/core/outbox.py. Pending events have no
+    dispatched_at; an event whose handler keeps failing stops being retried
+    after outbox.MAX_ATTEMPTS.
+    """
+    topic = models.CharField(max_length=64)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["id"], condition=models.Q(dispatched_at__isnull=True), name="outbox_pending_idx"),
+            models.Index(fields=["dispatched_at"], name="outbox_dispatched_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.topic} ({'dispatched' if self.dispatched_at else 'pending'})"
+
+
+class Job(models.Model):
+    """
+    A unit of background work run by `manage.py runworker` (apps/core/jobs.py).
+    Queued jobs run when run_after has passed, highest priority first; a
+    failed job is queued again with a backoff until max_attempts is reached.
+    """
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    last_error = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="jobs",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-id"]
+        indexes = [
+            # The claim query: ready jobs by priority, then age
+            models.Index(
+                fields=["-priority", "run_after", "id"], condition=models.Q(status="queued"), name="job_queue_idx",
+            ),
+            models.Index(
+                fields=["name", "-priority", "run_after", "id"], condition=models.Q(status="queued"),
+                name="job_queue_name_idx",
+            ),
+            models.Index(fields=["status", "locked_at"], name="job_status_locked_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.name} ({self.status})"
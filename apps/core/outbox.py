@@ -0,0 +1,167 @@
+"""
+Transactional outbox for side effects of writes.
+
+publish() stores an OutboxEvent in the caller's transaction, so the event
+exists if and only if the write it describes committed. After commit the
+events are dispatched in id order, in batches:
+- consecutive events with the same topic go to their handler together, so
+  a handler can coalesce them (e.g. one balance UPDATE per member)
+- each run of events is applied in a savepoint; if its handler raises, its
+  events are released for a retry, up to MAX_ATTEMPTS
+- batches are claimed with SELECT ... FOR UPDATE SKIP LOCKED where the
+  database supports it, and otherwise by marking them dispatched with one
+  UPDATE before anything is read, so concurrent dispatchers never apply an
+  event twice
+
+settings.OUTBOX_DISPATCH picks who dispatches after commit:
+- "thread" (default): a background thread in the same process, so the
+  request only pays for the primary write and the event insert
+- "sync": the committing thread, right after commit
+- "worker": nobody; run `manage.py dispatch_outbox --loop`
+"""
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .cache import bump_data_version
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+MAX_ATTEMPTS = 5
+MODES = ("thread", "sync", "worker")
+
+# topic -> function(payloads) applying a run of events in order
+handlers = {}
+
+
+def handler(topic):
+    """Register the function applying events of `topic`; it receives a list of payloads."""
+    def decorator(func):
+        handlers[topic] = func
+        return func
+    return decorator
+
+
+def publish(topic, **payload):
+    """Record an event in the current transaction; it is dispatched after commit."""
+    event = OutboxEvent.objects.create(topic=topic, payload=payload)
+    transaction.on_commit(_notify)
+    return event
+
+
+def _mode():
+    mode = getattr(settings, "OUTBOX_DISPATCH", "thread")
+    if mode not in MODES:
+        raise ValueError(f"OUTBOX_DISPATCH must be one of: {', '.join(MODES)}.")
+    return mode
+
+
+def _notify():
+    mode = _mode()
+    if mode == "sync":
+        drain()
+    elif mode == "thread":
+        _dispatcher.wake()
+
+
+# --- Dispatch ---
+
+def pending():
+    """Events committed but not dispatched yet, that will still be tried."""
+    return OutboxEvent.objects.filter(dispatched_at__isnull=True, attempts__lt=MAX_ATTEMPTS).order_by("id")
+
+
+def _claim(batch_size, now):
+    """Claim a batch of pending events inside the current transaction."""
+    if connection.features.has_select_for_update_skip_locked:
+        events = list(pending().select_for_update(skip_locked=True)[:batch_size])
+        OutboxEvent.objects.filter(pk__in=[e.pk for e in events]).update(dispatched_at=now)
+        return events
+    # A write first takes the database write lock, serialising dispatchers
+    claimed = OutboxEvent.objects.filter(pk__in=pending().values("pk")[:batch_size]).update(dispatched_at=now)
+    if not claimed:
+        return []
+    return list(OutboxEvent.objects.filter(dispatched_at=now, attempts__lt=MAX_ATTEMPTS).order_by("id"))
+
+
+def _runs(events):
+    """Split events into runs of consecutive events with the same topic."""
+    run = []
+    for event in events:
+        if run and event.topic != run[-1].topic:
+            yield run
+            run = []
+        run.append(event)
+    if run:
+        yield run
+
+
+def dispatch(batch_size=BATCH_SIZE):
+    """Claim and apply one batch of events. Returns the number of events claimed."""
+    with transaction.atomic():
+        events = _claim(batch_size, timezone.now())
+        failed = defaultdict(list)
+        for run in _runs(events):
+            func = handlers.get(run[0].topic)
+            try:
+                if func is None:
+                    raise LookupError(f"No outbox handler for topic {run[0].topic!r}.")
+                with transaction.atomic():
+                    func([event.payload for event in run])
+            except Exception as exc:
+                logger.exception("Outbox handler for %s failed on %d events", run[0].topic, len(run))
+                failed[f"{type(exc).__name__}: {exc}"] += [event.pk for event in run]
+        for error, ids in failed.items():
+            for event in OutboxEvent.objects.filter(pk__in=ids):
+                event.dispatched_at, event.attempts, event.last_error = None, event.attempts + 1, error
+                event.save(update_fields=["dispatched_at", "attempts", "last_error"])
+        if len(events) > sum(len(ids) for ids in failed.values()):
+            # Handlers write with plain UPDATEs: invalidate cached dashboards once
+            transaction.on_commit(bump_data_version)
+    return len(events)
+
+
+def drain(batch_size=BATCH_SIZE):
+    """Dispatch batches until no pending events are left. Returns the number claimed."""
+    total = 0
+    while True:
+        claimed = dispatch(batch_size)
+        total += claimed
+        if claimed < batch_size:
+            return total
+
+
+class _Dispatcher:
+    """Background thread draining the outbox whenever a transaction with events commits."""
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def wake(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                drain()
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+            finally:
+                close_old_connections()
+
+
+_dispatcher = _Dispatcher()
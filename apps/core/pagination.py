@@ -0,0 +1,212 @@
+"""
+Keyset (cursor) pagination.
+
+A cursor is the sort key of the last row on a page, encoded as opaque
+URL-safe text. The next page is read with a range predicate on that key,
+so it costs one index seek however deep the client has paged.
+
+- encode_cursor()/decode_cursor()/page_size() for hand-written endpoints
+  such as the member statement
+- KeysetPagination, the default for every DRF list view
+"""
+import base64
+import datetime
+import decimal
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    # Full isoformat: DjangoJSONEncoder drops microseconds, which would skip rows
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Cannot use {type(value).__name__} in a cursor.")
+
+
+def encode_cursor(key):
+    """Encode a sort key (a list of JSON-serialisable values) as cursor text."""
+    data = json.dumps(list(key), default=_encode_value, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Decode cursor text back into a list. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+    if not isinstance(key, list):
+        raise ValueError("Invalid cursor.")
+    return key
+
+
+def page_size(params, default, maximum):
+    """Read ?page_size, capped at `maximum`. Raises ValueError on malformed input."""
+    value = params.get("page_size")
+    if not value:
+        return default
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("'page_size' must be a positive integer.")
+    if size < 1:
+        raise ValueError("'page_size' must be a positive integer.")
+    return min(size, maximum)
+
+
+# --- List endpoints ---
+
+def seek_filter(ordering, key):
+    """
+    Q matching the rows after `key` (a value per field) in `ordering`.
+    Written as f1 <= k1 AND (f1 < k1 OR ...) for descending fields (>= and
+    > for ascending ones), so the leading field is a range an index can seek.
+    """
+    field, *rest = ordering
+    name, op = field.lstrip("-"), "lt" if field.startswith("-") else "gt"
+    after = Q(**{f"{name}__{op}": key[0]})
+    if not rest:
+        return after
+    return Q(**{f"{name}__{op}e": key[0]}) & (after | seek_filter(rest, key[1:]))
+
+
+def _reversed(ordering):
+    return tuple(field[1:] if field.startswith("-") else f"-{field}" for field in ordering)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination for list viewsets, ordered by the view's queryset
+    ordering (e.g. -created_at) with `id` appended as a tie-break so the
+    order is total. The `next` cursor holds the whole sort key of the
+    page's last row and `previous` that of its first, so pages never
+    repeat or skip rows, however many rows share a timestamp.
+
+    ?page_size= picks the page size (capped at max_page_size).
+    ?mode=offset switches to offset pagination for clients that need to
+    jump to a page; it never runs COUNT(*) and reports `next` by reading one
+    row past the page. A malformed ?cursor= or ?offset= is a 400, as on the
+    hand-written endpoints.
+    """
+    page_size = settings.REST_FRAMEWORK.get("PAGE_SIZE") or 50
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "PAGINATION_MAX_PAGE_SIZE", 200)
+    mode_query_param = "mode"
+    offset_query_param = "offset"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.mode = request.query_params.get(self.mode_query_param, "cursor")
+        if self.mode == "offset":
+            return self._paginate_offset(queryset, request, view)
+        return self._paginate_cursor(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(
+            getattr(view, "pagination_ordering", None)
+            or queryset.query.order_by
+            or queryset.model._meta.ordering
+            or ("-pk",)
+        )
+        for field in ordering:
+            if not isinstance(field, str) or "__" in field:
+                raise ImproperlyConfigured(
+                    f"{type(view).__name__}: cursor pagination needs plain field orderings, got {field!r}."
+                )
+        if not any(field.lstrip("-") in ("id", "pk") for field in ordering):
+            ordering += ("-id" if ordering[0].startswith("-") else "id",)
+        return ordering
+
+    def get_next_link(self):
+        return self._cursor_link(False, self.next_key)
+
+    def get_previous_link(self):
+        return self._cursor_link(True, self.previous_key)
+
+    def get_paginated_response(self, data):
+        if self.mode == "offset":
+            return Response({"next": self._offset_link(self.offset + self.page_size) if self.has_next else None,
+                             "previous": self._offset_link(self.offset - self.page_size) if self.offset else None,
+                             "results": data})
+        return super().get_paginated_response(data)
+
+    def _paginate_cursor(self, queryset, request, view):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        reverse, key = self._read_cursor(request)
+
+        ordering = _reversed(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if key is not None:
+            queryset = queryset.filter(seek_filter(ordering, key))
+        rows = list(queryset[:self.page_size + 1])
+        more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        # Paging forwards there is a previous page if we came from a cursor,
+        # paging backwards there is a next one
+        self.has_next = bool(self.page) and (key is not None if reverse else more)
+        self.has_previous = bool(self.page) and (more if reverse else key is not None)
+        self.next_key = self._key(self.page[-1]) if self.has_next else None
+        self.previous_key = self._key(self.page[0]) if self.has_previous else None
+        self.display_page_controls = self.has_next or self.has_previous
+        return self.page
+
+    def _read_cursor(self, request):
+        """(reverse, sort key or None) from ?cursor=. Raises ValidationError if it is malformed."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return False, None
+        try:
+            reverse, *key = decode_cursor(cursor)
+        except ValueError:
+            reverse, key = None, []
+        if reverse not in (0, 1) or len(key) != len(self.ordering):
+            raise ValidationError({self.cursor_query_param: self.invalid_cursor_message})
+        return bool(reverse), key
+
+    def _key(self, row):
+        names = [field.lstrip("-") for field in self.ordering]
+        if isinstance(row, dict):
+            return [row[name] for name in names]
+        return [getattr(row, name) for name in names]
+
+    def _cursor_link(self, reverse, key):
+        if key is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, encode_cursor([int(reverse), *key]))
+
+    def _paginate_offset(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.offset = int(request.query_params.get(self.offset_query_param, 0))
+        except ValueError:
+            self.offset = -1
+        if self.offset < 0:
+            raise ValidationError({self.offset_query_param: "Must be a non-negative integer."})
+        if not queryset.ordered:
+            queryset = queryset.order_by(*self.get_ordering(request, queryset, view))
+        rows = list(queryset[self.offset:self.offset + self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        return rows[:self.page_size]
+
+    def _offset_link(self, offset):
+        url = replace_query_param(self.request.build_absolute_uri(), self.mode_query_param, "offset")
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        if offset <= 0:
+            return remove_query_param(url, self.offset_query_param)
+        return replace_query_param(url, self.offset_query_param, offset)
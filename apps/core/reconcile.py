@@ -0,0 +1,219 @@
+"""
+Balance reconciliation.
+
+Recomputes every member's expected balances from the transaction history
+and compares them with Member.savings_balance / loan_balance:
+- savings: approved deposits minus approved withdrawals
+- loan: for each approved or completed loan, principal plus accrued
+  interest minus its repayments (never below zero), summed per member
+
+Members are processed in chunks of consecutive IDs. Each chunk costs one
+balance read plus one grouped aggregate per source, filtered on a member
+ID range, so memory is bounded by the chunk size whatever the member
+count. With fix=True, drifted members are locked, their expected balances
+recomputed under the lock, and the ones still off are corrected with one
+bulk_update per chunk.
+
+Balance changes are applied after commit by outbox handlers, with
+relative UPDATEs. Each chunk therefore drains the outbox first, and a
+member that still has an undispatched event (one committed since, or
+still being retried) is reported as in flight and left alone: correcting
+it to its history would have the pending handler apply the change again.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from . import outbox
+from .cache import bump_data_version
+
+CHUNK_SIZE = 5000
+CENTS = Decimal("0.01")
+ACCOUNT_FIELDS = {"savings": "savings_balance", "loan": "loan_balance"}
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+@dataclass
+class Drift:
+    member_id: int
+    account: str
+    recorded: Decimal
+    expected: Decimal
+    fixed: bool = False
+    # The member has balance events not dispatched yet: not counted or fixed
+    in_flight: bool = False
+
+    @property
+    def difference(self):
+        return self.recorded - self.expected
+
+
+@dataclass
+class ReconciliationReport:
+    members_checked: int = 0
+    drifted: dict = field(default_factory=lambda: dict.fromkeys(ACCOUNT_FIELDS, 0))
+    net_drift: dict = field(default_factory=lambda: dict.fromkeys(ACCOUNT_FIELDS, Decimal("0")))
+    fixed: int = 0
+    in_flight: int = 0
+
+    def add(self, drift):
+        if drift.in_flight:
+            self.in_flight += 1
+            return
+        self.drifted[drift.account] += 1
+        self.net_drift[drift.account] += drift.difference
+        self.fixed += drift.fixed
+
+
+def _grouped(queryset, member_path, value):
+    rows = queryset.values(member_key=F(member_path)).annotate(total=Sum(value)).order_by()
+    return {row["member_key"]: row["total"] or Decimal("0") for row in rows}
+
+
+def expected_balances(members):
+    """
+    {member_id: {"savings": Decimal, "loan": Decimal}} for the members
+    selected by `members`, a filter on member_id (e.g. {"member_id__in": ids}
+    or a __gte/__lte range).
+    """
+    Deposit = apps.get_model("savings", "Deposit")
+    Withdrawal = apps.get_model("savings", "Withdrawal")
+    Loan = apps.get_model("loans", "Loan")
+    LoanRepayment = apps.get_model("loans", "LoanRepayment")
+    InterestAccrual = apps.get_model("loans", "InterestAccrual")
+
+    deposits = _grouped(Deposit.objects.filter(status="approved", **members), "member_id", "amount")
+    withdrawals = _grouped(Withdrawal.objects.filter(status="approved", **members), "member_id", "amount")
+    repaid = (
+        LoanRepayment.objects.filter(loan=OuterRef("pk")).order_by()
+        .values("loan").annotate(total=Sum("amount")).values("total")
+    )
+    accrued = (
+        InterestAccrual.objects.filter(loan=OuterRef("pk")).order_by()
+        .values("loan").annotate(total=Sum("amount")).values("total")
+    )
+    loans = _grouped(
+        Loan.objects.filter(status__in=("approved", "completed"), **members)
+        .annotate(repaid=Coalesce(Subquery(repaid), Value(0), output_field=MONEY),
+                  accrued=Coalesce(Subquery(accrued), Value(0), output_field=MONEY)),
+        "member_id",
+        Greatest(F("amount") + F("accrued") - F("repaid"), Value(0), output_field=MONEY),
+    )
+
+    zero = Decimal("0")
+    expected = {}
+    for member_id in deposits.keys() | withdrawals.keys() | loans.keys():
+        expected[member_id] = {
+            "savings": (deposits.get(member_id, zero) - withdrawals.get(member_id, zero)).quantize(CENTS),
+            "loan": loans.get(member_id, zero).quantize(CENTS),
+        }
+    return expected
+
+
+def _drifts(balances, expected):
+    zero = {account: Decimal("0.00") for account in ACCOUNT_FIELDS}
+    for member_id, recorded in balances.items():
+        wanted = expected.get(member_id, zero)
+        for account, name in ACCOUNT_FIELDS.items():
+            if recorded[name] != wanted[account]:
+                yield Drift(member_id, account, recorded[name], wanted[account])
+
+
+def _balances(queryset):
+    return {
+        row["id"]: row
+        for row in queryset.values("id", *ACCOUNT_FIELDS.values())
+    }
+
+
+def _in_flight(member_ids):
+    """The members among `member_ids` with balance events that are not dispatched yet."""
+    Loan = apps.get_model("loans", "Loan")
+    members, loans = set(), set()
+    for payload in outbox.pending().values_list("payload", flat=True):
+        if "member_id" in payload:
+            members.add(payload["member_id"])
+        elif "loan_id" in payload:
+            loans.add(payload["loan_id"])
+    if loans:
+        members.update(Loan.objects.filter(pk__in=loans).values_list("member_id", flat=True))
+    return members & set(member_ids)
+
+
+def _mark_in_flight(drifts, in_flight):
+    for drift in drifts:
+        drift.in_flight = drift.member_id in in_flight
+    return drifts
+
+
+def _fix(member_ids):
+    """
+    Lock the members, recompute and correct those still off and not in
+    flight. Returns their Drifts.
+    """
+    Member = apps.get_model("members", "Member")
+    with transaction.atomic():
+        members = {
+            member.pk: member
+            for member in Member.objects.select_for_update().filter(pk__in=member_ids).order_by("pk")
+        }
+        # Read under the lock: a handler dispatching now either committed
+        # before it or waits for it, with its event still pending
+        in_flight = _in_flight(members)
+        expected = expected_balances({"member_id__in": list(members)})
+        drifts = _mark_in_flight(list(_drifts(
+            {pk: {name: getattr(m, name) for name in ACCOUNT_FIELDS.values()} for pk, m in members.items()},
+            expected,
+        )), in_flight)
+        for drift in drifts:
+            if not drift.in_flight:
+                setattr(members[drift.member_id], ACCOUNT_FIELDS[drift.account], drift.expected)
+                drift.fixed = True
+        changed = {drift.member_id for drift in drifts if drift.fixed}
+        Member.objects.bulk_update([members[pk] for pk in changed], list(ACCOUNT_FIELDS.values()))
+        if changed:
+            # bulk_update sends no signals: invalidate cached dashboards ourselves
+            transaction.on_commit(bump_data_version)
+    return drifts
+
+
+def iter_drift(chunk_size=CHUNK_SIZE, fix=False, report=None):
+    """
+    Yield a Drift for every member account whose recorded balance differs
+    from its history, chunk by chunk, after dispatching the outbox. With
+    fix=True the balances are corrected and the yielded Drifts carry
+    fixed=True; those of members still in flight carry in_flight=True
+    either way. Counts are added to `report` if one is given.
+    """
+    Member = apps.get_model("members", "Member")
+    last = 0
+    while True:
+        ids = list(Member.objects.filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            return
+        first, last = ids[0], ids[-1]
+        outbox.drain()
+        balances = _balances(Member.objects.filter(pk__gte=first, pk__lte=last))
+        expected = expected_balances({"member_id__gte": first, "member_id__lte": last})
+        drifts = list(_drifts(balances, expected))
+        if fix and drifts:
+            drifts = _fix({drift.member_id for drift in drifts})
+        elif drifts:
+            drifts = _mark_in_flight(drifts, _in_flight({drift.member_id for drift in drifts}))
+        if report is not None:
+            report.members_checked += len(balances)
+            for drift in drifts:
+                report.add(drift)
+        yield from drifts
+
+
+def reconcile(chunk_size=CHUNK_SIZE, fix=False):
+    """Run a full pass and return the ReconciliationReport (drift rows are not kept)."""
+    report = ReconciliationReport()
+    for _ in iter_drift(chunk_size, fix, report):
+        pass
+    return report
@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import ModelSignal, post_delete, post_save
+
+from .cache import bump_data_version
+
+# Sent after a row was changed with queryset.update(), which skips post_save.
+# Receivers get `instance` (the in-memory row, already carrying the new values)
+# and `update_fields`; they should treat it like post_save with created=False.
+row_updated = ModelSignal(use_caching=True)
+
+# Batch form of row_updated for bulk operations: `instances` is a list of rows.
+rows_updated = ModelSignal(use_caching=True)
+
+# Models whose writes change what the cached dashboards report
+VERSIONED_MODELS = [
+    "members.Member",
+    "savings.Deposit",
+    "savings.Withdrawal",
+    "loans.Loan",
+    "loans.LoanRepayment",
+    "staff.Staff",
+]
+
+
+def invalidate_cached_responses(sender, **kwargs):
+    """
+    Bump the data version once the write is committed, so no request can
+    cache pre-commit figures under the new version.
+    """
+    transaction.on_commit(bump_data_version)
+
+
+for label in VERSIONED_MODELS:
+    post_save.connect(invalidate_cached_responses, sender=label)
+    post_delete.connect(invalidate_cached_responses, sender=label)
+    row_updated.connect(invalidate_cached_responses, sender=label)
+    rows_updated.connect(invalidate_cached_responses, sender=label)
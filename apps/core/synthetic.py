@@ -0,0 +1,309 @@
+"""
+Synthetic SACCO data for benchmarks and local testing.
+
+Rows are generated in memory one chunk of members at a time and written
+with bulk_create, so no per-row post_save signals run. Member balances are
+computed while generating, and the activity rollup, leaderboards and
+response cache are rebuilt once at the end.
+
+Distributions (all driven by one seeded random.Random):
+- join dates uniform over the history window
+- deposits per member exponential around the mean, amounts log-normal
+- withdrawals capped at 80% of a member's approved deposits
+- a share of members borrow 1-3 log-normal loans; approved loans get
+  their installment schedule, computed for the whole chunk at once, and
+  most borrowers pay each installment within a few days of its due date
+  while a few stop paying partway through
+- interest accrues daily up to yesterday exactly as accrue_interest would
+  have charged it, so loan balances, schedules and repayments agree
+- anything recorded in the last 30 days may still be pending
+"""
+import math
+import random
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from apps.analytics import leaderboard, rollup
+from apps.loans import accrual
+from apps.loans import schedule as loan_schedule
+
+from .cache import bump_data_version
+from .dates import day_start
+from .updates import insert_rows
+
+CENTS = Decimal("0.01")
+PENDING_WINDOW = timedelta(days=30)
+INTEREST_RATES = (Decimal("10.00"), Decimal("12.00"), Decimal("14.00"))
+DURATIONS = (6, 12, 24)
+# Share of approved loans whose borrower stops paying at some installment
+DEFAULT_SHARE = 0.08
+# Installments are paid between these many days before and after they fall due
+PAYMENT_DAYS = (-3, 5)
+
+
+@dataclass
+class SeedConfig:
+    members: int = 1000
+    staff: int = 5
+    months: int = 24
+    deposits: float = 12
+    withdrawals: float = 3
+    loan_share: float = 0.4
+    prefix: str = "seed"
+    password: str = None
+    seed: int = 42
+    batch_size: int = 500
+    # Write the daily InterestAccrual rows (one per loan and day)
+    interest: bool = True
+
+
+@dataclass
+class SeedResult:
+    counts: dict = field(default_factory=dict)
+
+    def add(self, name, n):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+
+def _money(value):
+    return Decimal(value).quantize(CENTS)
+
+
+def _between(rng, start, end):
+    return start + (end - start) * rng.random()
+
+
+def _count(rng, mean):
+    """Non-negative integer with an exponential spread around `mean`."""
+    return int(rng.expovariate(1 / mean)) if mean > 0 else 0
+
+
+@contextmanager
+def historical_timestamps(*models):
+    """
+    Let bulk_create keep explicit values for auto_now_add fields, so seeded
+    rows can be back-dated without a second UPDATE pass.
+    """
+    fields = [f for model in models for f in model._meta.concrete_fields if getattr(f, "auto_now_add", False)]
+    for f in fields:
+        f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f in fields:
+            f.auto_now_add = True
+
+
+class SaccoSeeder:
+    """Generates and writes one synthetic SACCO according to a SeedConfig."""
+
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.now = timezone.now()
+        self.history_start = self.now - timedelta(days=30 * config.months)
+        self.password = make_password(config.password)
+        self.result = SeedResult()
+
+        self.User = get_user_model()
+        self.Member = apps.get_model("members", "Member")
+        self.Staff = apps.get_model("staff", "Staff")
+        self.Deposit = apps.get_model("savings", "Deposit")
+        self.Withdrawal = apps.get_model("savings", "Withdrawal")
+        self.Loan = apps.get_model("loans", "Loan")
+        self.LoanRepayment = apps.get_model("loans", "LoanRepayment")
+        self.LoanInstallment = apps.get_model("loans", "LoanInstallment")
+        self.InterestAccrual = apps.get_model("loans", "InterestAccrual")
+
+    def run(self):
+        offset = self.User.objects.filter(username__startswith=self.config.prefix).count()
+        with historical_timestamps(self.User, self.Member, self.Deposit, self.Withdrawal):
+            approvers = self.seed_staff(offset)
+            for first in range(0, self.config.members, self.config.batch_size):
+                size = min(self.config.batch_size, self.config.members - first)
+                with transaction.atomic():
+                    self.seed_members(offset + first, size, approvers)
+
+        self.result.add("rollup_rows", rollup.rebuild())
+        self.result.add("leaderboard_rows", leaderboard.rebuild())
+        bump_data_version()
+        return self.result
+
+    # --- Users ---
+
+    def _user(self, index, role, joined):
+        username = f"{self.config.prefix}-{role}-{index}"
+        return self.User(
+            username=username,
+            email=f"{username}@example.com",
+            password=self.password,
+            role=role,
+            is_staff=role != "member",
+            date_joined=joined,
+        )
+
+    def seed_staff(self, offset):
+        users = [
+            self._user(offset + i, "staff", _between(self.rng, self.history_start, self.now))
+            for i in range(self.config.staff)
+        ]
+        users = self.User.objects.bulk_create(users)
+        self.Staff.objects.bulk_create([self.Staff(user=user) for user in users])
+        self.result.add("staff", len(users))
+        return users
+
+    def seed_members(self, offset, size, approvers):
+        joined = [_between(self.rng, self.history_start, self.now) for _ in range(size)]
+        users = self.User.objects.bulk_create(
+            [self._user(offset + i, "member", joined[i]) for i in range(size)]
+        )
+        members = [self.Member(user=user, joined_on=when) for user, when in zip(users, joined)]
+
+        deposits, withdrawals, loans = [], [], []
+        for member in members:
+            member.savings_balance = self._savings(member, approvers, deposits, withdrawals)
+            member.loan_balance = Decimal("0")
+            self._loans(member, approvers, loans)
+        scheduled, repayments, accruals = self._repayments(loans)
+
+        # Parents first: bulk_create fills in the foreign keys of unsaved children
+        self.Member.objects.bulk_create(members)
+        self.Deposit.objects.bulk_create(deposits)
+        self.Withdrawal.objects.bulk_create(withdrawals)
+        self.Loan.objects.bulk_create(loans)
+        self.LoanRepayment.objects.bulk_create(repayments)
+        installments = self.LoanInstallment.objects.bulk_create(
+            [self.LoanInstallment(loan=loan, **vars(i)) for loan, schedule in scheduled for i in schedule],
+            batch_size=loan_schedule.INSERT_BATCH_SIZE,
+        )
+        self.result.add("installments", len(installments))
+        self.result.add("interest_accruals", insert_rows(self.InterestAccrual, accrual.ACCRUAL_FIELDS, [
+            (loan.pk, day, principal, loan.interest_rate, amount, day_start(day + timedelta(days=1)))
+            for loan, day, principal, amount in accruals
+        ]))
+
+        for name, rows in (("users", users), ("members", members), ("deposits", deposits),
+                           ("withdrawals", withdrawals), ("loans", loans), ("repayments", repayments)):
+            self.result.add(name, len(rows))
+
+    # --- Transactions ---
+
+    def _status(self, when, rejected_share):
+        if self.now - when < PENDING_WINDOW and self.rng.random() < 0.5:
+            return "pending"
+        return "rejected" if self.rng.random() < rejected_share else "approved"
+
+    def _approval(self, row, when, approvers):
+        if row.status != "pending":
+            row.approved_on = min(when + timedelta(hours=self.rng.uniform(1, 72)), self.now)
+            row.approved_by = self.rng.choice(approvers) if approvers else None
+
+    def _savings(self, member, approvers, deposits, withdrawals):
+        """Generate a member's deposits and withdrawals; return their savings balance."""
+        approved = Decimal("0")
+        for _ in range(_count(self.rng, self.config.deposits)):
+            when = _between(self.rng, member.joined_on, self.now)
+            deposit = self.Deposit(
+                member=member,
+                amount=_money(max(self.rng.lognormvariate(math.log(2000), 0.9), 50)),
+                created_at=when,
+            )
+            deposit.status = self._status(when, 0.05)
+            self._approval(deposit, when, approvers)
+            approved += deposit.amount if deposit.status == "approved" else 0
+            deposits.append(deposit)
+
+        withdrawn = Decimal("0")
+        for _ in range(_count(self.rng, self.config.withdrawals)):
+            amount = _money(approved * Decimal(self.rng.uniform(0.02, 0.2)))
+            if amount <= 0 or withdrawn + amount > approved * Decimal("0.8"):
+                break
+            when = _between(self.rng, member.joined_on, self.now)
+            withdrawal = self.Withdrawal(member=member, amount=amount, created_at=when)
+            withdrawal.status = self._status(when, 0.05)
+            self._approval(withdrawal, when, approvers)
+            withdrawn += amount if withdrawal.status == "approved" else 0
+            withdrawals.append(withdrawal)
+
+        return approved - withdrawn
+
+    def _loans(self, member, approvers, loans):
+        """Generate a member's loans; approved ones get a due date and are repaid in _repayments()."""
+        if self.rng.random() >= self.config.loan_share:
+            return
+
+        for _ in range(self.rng.randint(1, 3)):
+            requested = _between(self.rng, member.joined_on, self.now)
+            loan = self.Loan(
+                member=member,
+                amount=_money(max(self.rng.lognormvariate(math.log(20000), 0.8), 1000)),
+                interest_rate=self.rng.choice(INTEREST_RATES),
+                duration_months=self.rng.choice(DURATIONS),
+                requested_on=requested,
+            )
+            loan.status = self._status(requested, 0.15)
+            loan.balance = loan.amount
+            self._approval(loan, requested, approvers)
+            if loan.status == "approved":
+                loan.due_date = loan_schedule.due_date(loan)
+            loans.append(loan)
+
+    def _repayments(self, loans):
+        """
+        Compute the schedules of the approved loans, pay the installments due
+        so far, accrue interest and set the loan and member balances.
+        Returns ((loan, schedule) pairs, repayments, (loan, day, principal,
+        amount) accruals).
+        """
+        approved = [loan for loan in loans if loan.status == "approved"]
+        scheduled = list(zip(approved, loan_schedule.compute(approved)))
+        repayments, accruals = [], []
+        yesterday = timezone.localdate(self.now) - timedelta(days=1)
+        for loan, schedule in scheduled:
+            repaid = self._repay(loan, schedule, repayments)
+            accrued = {}
+            if self.config.interest:
+                start = loan_schedule.start_date(loan)
+                installments = [
+                    (i.number, i.due_date, i.interest,
+                     i.principal + i.balance if loan.interest_method == "reducing" else loan.amount)
+                    for i in schedule
+                ]
+                for day, principal, amount in accrual.loan_accruals(
+                    start, installments, start + timedelta(days=1), yesterday, loan.amount, repaid,
+                ):
+                    accruals.append((loan, day, principal, amount))
+                    accrued[day] = amount
+            loan.balance = accrual.balance_after(loan.amount, accrued, repaid)
+            if loan.balance == 0:
+                loan.status = "completed"
+            loan.member.loan_balance += loan.balance
+        return scheduled, repayments, accruals
+
+    def _repay(self, loan, schedule, repayments):
+        """
+        Pay the installments falling due before now, each around its due
+        date; return {day: amount repaid}.
+        """
+        stops_at = self.rng.randint(1, len(schedule)) if self.rng.random() < DEFAULT_SHARE else None
+        paid = {}
+        for installment in schedule:
+            if installment.number == stops_at:
+                break
+            when = day_start(installment.due_date) + timedelta(
+                days=self.rng.randint(*PAYMENT_DAYS), hours=self.rng.uniform(8, 17),
+            )
+            if when >= self.now:
+                break
+            repayments.append(self.LoanRepayment(loan=loan, amount=installment.amount, date=when))
+            day = timezone.localdate(when)
+            paid[day] = paid.get(day, 0) + installment.amount
+        return paid
@@ -0,0 +1,27 @@
+"""Background tasks for maintenance work (run by `manage.py runworker`)."""
+from datetime import date
+
+from . import idempotency, ledger, reconcile
+from .jobs import task
+
+
+@task("core.purge_idempotency_keys", priority=-10)
+def purge_idempotency_keys():
+    return {"deleted": idempotency.purge_expired()}
+
+
+@task("core.reconcile_balances", priority=-10, max_attempts=1)
+def reconcile_balances(fix=False, chunk_size=reconcile.CHUNK_SIZE):
+    report = reconcile.reconcile(chunk_size, fix)
+    return {
+        "members_checked": report.members_checked,
+        "drifted": report.drifted,
+        "net_drift": report.net_drift,
+        "fixed": report.fixed,
+        "in_flight": report.in_flight,
+    }
+
+
+@task("core.write_ledger_checkpoint", priority=-10)
+def write_ledger_checkpoint(as_of):
+    return {"written": ledger.write_checkpoints(date.fromisoformat(as_of))}
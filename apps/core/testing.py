@@ -0,0 +1,56 @@
+"""
+Helpers shared by the apps' test suites.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.members.models import Member
+
+User = get_user_model()
+
+
+class ListQueryCountMixin:
+    """
+    For TestCases checking that list and detail endpoints run as many
+    queries for many rows as for a few, for an admin and for a member.
+    Subclasses implement add_rows(model, n).
+    """
+    extra_rows = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        cls.members = []
+        for i in range(3):
+            user = User.objects.create_user(
+                username=f"member{i}", email=f"member{i}@example.com", password="x", role="member",
+            )
+            cls.members.append(Member.objects.get(user=user))
+
+    def add_rows(self, model, n):
+        """Create n rows behind the endpoint, spread over every member."""
+        raise NotImplementedError
+
+    def count_queries(self, user, url):
+        client = APIClient()
+        client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_flat(self, model, path, member_field="member"):
+        self.add_rows(model, 3)
+        few = self.count_queries(self.admin, f"{path}?page_size=100")
+        own_few = self.count_queries(self.members[0].user, f"{path}?page_size=100")
+        self.add_rows(model, self.extra_rows)
+        self.assertEqual(self.count_queries(self.admin, f"{path}?page_size=100"), few)
+        self.assertEqual(self.count_queries(self.members[0].user, f"{path}?page_size=100"), own_few)
+
+        row = model.objects.filter(**{member_field: self.members[0]}).order_by("pk").last()
+        self.assertLessEqual(self.count_queries(self.admin, f"{path}{row.pk}/"), few)
+        self.assertLessEqual(self.count_queries(self.members[0].user, f"{path}{row.pk}/"), own_few)
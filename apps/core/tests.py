@@ -1,3 +1,944 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.core.cache import cache as django_cache
+from django.db import connection
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework import views
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+
+from apps.analytics.models import DailyActivityRollup
+from apps.loans.models import InterestAccrual, Loan, LoanRepayment
+from apps.members.models import Member
+from apps.savings import bulk
+from apps.savings.models import Deposit, Withdrawal
+
+from . import cache, exports, jobs, ledger, middleware, outbox, reconcile
+
+from .dates import day_start
+
+from .explain import SUPPORTED_VENDORS, plan_problems
+from .models import Job, LedgerCheckpoint, LedgerEntry, OutboxEvent
+from .synthetic import SaccoSeeder, SeedConfig
+from .totals import Figure, SaccoTotals, member_totals
+
+User = get_user_model()
+
+
+class QueryRecorder:
+    """execute_wrapper keeping the raw (sql, params) of every SELECT."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith("SELECT"):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False)
+class HotQueryPlanTests(TestCase):
+    """
+    EXPLAIN every query behind the hot list endpoints on a seeded database
+    and fail if one reads a whole table or sorts instead of walking an index.
+    """
+    # (name, path, user, allow_sort). Sorts are only allowed where the rows
+    # sorted belong to one member: a statement merges four sources, and a
+    # member's repayments are reached through their loans.
+    ENDPOINTS = [
+        ("deposits", "/api/savings/deposits/", "admin", False),
+        ("withdrawals", "/api/savings/withdrawals/", "admin", False),
+        ("loans", "/api/loans/loans/", "admin", False),
+        ("repayments", "/api/loans/repayments/", "admin", False),
+        ("members", "/api/members/", "admin", False),
+        ("member detail", "/api/members/{member}/", "admin", False),
+        ("users", "/api/accounts/admin/users/", "admin", False),
+        ("own deposits", "/api/savings/deposits/", "member", False),
+        ("own withdrawals", "/api/savings/withdrawals/", "member", False),
+        ("own loans", "/api/loans/loans/", "member", False),
+        ("own repayments", "/api/loans/repayments/", "member", True),
+        ("statement", "/api/members/{member}/statement/?page_size=5", "member", True),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        SaccoSeeder(SeedConfig(members=40, staff=1, months=6, prefix="plan")).run()
+        cls.admin = User.objects.create_user(
+            username="plan-admin", email="plan-admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        cls.member = Member.objects.select_related("user").order_by("pk").first()
+
+    def setUp(self):
+        if connection.vendor not in SUPPORTED_VENDORS:
+            self.skipTest(f"no query plan checks for {connection.vendor}")
+
+    def record(self, func):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            result = func()
+        return result, recorder.queries
+
+    def assertPlansClean(self, queries, allow_sort=False):
+        for sql, params in queries:
+            problems = plan_problems(connection, sql, params)
+            if allow_sort:
+                problems = [p for p in problems if not p.startswith("sort")]
+            self.assertEqual(problems, [], sql)
+
+    def test_hot_endpoints_use_indexes(self):
+        users = {"admin": self.admin, "member": self.member.user}
+        for name, path, user, allow_sort in self.ENDPOINTS:
+            client = APIClient()
+            client.force_authenticate(users[user])
+            url = path.format(member=self.member.pk)
+            # The first page and the page after it (a cursor seek)
+            for page in ("first", "next"):
+                with self.subTest(endpoint=name, page=page):
+                    response, queries = self.record(lambda: client.get(url))
+                    self.assertEqual(response.status_code, 200)
+                    self.assertTrue(queries)
+                    self.assertPlansClean(queries, allow_sort)
+                url = response.data.get("next") if isinstance(response.data, dict) else None
+                if not url:
+                    break
+
+    def test_pending_queue_uses_status_index(self):
+        _, queries = self.record(lambda: bulk.select_ids(Deposit, {"filter": {"from": "2000-01-01"}}))
+        self.assertPlansClean(queries)
+
+
+@override_settings(OUTBOX_DISPATCH="worker")
+class OutboxTests(TransactionTestCase):
+    """Balance side effects are applied after commit, batched per member."""
+
+    def setUp(self):
+        user = User.objects.create_user(username="member", email="member@example.com", password="x", role="member")
+        self.member = Member.objects.get(user=user)
+
+    def balance(self):
+        return Member.objects.get(pk=self.member.pk).savings_balance
+
+    def test_dispatch_applies_events_in_order(self):
+        for amount in ("100.00", "50.00"):
+            Deposit.objects.create(member=self.member, amount=Decimal(amount), status="approved")
+        Withdrawal.objects.create(member=self.member, amount=Decimal("120.00"), status="approved")
+        # More than is left
+        Withdrawal.objects.create(member=self.member, amount=Decimal("100.00"), status="approved")
+        Deposit.objects.create(member=self.member, amount=Decimal("10.00"), status="approved")
+        Deposit.objects.create(member=self.member, amount=Decimal("999.00"))  # pending: moves nothing yet
+        self.assertEqual(self.balance(), Decimal("0.00"))
+
+        self.assertEqual(outbox.drain(), 5)
+
+        self.assertEqual(self.balance(), Decimal("40.00"))
+        self.assertFalse(OutboxEvent.objects.filter(dispatched_at__isnull=True).exists())
+        self.assertEqual(outbox.drain(), 0)
+
+    def test_failed_handler_releases_its_events_for_retry(self):
+        def fail(payloads):
+            raise RuntimeError("boom")
+
+        outbox.handlers["test.fail"] = fail
+        self.addCleanup(outbox.handlers.pop, "test.fail")
+        outbox.publish("test.fail", n=1)
+        Deposit.objects.create(member=self.member, amount=Decimal("25.00"), status="approved")
+
+        with self.assertLogs("apps.core.outbox", "ERROR"):
+            self.assertEqual(outbox.dispatch(), 2)
+
+        self.assertEqual(self.balance(), Decimal("25.00"))
+        event = OutboxEvent.objects.get(topic="test.fail")
+        self.assertIsNone(event.dispatched_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertIn("boom", event.last_error)
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False, OUTBOX_DISPATCH="worker")
+class ApprovalCreditTests(TestCase):
+    """Each approval moves a balance exactly once, so reconciliation finds no drift."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        user = User.objects.create_user(username="member", email="member@example.com", password="x", role="member")
+        self.member = Member.objects.get(user=user)
+        self.client = APIClient()
+
+    def as_member(self, path, data):
+        # A fresh user each time: views read balances from user.member_profile
+        self.client.force_authenticate(User.objects.get(pk=self.member.user_id))
+        response = self.client.post(path, data, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        outbox.drain()
+        return response.data["id"]
+
+    def as_admin(self, path):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.post(path).status_code, 200)
+        outbox.drain()
+
+    def test_create_then_approve_credits_once(self):
+        deposit = self.as_member("/api/savings/deposits/", {"amount": "50.00"})
+        self.as_admin(f"/api/savings/deposits/{deposit}/approve/")
+        withdrawal = self.as_member("/api/savings/withdrawals/", {"amount": "20.00"})
+        self.as_admin(f"/api/savings/withdrawals/{withdrawal}/approve/")
+        loan = self.as_member("/api/loans/loans/", {"member": self.member.pk, "amount": "1000.00"})
+        self.as_admin(f"/api/loans/loans/{loan}/approve/")
+        Loan.objects.get(pk=loan).save()  # re-saving an approved loan moves nothing
+        outbox.drain()
+        self.as_member("/api/loans/repayments/", {"loan": loan, "amount": "100.00"})
+
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.savings_balance, Decimal("30.00"))
+        self.assertEqual(self.member.loan_balance, Decimal("900.00"))
+        self.assertEqual(Loan.objects.get(pk=loan).balance, Decimal("900.00"))
+        report = reconcile.reconcile()
+        self.assertEqual(report.drifted, {"savings": 0, "loan": 0})
+        self.assertEqual(ledger.balance_at(self.member.pk, "savings", timezone.now()), Decimal("30.00"))
+        self.assertEqual(ledger.balance_at(self.member.pk, "loan", timezone.now()), Decimal("900.00"))
+
+    def test_rows_created_approved_are_posted_to_the_ledger(self):
+        Deposit.objects.create(member=self.member, amount=Decimal("80.00"), status="approved")
+        Withdrawal.objects.create(member=self.member, amount=Decimal("500.00"), status="approved")  # not covered
+        Withdrawal.objects.create(member=self.member, amount=Decimal("30.00"), status="approved")
+        Loan.objects.create(member=self.member, amount=Decimal("1000.00"), status="approved")
+        pending = Loan.objects.create(member=self.member, amount=Decimal("200.00"))
+        pending.status = "approved"
+        pending.save()
+        outbox.drain()
+
+        now = timezone.now()
+        self.assertEqual(ledger.balance_at(self.member.pk, "savings", now), Decimal("50.00"))
+        self.assertEqual(ledger.balance_at(self.member.pk, "loan", now), Decimal("1200.00"))
+        self.assertEqual(
+            sorted(LedgerEntry.objects.filter(member=self.member).values_list("source_type", "amount")),
+            [("deposit", Decimal("80.00")), ("loan", Decimal("200.00")), ("loan", Decimal("1000.00")),
+             ("withdrawal", Decimal("-30.00"))],
+        )
+
+
+@override_settings(OUTBOX_DISPATCH="worker")
+class LedgerTests(TestCase):
+    """Posting, point-in-time reads, checkpoints and rebuilds of the member ledger."""
+
+    def setUp(self):
+        self.members = [
+            Member.objects.get(user=User.objects.create_user(
+                username=f"member{i}", email=f"member{i}@example.com", password="x", role="member",
+            ))
+            for i in range(2)
+        ]
+        self.member = self.members[0]
+
+    def at(self, day, hour=12):
+        return day_start(day) + timedelta(hours=hour)
+
+    def entries(self, member, account):
+        return list(
+            LedgerEntry.objects.filter(member=member, account=account)
+            .order_by("seq").values_list("seq", "amount", "balance", "occurred_at")
+        )
+
+    def test_post_keeps_running_balance_floor_and_time_order(self):
+        ledger.post(self.member.pk, "loan", Decimal("100.00"), "loan", 1, self.at(date(2025, 1, 5)))
+        ledger.post(self.member.pk, "loan", Decimal("-150.00"), "repayment", 1, self.at(date(2025, 1, 9)), floor=0)
+        # Posted late with an earlier time: kept after the head
+        ledger.post(self.member.pk, "loan", Decimal("40.00"), "loan", 2, self.at(date(2025, 1, 7)))
+
+        self.assertEqual(self.entries(self.member, "loan"), [
+            (1, Decimal("100.00"), Decimal("100.00"), self.at(date(2025, 1, 5))),
+            (2, Decimal("-100.00"), Decimal("0.00"), self.at(date(2025, 1, 9))),
+            (3, Decimal("40.00"), Decimal("40.00"), self.at(date(2025, 1, 9))),
+        ])
+
+    def test_post_many_continues_from_each_head(self):
+        other = self.members[1]
+        ledger.post(self.member.pk, "savings", Decimal("10.00"), "deposit", 1, self.at(date(2025, 1, 1)))
+        ledger.post_many([
+            {"member_id": self.member.pk, "account": "savings", "amount": Decimal("5.00"), "source_type": "deposit",
+             "occurred_at": self.at(date(2025, 1, 2))},
+            {"member_id": other.pk, "account": "savings", "amount": Decimal("7.00"), "source_type": "deposit",
+             "occurred_at": self.at(date(2025, 1, 2))},
+            {"member_id": self.member.pk, "account": "savings", "amount": Decimal("-20.00"),
+             "source_type": "withdrawal", "occurred_at": self.at(date(2025, 1, 3)), "floor": 0},
+            {"member_id": self.member.pk, "account": "loan", "amount": Decimal("300.00"), "source_type": "loan",
+             "occurred_at": self.at(date(2025, 1, 3))},
+        ])
+
+        self.assertEqual([row[1:3] for row in self.entries(self.member, "savings")], [
+            (Decimal("10.00"), Decimal("10.00")), (Decimal("5.00"), Decimal("15.00")),
+            (Decimal("-15.00"), Decimal("0.00")),
+        ])
+        self.assertEqual([row[:3] for row in self.entries(other, "savings")], [(1, Decimal("7.00"), Decimal("7.00"))])
+        self.assertEqual([row[:3] for row in self.entries(self.member, "loan")],
+                         [(1, Decimal("300.00"), Decimal("300.00"))])
+
+    def test_balance_at_and_statement(self):
+        for day, amount in ((date(2025, 1, 5), "100.00"), (date(2025, 1, 20), "-30.00"), (date(2025, 2, 3), "50.00")):
+            ledger.post(self.member.pk, "savings", Decimal(amount), "deposit", None, self.at(day))
+
+        self.assertEqual(ledger.balance_at(self.member.pk, "savings", self.at(date(2025, 1, 4))), Decimal("0"))
+        self.assertEqual(ledger.balance_at(self.member.pk, "savings", self.at(date(2025, 1, 5))), Decimal("100.00"))
+        self.assertEqual(ledger.balance_at(self.member.pk, "savings", self.at(date(2025, 1, 31))), Decimal("70.00"))
+
+        january = ledger.statement(self.member.pk, "savings", date(2025, 1, 10), date(2025, 1, 31))
+        self.assertEqual(january["opening_balance"], Decimal("100.00"))
+        self.assertEqual(january["closing_balance"], Decimal("70.00"))
+        self.assertEqual([e["amount"] for e in january["entries"]], [Decimal("-30.00")])
+        quiet = ledger.statement(self.member.pk, "savings", date(2025, 1, 21), date(2025, 2, 1))
+        self.assertEqual((quiet["opening_balance"], quiet["closing_balance"], quiet["entries"]),
+                         (Decimal("70.00"), Decimal("70.00"), []))
+
+    def test_rebuild_replays_history_with_checkpoints(self):
+        other = self.members[1]
+        Deposit.objects.create(member=self.member, amount=Decimal("100.00"), status="approved",
+                               approved_on=self.at(date(2025, 1, 5)))
+        Deposit.objects.create(member=other, amount=Decimal("40.00"), status="approved",
+                               approved_on=self.at(date(2025, 2, 10)))
+        Deposit.objects.create(member=other, amount=Decimal("500.00"))  # pending: not posted
+        Withdrawal.objects.create(member=self.member, amount=Decimal("30.00"), status="approved",
+                                  approved_on=self.at(date(2025, 1, 20)))
+        loan = Loan.objects.create(member=self.member, amount=Decimal("200.00"), status="approved",
+                                   approved_on=self.at(date(2025, 1, 10)))
+        LoanRepayment.objects.create(loan=loan, amount=Decimal("250.00"), date=self.at(date(2025, 2, 1)))
+        # Stale rows the rebuild replaces
+        ledger.post(other.pk, "savings", Decimal("999.00"), "adjustment")
+        LedgerCheckpoint.objects.create(member=other, account="savings", as_of=date(2024, 12, 31), seq=1,
+                                        balance=Decimal("999.00"))
+
+        entries, checkpoints = ledger.rebuild(chunk_size=1)
+
+        self.assertEqual(entries, 5)
+        self.assertEqual([row[1:] for row in self.entries(self.member, "loan")], [
+            (Decimal("200.00"), Decimal("200.00"), self.at(date(2025, 1, 10))),
+            (Decimal("-200.00"), Decimal("0.00"), self.at(date(2025, 2, 1))),
+        ])
+        ends = ledger.month_ends(self.at(date(2025, 1, 5)))
+        self.assertEqual(ends[:2], [date(2025, 1, 31), date(2025, 2, 28)])
+        # Every month end: both of the member's accounts, and the other's savings from February
+        self.assertEqual(checkpoints, 2 * len(ends) + len(ends) - 1)
+        self.assertEqual(LedgerCheckpoint.objects.count(), checkpoints)
+        self.assertFalse(LedgerCheckpoint.objects.filter(as_of=date(2024, 12, 31)).exists())
+        january = dict(LedgerCheckpoint.objects.filter(as_of=date(2025, 1, 31)).values_list("account", "balance"))
+        self.assertEqual(january, {"savings": Decimal("70.00"), "loan": Decimal("200.00")})
+        self.assertEqual(ledger.total_at("savings", self.at(date(2025, 3, 1))), Decimal("110.00"))
+        self.assertEqual(ledger.total_at("loan", self.at(date(2025, 1, 31))), Decimal("200.00"))
+
+        self.assertEqual(ledger.rebuild(chunk_size=1), (entries, checkpoints))
+
+    def test_rebuild_members_keeps_backdated_times(self):
+        ledger.post(self.member.pk, "savings", Decimal("100.00"), "deposit", None, self.at(date(2025, 3, 1)))
+        Deposit.objects.create(member=self.member, amount=Decimal("100.00"), status="approved",
+                               approved_on=self.at(date(2025, 3, 1)))
+        Deposit.objects.create(member=self.member, amount=Decimal("25.00"), status="approved",
+                               approved_on=self.at(date(2025, 1, 15)))
+
+        self.assertEqual(ledger.rebuild_members([self.member.pk], [date(2025, 1, 31)]), (2, 1))
+
+        self.assertEqual(ledger.balance_at(self.member.pk, "savings", self.at(date(2025, 2, 1))), Decimal("25.00"))
+        self.assertEqual(
+            LedgerCheckpoint.objects.get(member=self.member, as_of=date(2025, 1, 31)).balance, Decimal("25.00"),
+        )
+
+
+@override_settings(OUTBOX_DISPATCH="worker")
+class ReconcileTests(TestCase):
+    """Seeded drift is found per account, netted, and --fix corrects exactly those accounts."""
+
+    def setUp(self):
+        self.members = [
+            Member.objects.get(user=User.objects.create_user(
+                username=f"member{i}", email=f"member{i}@example.com", password="x", role="member",
+            ))
+            for i in range(5)
+        ]
+        # History
+        for member in self.members[:4]:
+            Deposit.objects.create(member=member, amount=Decimal("150.00"), status="approved")
+            Deposit.objects.create(member=member, amount=Decimal("900.00"))  # pending
+            Withdrawal.objects.create(member=member, amount=Decimal("50.00"), status="approved")
+            loan = Loan.objects.create(member=member, amount=Decimal("1000.00"), status="approved",
+                                       approved_on=timezone.now())
+            InterestAccrual.objects.create(loan=loan, date=date(2025, 1, 1), principal=loan.amount,
+                                           interest_rate=loan.interest_rate, amount=Decimal("12.34"),
+                                           posted_at=timezone.now())
+            LoanRepayment.objects.create(loan=loan, amount=Decimal("200.00"))
+            overpaid = Loan.objects.create(member=member, amount=Decimal("100.00"), status="completed",
+                                           approved_on=timezone.now())
+            LoanRepayment.objects.create(loan=overpaid, amount=Decimal("150.00"))
+        # Apply the balance events before overwriting the balances below
+        outbox.drain()
+        # Recorded balances: expected are savings 100.00 and loan 812.34 (0 for the last member)
+        recorded = [
+            ("100.00", "812.34"),
+            ("110.00", "812.34"),   # savings 10 over
+            ("100.00", "787.34"),   # loan 25 under
+            ("90.00", "900.00"),    # savings 10 under, loan 87.66 over
+            ("5.00", "0.00"),       # savings with no history
+        ]
+        for member, (savings, loan) in zip(self.members, recorded):
+            Member.objects.filter(pk=member.pk).update(savings_balance=Decimal(savings), loan_balance=Decimal(loan))
+
+    def balances(self):
+        return list(Member.objects.filter(pk__in=[m.pk for m in self.members]).order_by("pk")
+                    .values_list("savings_balance", "loan_balance"))
+
+    def test_drift_counts_and_net_drift(self):
+        drifts = {(d.member_id, d.account): d.difference for d in reconcile.iter_drift(chunk_size=2)}
+        m = [member.pk for member in self.members]
+        self.assertEqual(drifts, {
+            (m[1], "savings"): Decimal("10.00"),
+            (m[2], "loan"): Decimal("-25.00"),
+            (m[3], "savings"): Decimal("-10.00"),
+            (m[3], "loan"): Decimal("87.66"),
+            (m[4], "savings"): Decimal("5.00"),
+        })
+
+        report = reconcile.reconcile(chunk_size=2)
+        self.assertEqual(report.members_checked, Member.objects.count())
+        self.assertEqual(report.drifted, {"savings": 3, "loan": 2})
+        self.assertEqual(report.net_drift, {"savings": Decimal("5.00"), "loan": Decimal("62.66")})
+        self.assertEqual(report.fixed, 0)
+
+    def test_fix_corrects_exactly_the_drifted_accounts(self):
+        before = self.balances()
+        report = reconcile.reconcile(chunk_size=2, fix=True)
+
+        self.assertEqual(report.fixed, 5)
+        self.assertEqual(report.drifted, {"savings": 3, "loan": 2})
+        after = self.balances()
+        self.assertEqual(after[0], before[0])
+        self.assertEqual(after[:4], [(Decimal("100.00"), Decimal("812.34"))] * 4)
+        self.assertEqual(after[4], (Decimal("0.00"), Decimal("0.00")))
+        self.assertEqual(reconcile.reconcile().drifted, {"savings": 0, "loan": 0})
+
+    def test_undispatched_events_are_applied_before_checking(self):
+        member = self.members[0]
+        Deposit.objects.create(member=member, amount=Decimal("40.00"), status="approved")
+        self.assertEqual(outbox.pending().count(), 1)
+
+        out = StringIO()
+        call_command("reconcile_balances", "--fix", "--chunk-size=2", stdout=out)
+        self.assertEqual(outbox.pending().count(), 0)
+        self.assertEqual(self.balances()[0], (Decimal("140.00"), Decimal("812.34")))
+        self.assertIn("Fixed 5 balances.", out.getvalue())
+
+    def test_members_with_events_in_flight_are_left_alone(self):
+        member = self.members[1]  # savings 10 over
+        Deposit.objects.create(member=member, amount=Decimal("40.00"), status="approved")
+
+        # The event commits after the chunk drained the outbox
+        with mock.patch.object(outbox, "drain"):
+            report = reconcile.reconcile(chunk_size=2, fix=True)
+        self.assertEqual(report.in_flight, 1)
+        self.assertEqual(report.drifted, {"savings": 2, "loan": 2})
+        self.assertEqual(self.balances()[1], (Decimal("110.00"), Decimal("812.34")))
+
+        outbox.drain()
+        # Once dispatched the deposit lands once, on the balance it was meant for
+        self.assertEqual(self.balances()[1], (Decimal("150.00"), Decimal("812.34")))
+        report = reconcile.reconcile(fix=True)
+        self.assertEqual((report.in_flight, report.fixed), (0, 1))
+        self.assertEqual(self.balances()[1], (Decimal("140.00"), Decimal("812.34")))
+
+
+class JobQueueTests(TestCase):
+    """Claiming order, batching and retries of background jobs."""
+
+    def setUp(self):
+        self.calls = []
+        self.failing = False
+
+        def record(*args, **kwargs):
+            if self.failing:
+                raise RuntimeError("boom")
+            self.calls.append(args or kwargs)
+
+        for name, batch_size in (("test.single", 1), ("test.batch", 3)):
+            jobs.task(name, batch_size=batch_size, max_attempts=2)(record)
+            self.addCleanup(jobs.registry.pop, name)
+
+    def test_claims_by_priority_and_batches_same_task(self):
+        low = jobs.enqueue("test.single", priority=-1, n=0)
+        batched = [jobs.enqueue("test.batch", n=n) for n in range(4)]
+        urgent = jobs.enqueue("test.single", priority=5, n=1)
+        jobs.enqueue("test.single", delay=timedelta(hours=1), n=2)
+
+        self.assertEqual([job.pk for job in jobs.claim("w")], [urgent.pk])
+        claimed = jobs.claim("w")
+        self.assertEqual([job.pk for job in claimed], [job.pk for job in batched[:3]])
+        self.assertTrue(jobs.run(claimed))
+        self.assertEqual(self.calls, [([{"n": 0}, {"n": 1}, {"n": 2}],)])
+        self.assertEqual([job.pk for job in jobs.claim("w")], [batched[3].pk])
+        self.assertEqual([job.pk for job in jobs.claim("w")], [low.pk])
+        self.assertEqual(jobs.claim("w"), [])
+        self.assertEqual(Job.objects.filter(status="done").count(), 3)
+
+    def test_failed_job_is_retried_with_backoff_then_failed(self):
+        job = jobs.enqueue("test.single", n=1)
+        self.failing = True
+
+        with self.assertLogs("apps.core.jobs", "ERROR"):
+            self.assertFalse(jobs.run(jobs.claim("w")))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("queued", 1))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(jobs.claim("w"), [])
+
+        with self.assertLogs("apps.core.jobs", "ERROR"):
+            self.assertFalse(jobs.run(jobs.claim("w", now=job.run_after)))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 2))
+        self.assertIn("boom", job.last_error)
+
+    def test_heartbeat_keeps_running_jobs_from_being_requeued(self):
+        alive, lost = jobs.enqueue("test.single", n=1), jobs.enqueue("test.single", n=2)
+        claimed = jobs.claim("w")
+        jobs.claim("w")
+        later = timezone.now() + timedelta(seconds=settings.JOB_LOCK_TIMEOUT + 1)
+
+        self.assertEqual(jobs.heartbeat("w", [alive.pk], now=later), 1)
+        self.assertEqual(jobs.heartbeat("other", [lost.pk], now=later), 0)
+        self.assertEqual(jobs.requeue_stale(later), 1)
+        self.assertEqual(Job.objects.get(pk=lost.pk).status, "queued")
+        # The job kept alive still records its result
+        self.assertTrue(jobs.run(claimed))
+        self.assertEqual(Job.objects.get(pk=alive.pk).status, "done")
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False, JOB_HEARTBEAT=0.05)
+class WorkerHeartbeatTests(TransactionTestCase):
+    """A worker refreshes the lock of a job for as long as it runs."""
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("needs a database that supports concurrent connections")
+        self.locks = []
+
+        def slow():
+            self.locks.append(Job.objects.get(name="test.slow").locked_at)
+            time.sleep(0.5)
+            self.locks.append(Job.objects.get(name="test.slow").locked_at)
+
+        jobs.task("test.slow")(slow)
+        self.addCleanup(jobs.registry.pop, "test.slow")
+
+    def test_worker_sends_heartbeats(self):
+        job = jobs.enqueue("test.slow")
+        jobs.Worker(threads=1, interval=0.01).run(burst=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "done")
+        self.assertGreater(self.locks[1], self.locks[0])
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False, OUTBOX_DISPATCH="sync")
+class BackgroundBulkReviewTests(TransactionTestCase):
+    """A bulk approval sent with "background": true is run by a worker."""
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("needs a database that supports concurrent connections")
+        self.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        user = User.objects.create_user(username="member", email="member@example.com", password="x", role="member")
+        self.member = Member.objects.get(user=user)
+
+    def test_worker_runs_queued_bulk_approval(self):
+        deposits = [Deposit.objects.create(member=self.member, amount=Decimal("10.00")) for _ in range(5)]
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        response = client.post(
+            "/api/savings/deposits/bulk_approve/", {"ids": [d.pk for d in deposits], "background": True}, format="json",
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Deposit.objects.filter(status="approved").count(), 0)
+
+        jobs.Worker(threads=2, interval=0.01).run(burst=True)
+
+        job = client.get(f"/api/core/jobs/{response.data['job']}/").data
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["result"]["summary"], {"approved": 5})
+        self.assertEqual(Deposit.objects.filter(status="approved").count(), 5)
+
+
+@override_settings(REQUEST_TIMING_ENABLED=True, REQUEST_TIMING_SLOW_MS=60 * 1000)
+class RequestTimingTests(TestCase):
+    """Timing goes out in a header, and only slow requests are logged by default."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        member = Member.objects.get(user=User.objects.create_user(
+            username="member", email="member@example.com", password="x", role="member"))
+        Deposit.objects.bulk_create([Deposit(member=member, amount=Decimal("10.00")) for _ in range(3)])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_fast_requests_are_not_logged_at_the_default_level(self):
+        with mock.patch.object(middleware.logger, "log") as log:
+            response = self.client.get("/api/savings/deposits/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("db;dur=", response["Server-Timing"])
+        log.assert_not_called()
+
+        with self.assertLogs("apps.core.middleware", "INFO") as logs:
+            self.client.get("/api/savings/deposits/")
+        self.assertEqual(logs.records[0].levelname, "INFO")
+        self.assertFalse(logs.records[0].timing["slow"])
+
+    @override_settings(REQUEST_TIMING_SLOW_MS=0)
+    def test_streaming_responses_are_timed_to_the_last_chunk(self):
+        with self.assertNoLogs("apps.core.middleware"):
+            response = self.client.get("/api/savings/deposits/export/")
+        self.assertTrue(response.streaming)
+        self.assertNotIn("Server-Timing", response)
+
+        with self.assertLogs("apps.core.middleware", "WARNING") as logs:
+            body = b"".join(response.streaming_content)
+        self.assertEqual(body.count(b"\n"), 4)
+        timing = logs.records[0].timing
+        self.assertTrue(timing["streaming"] and timing["slow"])
+        # The rows were read while streaming
+        self.assertGreaterEqual(timing["queries"], 1)
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False)
+class KeysetPaginationTests(TestCase):
+    """List views page by cursor or offset, in a total order even when the sort key ties."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        member = Member.objects.get(user=User.objects.create_user(
+            username="member", email="member@example.com", password="x", role="member"))
+        Deposit.objects.bulk_create([Deposit(member=member, amount=Decimal(n)) for n in range(1, 8)])
+        # Three rows share a timestamp: `id` breaks the tie
+        Deposit.objects.filter(amount__lte=3).update(created_at=timezone.now() - timedelta(days=1))
+        cls.expected = list(Deposit.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def walk(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row["id"] for row in response.data["results"]])
+            url = response.data["next"]
+        return pages
+
+    def test_cursor_pages_forward_and_back(self):
+        pages = self.walk("/api/savings/deposits/?page_size=3")
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([pk for page in pages for pk in page], self.expected)
+
+        second = self.client.get("/api/savings/deposits/?page_size=3").data["next"]
+        third = self.client.get(second).data["next"]
+        previous = self.client.get(third).data["previous"]
+        self.assertEqual([row["id"] for row in self.client.get(previous).data["results"]], pages[1])
+
+    def test_offset_pages(self):
+        pages = self.walk("/api/savings/deposits/?mode=offset&page_size=3")
+        self.assertEqual([pk for page in pages for pk in page], self.expected)
+        response = self.client.get("/api/savings/deposits/?mode=offset&page_size=3&offset=6")
+        self.assertEqual([row["id"] for row in response.data["results"]], self.expected[6:])
+        self.assertIsNone(response.data["next"])
+        self.assertIn("offset=3", response.data["previous"])
+
+    def test_malformed_offset_and_cursor_are_rejected(self):
+        for query in ("mode=offset&offset=abc", "mode=offset&offset=-3", "cursor=%%%", "cursor=bm90IGEgY3Vyc29y"):
+            self.assertEqual(self.client.get(f"/api/savings/deposits/?{query}").status_code, 400, query)
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False, RESPONSE_CACHE_TTL=60, RESPONSE_CACHE_STALE_TTL=300)
+class ResponseCacheTests(TestCase):
+    """Versioned response cache: hits, invalidation and stale-while-revalidate."""
+
+    def setUp(self):
+        django_cache.clear()
+        self.calls = 0
+        tests = self
+
+        class CountingView(views.APIView):
+            permission_classes = []
+
+            @cache.cached_response("test-counting")
+            def get(self, request):
+                tests.calls += 1
+                if request.query_params.get("fail"):
+                    return Response({"detail": "bad"}, status=400)
+                return Response({"calls": tests.calls})
+
+        self.addCleanup(cache.registry.remove, "test-counting")
+        self.view = CountingView.as_view()
+        self.factory = APIRequestFactory()
+
+    def get(self, query=""):
+        response = self.view(self.factory.get(f"/counting/?{query}"))
+        return response["X-Cache"] if response.has_header("X-Cache") else None, response.data
+
+    def test_hits_until_the_data_version_moves(self):
+        self.assertEqual(self.get(), ("MISS", {"calls": 1}))
+        self.assertEqual(self.get(), ("HIT", {"calls": 1}))
+        self.assertEqual(self.get("page=2"), ("MISS", {"calls": 2}))
+
+        cache.bump_data_version()
+        self.assertEqual(self.get(), ("REFRESH", {"calls": 3}))
+        self.assertEqual(self.get(), ("HIT", {"calls": 3}))
+        self.assertEqual(cache.cache_stats(["test-counting"])["test-counting"],
+                         {"hit": 2, "miss": 2, "stale": 0, "refresh": 1})
+
+    def test_stale_entry_is_served_while_another_request_refreshes(self):
+        self.get()
+        key = cache._entry_key("test-counting", Request(self.factory.get("/counting/")))
+        cache.bump_data_version()
+
+        # Another request holds the refresh lock: serve the stale payload without recomputing
+        self.assertTrue(django_cache.add(f"{key}:lock", 1))
+        self.assertEqual(self.get(), ("STALE", {"calls": 1}))
+        self.assertEqual(self.calls, 1)
+
+        django_cache.delete(f"{key}:lock")
+        self.assertEqual(self.get(), ("REFRESH", {"calls": 2}))
+        # The refreshing request released its lock
+        self.assertIsNone(django_cache.get(f"{key}:lock"))
+
+    def test_entries_expire_after_the_ttl(self):
+        self.get()
+        later = time.time() + 61
+        with mock.patch("apps.core.cache.time.time", return_value=later):
+            self.assertEqual(self.get(), ("REFRESH", {"calls": 2}))
+            self.assertEqual(self.get(), ("HIT", {"calls": 2}))
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.get("fail=1")[0], "MISS")
+        self.assertEqual(self.get("fail=1")[0], "MISS")
+        self.assertEqual(self.calls, 2)
+
+    @override_settings(OUTBOX_DISPATCH="worker")
+    def test_writes_bump_the_version_after_commit(self):
+        django_cache.delete(cache.DATA_VERSION_KEY)
+        self.assertEqual(cache.bump_data_version(), 2)
+        user = User.objects.create_user(username="member", email="member@example.com", password="x", role="member")
+        version = cache.get_data_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Deposit.objects.create(member=Member.objects.get(user=user), amount=Decimal("10.00"))
+            self.assertEqual(cache.get_data_version(), version)
+        self.assertGreater(cache.get_data_version(), version)
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False, OUTBOX_DISPATCH="worker")
+class ExportTests(TestCase):
+    """Streamed CSV/NDJSON exports: projection, filters and who sees which rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        cls.alice, cls.bob = (
+            Member.objects.get(user=User.objects.create_user(
+                username=name, email=f"{name}@example.com", password="x", role="member"))
+            for name in ("alice", "bob")
+        )
+        deposits = [
+            (cls.alice, "10.00", "approved", date(2025, 1, 5)),
+            (cls.alice, "20.00", "pending", date(2025, 1, 31)),
+            (cls.alice, "30.00", "approved", date(2025, 2, 1)),
+            (cls.bob, "40.00", "approved", date(2025, 1, 15)),
+        ]
+        cls.deposits = []
+        for member, amount, status, day in deposits:
+            deposit = Deposit.objects.create(member=member, amount=Decimal(amount), status=status)
+            Deposit.objects.filter(pk=deposit.pk).update(created_at=day_start(day) + timedelta(hours=12))
+            cls.deposits.append(deposit.pk)
+        loan = Loan.objects.create(member=cls.bob, amount=Decimal("500.00"), status="approved")
+        cls.repayment = LoanRepayment.objects.create(loan=loan, amount=Decimal("50.00"))
+
+    def export(self, user, path, query=""):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(f"{path}export/?{query}")
+        if response.status_code != 200:
+            return response, None
+        return response, b"".join(response.streaming_content).decode()
+
+    def ids(self, content):
+        return [json.loads(line)["id"] for line in content.splitlines()]
+
+    def test_csv_and_ndjson_hold_the_same_rows(self):
+        response, content = self.export(self.admin, "/api/savings/deposits/")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('.csv"', response["Content-Disposition"])
+        rows = list(csv.DictReader(StringIO(content)))
+
+        response, lines = self.export(self.admin, "/api/savings/deposits/", "output=ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [json.loads(line) for line in lines.splitlines()]
+
+        self.assertEqual([int(row["id"]) for row in rows], self.deposits)
+        self.assertEqual([record["id"] for record in records], self.deposits)
+        self.assertEqual([row["amount"] for row in rows], [record["amount"] for record in records])
+        self.assertEqual(self.export(self.admin, "/api/savings/deposits/", "output=xml")[0].status_code, 400)
+
+    def test_rows_hold_only_the_export_columns(self):
+        _, content = self.export(self.admin, "/api/savings/deposits/")
+        self.assertEqual(content.splitlines()[0].split(","), list(exports.EXPORTS["deposits"]["columns"]))
+
+        _, content = self.export(self.admin, "/api/loans/repayments/", "output=ndjson")
+        record = json.loads(content)
+        self.assertEqual(list(record), list(exports.EXPORTS["repayments"]["columns"]))
+        self.assertEqual((record["id"], record["member_id"], record["member_username"], record["amount"]),
+                         (self.repayment.pk, self.bob.pk, "bob", "50.00"))
+
+    def test_date_range_status_and_member_filters(self):
+        path = "/api/savings/deposits/"
+        # Inclusive dates: the last day of January is in, the first of February out
+        _, content = self.export(self.admin, path, "output=ndjson&from=2025-01-15&to=2025-01-31")
+        self.assertEqual(self.ids(content), self.deposits[1:2] + self.deposits[3:])
+        _, content = self.export(self.admin, path, "output=ndjson&status=approved")
+        self.assertEqual(self.ids(content), [self.deposits[0], self.deposits[2], self.deposits[3]])
+        _, content = self.export(self.admin, path, f"output=ndjson&member={self.alice.pk}&status=approved")
+        self.assertEqual(self.ids(content), [self.deposits[0], self.deposits[2]])
+
+        for query in ("from=2025-02-30", "from=2025-02-01&to=2025-01-01", "member=alice"):
+            self.assertEqual(self.export(self.admin, path, query)[0].status_code, 400, query)
+        self.assertEqual(self.export(self.admin, "/api/loans/repayments/", "status=approved")[0].status_code, 400)
+
+    def test_members_export_only_their_own_rows(self):
+        _, content = self.export(self.alice.user, "/api/savings/deposits/", "output=ndjson")
+        self.assertEqual(self.ids(content), self.deposits[:3])
+        _, content = self.export(self.alice.user, "/api/savings/deposits/", f"output=ndjson&member={self.alice.pk}")
+        self.assertEqual(self.ids(content), self.deposits[:3])
+        _, content = self.export(self.alice.user, "/api/loans/repayments/", "output=ndjson")
+        self.assertEqual(content, "")
+
+        response, _ = self.export(self.alice.user, "/api/savings/deposits/", f"member={self.bob.pk}")
+        self.assertEqual(response.status_code, 403)
+
+    def test_command_streams_the_same_rows(self):
+        out = StringIO()
+        call_command("export_transactions", "deposits", "--format", "ndjson", "--status", "approved",
+                     "--member", str(self.alice.pk), stdout=out)
+        self.assertEqual(self.ids(out.getvalue()), [self.deposits[0], self.deposits[2]])
+
+        out = StringIO()
+        call_command("export_transactions", "deposits", "--from", "2025-02-01", stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual([(int(row["id"]), row["member_username"]) for row in rows], [(self.deposits[2], "alice")])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "repayments.csv")
+            call_command("export_transactions", "repayments", "--output", path)
+            with open(path, newline="") as f:
+                self.assertEqual([int(row["id"]) for row in csv.DictReader(f)], [self.repayment.pk])
+
+        with self.assertRaises(CommandError):
+            call_command("export_transactions", "deposits", "--from", "2025-13-01")
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False, OUTBOX_DISPATCH="worker")
+class SaccoTotalsTests(TestCase):
+    """Headline totals: one rollup query per instance, shared within a request."""
+
+    def setUp(self):
+        DailyActivityRollup.objects.all().delete()
+        DailyActivityRollup.objects.bulk_create([
+            DailyActivityRollup(day=date(2025, 1, 31), kind="deposit", status="approved", count=2, total=400),
+            DailyActivityRollup(day=date(2025, 1, 31), kind="deposit", status="pending", count=1, total=100),
+            DailyActivityRollup(day=date(2025, 1, 10), kind="loan", status="approved", count=1, total=300),
+            DailyActivityRollup(day=date(2025, 1, 11), kind="loan", status="rejected", count=1, total=200),
+            DailyActivityRollup(day=date(2025, 2, 1), kind="loan", status="completed", count=1, total=100),
+            DailyActivityRollup(day=date(2025, 2, 3), kind="repayment", count=2, total=150),
+            DailyActivityRollup(day=date(2025, 2, 3), kind="member", count=4),
+        ])
+
+    def test_for_request_reuses_one_instance_per_range(self):
+        request = APIRequestFactory().get("/")
+        totals = SaccoTotals.for_request(request)
+        with self.assertNumQueries(1):
+            self.assertEqual(totals.deposits.all, Figure(3, Decimal("500")))
+        with self.assertNumQueries(0):
+            again = SaccoTotals.for_request(request)
+            self.assertIs(again, totals)
+            self.assertEqual(again.loans.status("approved", "completed"), Figure(2, Decimal("400")))
+
+        january = SaccoTotals.for_request(request, date(2025, 1, 1), date(2025, 1, 31))
+        self.assertIsNot(january, totals)
+        self.assertIs(SaccoTotals.for_request(request, date(2025, 1, 1), date(2025, 1, 31)), january)
+        self.assertIsNot(SaccoTotals.for_request(APIRequestFactory().get("/")), totals)
+
+    def test_by_month_splits_the_range_with_one_query(self):
+        with self.assertNumQueries(1):
+            months = SaccoTotals(date(2025, 1, 1), date(2025, 2, 28)).by_month()
+            self.assertEqual([month for month, _ in months], [date(2025, 1, 1), date(2025, 2, 1)])
+            january, february = (totals for _, totals in months)
+            self.assertEqual(january.deposits.all, Figure(3, Decimal("500")))
+            self.assertEqual(january.approval_rate, 50.0)
+            self.assertEqual(february.loans.status_counts(), {"completed": 1})
+            self.assertEqual(february.repayment_rate, 150.0)
+            self.assertEqual(february.members_joined, 4)
+            self.assertEqual(february.deposits.all, Figure())
+
+    def test_ratios_are_zero_without_a_denominator(self):
+        totals = SaccoTotals(date(2024, 1, 1), date(2024, 12, 31))
+        self.assertEqual(totals.loans.all, Figure())
+        self.assertEqual((totals.approval_rate, totals.loan_to_deposit_ratio, totals.repayment_rate), (0, 0, 0))
+        self.assertEqual(totals.outstanding, Decimal("0"))
+
+        totals = SaccoTotals(date(2025, 2, 1), date(2025, 2, 28))  # loans and repayments, no deposits
+        self.assertEqual(totals.loan_to_deposit_ratio, 0)
+        self.assertEqual(totals.outstanding, Decimal("-50"))
+
+    def test_member_totals_rows_per_member_and_kind(self):
+        alice, bob = (
+            Member.objects.get(user=User.objects.create_user(
+                username=name, email=f"{name}@example.com", password="x", role="member"))
+            for name in ("alice", "bob")
+        )
+        for amount in ("10.00", "15.00"):
+            Deposit.objects.create(member=alice, amount=Decimal(amount), status="approved")
+        Withdrawal.objects.create(member=alice, amount=Decimal("5.00"))
+        approved = Loan.objects.create(member=bob, amount=Decimal("300.00"), status="approved")
+        Loan.objects.create(member=bob, amount=Decimal("200.00"))
+        LoanRepayment.objects.create(loan=approved, amount=Decimal("50.00"))
+        old = Deposit.objects.create(member=bob, amount=Decimal("99.00"))
+        Deposit.objects.filter(pk=old.pk).update(created_at=day_start(date(2020, 1, 1)))
+
+        today = timezone.localdate()
+        with self.assertNumQueries(1):
+            result = member_totals(today, today)
+        self.assertEqual(result, {
+            alice.pk: {"deposits": Figure(2, Decimal("25.00")), "withdrawals": Figure(1, Decimal("5.00"))},
+            bob.pk: {"loans": Figure(2, Decimal("500.00")), "approved_loans": Figure(1, Decimal("300.00")),
+                     "repayments": Figure(1, Decimal("50.00"))},
+        })
+        self.assertEqual(member_totals(members=[bob.pk])[bob.pk]["deposits"], Figure(1, Decimal("99.00")))
+        self.assertEqual(list(member_totals(members=[alice.pk])), [alice.pk])
@@ -0,0 +1,192 @@
+"""
+SaccoTotals: the headline figures shared by the dashboard views.
+
+All transaction figures come from one grouped query over the daily
+activity rollup; head counts take one query for members and one for staff.
+Each group is computed lazily, at most once per instance, and
+`SaccoTotals.for_request()` reuses one instance per request.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+from functools import cached_property
+
+from django.apps import apps
+from django.db.models import Count, F, Q, Sum, Value
+
+from apps.analytics import rollup
+
+from .dates import datetime_range_filter
+
+APPROVED_LOAN_STATUSES = ("approved", "completed")
+
+
+@dataclass(frozen=True)
+class Figure:
+    """A count of rows and the sum of their amounts."""
+    count: int = 0
+    total: Decimal = Decimal("0")
+
+    def __add__(self, other):
+        return Figure(self.count + other.count, self.total + other.total)
+
+
+@dataclass(frozen=True)
+class TransactionTotals:
+    """Figures for one transaction kind, overall and per status."""
+    all: Figure = Figure()
+    by_status: dict = field(default_factory=dict)
+
+    def status(self, *statuses):
+        """Combined figure for the given statuses."""
+        result = Figure()
+        for name in statuses:
+            result += self.by_status.get(name, Figure())
+        return result
+
+    def status_counts(self):
+        return {name: figure.count for name, figure in self.by_status.items() if figure.count}
+
+
+@dataclass(frozen=True)
+class HeadCounts:
+    members: int = 0
+    active_members: int = 0
+    staff: int = 0
+
+
+def _ratio(part, whole):
+    return round(part / whole * 100, 2) if whole else 0
+
+
+class SaccoTotals:
+    """
+    Headline totals for an optional inclusive date range.
+    Date ranges apply to transactions (by the day they were recorded);
+    head counts are always current.
+    """
+
+    def __init__(self, start=None, end=None, summary=None):
+        self.start = start
+        self.end = end
+        if summary is not None:
+            self._summary = summary
+
+    @classmethod
+    def for_request(cls, request, start=None, end=None):
+        """Return the instance memoized on `request` for this date range."""
+        memo = request.__dict__.setdefault("_sacco_totals", {})
+        key = (start, end)
+        if key not in memo:
+            memo[key] = cls(start, end)
+        return memo[key]
+
+    def by_month(self):
+        """
+        Split this range into calendar months with one grouped query.
+        Returns [(month_start, SaccoTotals)] in chronological order.
+        """
+        months = rollup.summarize_by_month(self.start, self.end)
+        return [(month, SaccoTotals(summary=summary)) for month, summary in months.items()]
+
+    # --- Queries ---
+
+    @cached_property
+    def _summary(self):
+        return rollup.summarize(self.start, self.end)
+
+    @cached_property
+    def head_counts(self):
+        Member = apps.get_model("members", "Member")
+        Staff = apps.get_model("staff", "Staff")
+        figures = Member.objects.aggregate(
+            members=Count("id"),
+            active=Count("id", filter=Q(user__is_active=True)),
+        )
+        return HeadCounts(figures["members"], figures["active"], Staff.objects.count())
+
+    def _kind(self, kind):
+        by_status = {}
+        for (row_kind, status), figures in self._summary.items():
+            if row_kind == kind:
+                by_status[status] = by_status.get(status, Figure()) + Figure(figures["count"], figures["total"])
+        total = Figure()
+        for figure in by_status.values():
+            total += figure
+        return TransactionTotals(total, by_status)
+
+    # --- Transaction figures ---
+
+    @cached_property
+    def members_joined(self):
+        return self._kind("member").all.count
+
+    @cached_property
+    def deposits(self):
+        return self._kind("deposit")
+
+    @cached_property
+    def withdrawals(self):
+        return self._kind("withdrawal")
+
+    @cached_property
+    def loans(self):
+        return self._kind("loan")
+
+    @cached_property
+    def repayments(self):
+        return self._kind("repayment")
+
+    # --- Derived indicators ---
+
+    @property
+    def outstanding(self):
+        return self.loans.all.total - self.repayments.all.total
+
+    @property
+    def approval_rate(self):
+        return _ratio(self.loans.status(*APPROVED_LOAN_STATUSES).count, self.loans.all.count)
+
+    @property
+    def loan_to_deposit_ratio(self):
+        return _ratio(self.loans.all.total, self.deposits.all.total)
+
+    @property
+    def repayment_rate(self):
+        return _ratio(self.repayments.all.total, self.loans.all.total)
+
+
+# Per-member activity: (kind, model, timestamp, member path, extra filter)
+MEMBER_SOURCES = [
+    ("deposits", "savings.Deposit", "created_at", "member_id", None),
+    ("withdrawals", "savings.Withdrawal", "created_at", "member_id", None),
+    ("loans", "loans.Loan", "requested_on", "member_id", None),
+    ("approved_loans", "loans.Loan", "requested_on", "member_id", Q(status__in=APPROVED_LOAN_STATUSES)),
+    ("repayments", "loans.LoanRepayment", "date", "loan__member_id", None),
+]
+
+
+def member_totals(start=None, end=None, members=None):
+    """
+    Per-member counts and sums of every transaction kind in the inclusive
+    date range, fetched with one UNION ALL of grouped range scans.
+    `members` limits them to those member IDs.
+    Returns {member_id: {kind: Figure}}.
+    """
+    parts = []
+    for kind, label, when, member_path, extra in MEMBER_SOURCES:
+        queryset = apps.get_model(label).objects.filter(**datetime_range_filter(when, start, end))
+        if members is not None:
+            queryset = queryset.filter(**{f"{member_path}__in": members})
+        if extra is not None:
+            queryset = queryset.filter(extra)
+        parts.append(
+            queryset.values(member_key=F(member_path))
+            .annotate(kind=Value(kind), n=Count("id"), amount=Sum("amount"))
+            .values_list("member_key", "kind", "n", "amount")
+            .order_by()
+        )
+
+    result = {}
+    for member_id, kind, count, amount in parts[0].union(*parts[1:], all=True):
+        result.setdefault(member_id, {})[kind] = Figure(count, amount or Decimal("0"))
+    return result
@@ -0,0 +1,84 @@
+"""
+Batched writes through one executemany() call.
+
+add_by_pk() sends `UPDATE ... SET col = col + %s WHERE pk = %s` for many
+rows, optionally clamped at a floor. Unlike a CASE/WHEN update, the ORM
+does not have to build an expression per row, and each row still changes
+relative to its committed value, so concurrent writers cannot lose updates.
+
+insert_rows() inserts many rows given as plain tuples. At tens of thousands
+of rows bulk_create spends most of its time compiling SQL and preparing
+values object by object; this adapts each value with the one backend
+adapter its column needs.
+"""
+from django.db import connections, router
+
+
+def add_by_pk(model, changes, fields, floor=None):
+    """
+    Add amounts to `fields` of many rows: `changes` is {pk: {field: amount}}.
+    Fields missing from a row's mapping are left unchanged. With `floor`,
+    results below it are stored as `floor`. Does not send signals; returns
+    the number of statements executed.
+    """
+    if not changes:
+        return 0
+    db = router.db_for_write(model)
+    connection = connections[db]
+    quote = connection.ops.quote_name
+    columns = [model._meta.get_field(name).column for name in fields]
+    if floor is None:
+        assignments = ", ".join(f"{quote(c)} = {quote(c)} + %s" for c in columns)
+    else:
+        greatest = "MAX" if connection.vendor == "sqlite" else "GREATEST"
+        assignments = ", ".join(f"{quote(c)} = {greatest}({quote(c)} + %s, %s)" for c in columns)
+    sql = (
+        f"UPDATE {quote(model._meta.db_table)} SET {assignments} "
+        f"WHERE {quote(model._meta.pk.column)} = %s"
+    )
+    params = []
+    for pk, amounts in changes.items():
+        row = []
+        for name in fields:
+            row += [amounts.get(name, 0)] if floor is None else [amounts.get(name, 0), floor]
+        params.append(row + [pk])
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+    return len(params)
+
+
+def _adapter(field, connection):
+    ops = connection.ops
+    return {
+        "DecimalField": ops.adapt_decimalfield_value,
+        "DateField": ops.adapt_datefield_value,
+        "DateTimeField": ops.adapt_datetimefield_value,
+    }.get(field.get_internal_type())
+
+
+def insert_rows(model, fields, rows):
+    """
+    Insert `rows`, tuples of values for `fields` in that order. Does not
+    send signals or return primary keys; returns the number of rows.
+    """
+    if not rows:
+        return 0
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    model_fields = [model._meta.get_field(name) for name in fields]
+    sql = (
+        f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(quote(f.column) for f in model_fields)}) "
+        f"VALUES ({', '.join(['%s'] * len(model_fields))})"
+    )
+    adapters = list(enumerate(_adapter(f, connection) for f in model_fields))
+    adapters = [(i, adapt) for i, adapt in adapters if adapt]
+    params = []
+    for row in rows:
+        row = list(row)
+        for i, adapt in adapters:
+            if row[i] is not None:
+                row[i] = adapt(row[i])
+        params.append(row)
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+    return len(params)
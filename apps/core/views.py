@@ -1,3 +1,13 @@
-from django.shortcuts import render
+from rest_framework import generics, permissions
 
-# Create your views here.
+from .models import Job
+from .serializers import JobSerializer
+
+
+class JobDetailView(generics.RetrieveAPIView):
+    """
+    Admin-only: the status of a background job and, once done, its result.
+    """
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAdminUser]
@@ -0,0 +1,258 @@
+"""
+Daily interest accrual.
+
+A loan's balance starts at its principal; interest is added day by day as
+it accrues, following the stored repayment schedule (apps/loans/schedule.py)
+exactly. Each installment's interest is spread over the days of its period,
+from the day after the previous due date (or after approval) up to its own
+due date, in whole cents: day i of an n-day period accrues
+floor(I * i / n) - floor(I * (i - 1) / n) of the installment's interest I.
+A borrower paying on schedule has therefore been charged exactly the
+schedule's interest, and owes nothing, on the last due date.
+
+A loan accrues on a day only while it owes something at the start of that
+day: principal plus interest accrued before the day, less repayments made
+before it. That depends only on what happened up to the day, so
+backfilling a range (loans repaid or completed since included) writes the
+same rows as accruing it day by day.
+
+accrue() walks ranges of consecutive loan IDs, one transaction each, taking
+all days of the range at once. A chunk reads its loans, the installments
+covering the range, the accruals and repayments since its start, inserts
+the new InterestAccrual rows with insert_rows() and reads back their IDs,
+moves Loan.balance and Member.loan_balance with one `col = col + %s`
+executemany() each and posts the interest to the ledger at the end of each
+accrued day.
+Days already accrued are skipped, and the unique (loan, date) constraint
+stops two concurrent runs from charging a day twice.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from apps.core import ledger
+from apps.core.cache import bump_data_version
+from apps.core.dates import add_months, day_start
+from apps.core.updates import add_by_pk, insert_rows
+from apps.members.models import Member
+
+from .models import InterestAccrual, Loan, LoanInstallment, LoanRepayment
+
+CHUNK_SIZE = 5000
+ACCRUAL_FIELDS = ("loan", "date", "principal", "interest_rate", "amount", "posted_at")
+LOAN_FIELDS = ("id", "member_id", "amount", "balance", "interest_rate", "interest_method", "approved_on",
+               "status")
+ACCRUING_STATUSES = ("approved", "completed")
+
+
+def day_interest(interest, period_start, due, day):
+    """The part of an installment's `interest` accruing on `day` of the period (period_start, due]."""
+    cents, days, i = int(interest.scaleb(2)), (due - period_start).days, (day - period_start).days
+    return Decimal(cents * i // days - cents * (i - 1) // days).scaleb(-2)
+
+
+def loan_accruals(approved, installments, start, end, owed, repaid=None, done=None):
+    """
+    Yield (day, principal, amount) for each day of [start, end] a loan
+    accrues interest on and has not accrued yet.
+
+    `approved` is the date the schedule counts from, `installments` the
+    (number, due_date, interest, principal) of the schedule from the
+    installment covering `start` on, `owed` what the loan owed at the start
+    of `start`, `repaid` {day: amount repaid that day} and `done` {day:
+    amount} of the days already accrued.
+    """
+    repaid, done = repaid or {}, done or {}
+    day = max(start, approved + timedelta(days=1))
+    for number, due, interest, principal in installments:
+        period_start = add_months(approved, number - 1)
+        while day <= min(due, end):
+            amount = done.get(day)
+            if amount is None and owed > 0:
+                amount = day_interest(interest, period_start, due, day)
+                if amount:
+                    yield day, principal, amount
+            owed += (amount or 0) - repaid.get(day, 0)
+            day += timedelta(days=1)
+
+
+def _id_ranges(chunk_size):
+    """(first, last) ID bounds of consecutive chunks of loans, read from the primary key alone."""
+    last = 0
+    while True:
+        ids = list(Loan.objects.filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids[0], ids[-1]
+        last = ids[-1]
+
+
+def _loans(start, end, first, last):
+    """
+    The loans in an ID range whose schedule covers some day of [start,
+    end], locked for the transaction. Completed loans are included: they
+    may have owed something on those days.
+    """
+    return list(
+        Loan.objects.select_for_update()
+        .filter(status__in=ACCRUING_STATUSES, approved_on__lt=day_start(end), due_date__gte=start,
+                pk__gte=first, pk__lte=last)
+        .order_by("pk")
+        .values(*LOAN_FIELDS)
+    )
+
+
+def _installments(loans, start, end):
+    """{loan_id: [(number, due_date, interest, principal)]} of the installments whose periods meet [start, end]."""
+    flat = {loan["id"]: loan["amount"] for loan in loans if loan["interest_method"] != "reducing"}
+    schedules = defaultdict(list)
+    rows = (
+        LoanInstallment.objects.filter(
+            loan_id__gte=loans[0]["id"], loan_id__lte=loans[-1]["id"],
+            # A period is at most 31 days long
+            due_date__gte=start, due_date__lte=end + timedelta(days=31),
+        )
+        .order_by("loan_id", "number")
+        .values_list("loan_id", "number", "due_date", "interest", "principal", "balance")
+    )
+    for loan_id, number, due, interest, principal, balance in rows:
+        # Flat loans are charged on the original principal, reducing ones on what the period starts owing
+        schedules[loan_id].append((number, due, interest, flat.get(loan_id, principal + balance)))
+    return schedules
+
+
+def _since(loans, start):
+    """
+    Accruals and repayments of a chunk of loans from `start` on, both as
+    {loan_id: {day: amount}}.
+    """
+    first, last = loans[0]["id"], loans[-1]["id"]
+    done = defaultdict(dict)
+    rows = InterestAccrual.objects.filter(
+        loan_id__gte=first, loan_id__lte=last, date__gte=start,
+    ).values_list("loan_id", "date", "amount")
+    for loan_id, day, amount in rows:
+        done[loan_id][day] = amount
+    repaid = defaultdict(lambda: defaultdict(Decimal))
+    rows = LoanRepayment.objects.filter(
+        loan_id__gte=first, loan_id__lte=last, date__gte=day_start(start),
+    ).values_list("loan_id", "date", "amount")
+    for loan_id, when, amount in rows:
+        repaid[loan_id][timezone.localdate(when)] += amount
+    return done, repaid
+
+
+def _owed_at(loans, start, done, repaid):
+    """
+    {loan_id: owed at the start of `start`}. A loan with a balance is worked
+    back from it; one paid off is added up from its history before `start`,
+    since its balance stopped at zero.
+    """
+    owed = {
+        loan["id"]: loan["balance"] - sum(done[loan["id"]].values(), Decimal("0"))
+        + sum(repaid[loan["id"]].values(), Decimal("0"))
+        for loan in loans if loan["balance"] > 0
+    }
+    paid_off = {loan["id"]: loan["amount"] for loan in loans if loan["balance"] <= 0}
+    if paid_off:
+        accrued = dict(
+            InterestAccrual.objects.filter(loan_id__in=paid_off, date__lt=start).order_by()
+            .values("loan_id").annotate(total=Sum("amount")).values_list("loan_id", "total")
+        )
+        repaid_before = dict(
+            LoanRepayment.objects.filter(loan_id__in=paid_off, date__lt=day_start(start)).order_by()
+            .values("loan_id").annotate(total=Sum("amount")).values_list("loan_id", "total")
+        )
+        for loan_id, amount in paid_off.items():
+            owed[loan_id] = amount + accrued.get(loan_id, 0) - repaid_before.get(loan_id, 0)
+    return owed
+
+
+def balance_after(owed, accrued, repaid):
+    """
+    The balance now of a loan owing `owed` before the days of `accrued` and
+    `repaid` ({day: amount}), repayments stopping at zero as they do.
+    """
+    for day in sorted(accrued.keys() | repaid.keys()):
+        owed = max(owed + accrued.get(day, 0) - repaid.get(day, 0), Decimal("0"))
+    return owed
+
+
+def _accrue_chunk(loans, start, end):
+    """Write the missing accruals of a chunk of loans (LOAN_FIELDS dicts). Returns their amounts."""
+    installments = _installments(loans, start, end)
+    done, repaid = _since(loans, start)
+    owed = _owed_at(loans, start, done, repaid)
+    tz = timezone.get_current_timezone()
+    rows, new, posted_at = [], defaultdict(dict), {}
+    for loan in loans:
+        loan_id, approved = loan["id"], timezone.localdate(loan["approved_on"], tz)
+        for day, principal, amount in loan_accruals(approved, installments.get(loan_id, ()), start, end,
+                                                    owed[loan_id], repaid[loan_id], done[loan_id]):
+            if day not in posted_at:
+                posted_at[day] = day_start(day + timedelta(days=1))
+            rows.append((loan_id, day, principal, loan["interest_rate"], amount, posted_at[day]))
+            new[loan_id][day] = amount
+    if not rows:
+        return []
+
+    insert_rows(InterestAccrual, ACCRUAL_FIELDS, rows)
+    # Read the new rows back for their IDs, which the ledger entries point to
+    written = [
+        row for row in InterestAccrual.objects.filter(
+            loan_id__gte=loans[0]["id"], loan_id__lte=loans[-1]["id"], date__gte=start, date__lte=end,
+        ).values_list("pk", "loan_id", "date", "amount", "posted_at")
+        if row[2] in new[row[1]]
+    ]
+
+    # Replay each loan up to today, so one paid off since is only charged
+    # what its repayments did not already cover
+    by_id = {loan["id"]: loan for loan in loans}
+    loan_deltas, member_deltas, reopened = {}, defaultdict(Decimal), []
+    for loan_id, days in new.items():
+        loan = by_id[loan_id]
+        delta = balance_after(owed[loan_id], {**done[loan_id], **days}, repaid[loan_id]) - loan["balance"]
+        if delta:
+            loan_deltas[loan_id] = {"balance": delta}
+            member_deltas[loan["member_id"]] += delta
+            if loan["status"] == "completed":
+                reopened.append(loan_id)
+    add_by_pk(Loan, loan_deltas, ["balance"])
+    add_by_pk(Member, {pk: {"loan_balance": delta} for pk, delta in member_deltas.items()}, ["loan_balance"])
+    Loan.objects.filter(pk__in=reopened, balance__gt=0).update(status="approved")
+    ledger.post_history([
+        {"member_id": by_id[loan_id]["member_id"], "account": "loan", "amount": amount,
+         "source_type": "interest", "source_id": pk, "occurred_at": when}
+        for pk, loan_id, _, amount, when in sorted(written, key=lambda row: (row[2], row[1]))
+    ])
+    return [amount for _, _, _, amount, _ in written]
+
+
+def accrue(start, end=None, chunk_size=CHUNK_SIZE):
+    """
+    Accrue interest for every day from `start` to `end` (inclusive; just
+    `start` by default) not accrued yet. Days must have ended. Returns
+    {"loans": loans checked, "accruals": rows written, "interest": their total}.
+    """
+    end = end or start
+    if start > end:
+        raise ValueError("The start date must not be after the end date.")
+    if end >= timezone.localdate():
+        raise ValueError("Interest can only be accrued for days that have ended.")
+
+    result = {"loans": 0, "accruals": 0, "interest": Decimal("0")}
+    for first, last in _id_ranges(chunk_size):
+        with transaction.atomic():
+            loans = _loans(start, end, first, last)
+            amounts = _accrue_chunk(loans, start, end) if loans else []
+            if amounts:
+                # Balances were moved with plain UPDATEs: invalidate cached dashboards
+                transaction.on_commit(bump_data_version)
+        result["loans"] += len(loans)
+        result["accruals"] += len(amounts)
+        result["interest"] += sum(amounts, Decimal("0"))
+    return result
@@ -0,0 +1,49 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apps.loans import accrual
+
+
+class Command(BaseCommand):
+    help = (
+        "Accrue daily interest on approved loans for a day (yesterday by default) or, with --from/--to, "
+        "backfill a range of days. Days already accrued are skipped, so it is safe to re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Day to accrue (YYYY-MM-DD).")
+        parser.add_argument("--from", dest="start", help="First day of a range to backfill (YYYY-MM-DD).")
+        parser.add_argument("--to", dest="end", help="Last day of the range (YYYY-MM-DD); defaults to yesterday.")
+        parser.add_argument("--chunk-size", type=int, default=accrual.CHUNK_SIZE, help="Loans per transaction.")
+
+    def _date(self, value, option):
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"{option} must be a date in YYYY-MM-DD format.")
+        return day
+
+    def handle(self, *args, **options):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        if options["date"] and (options["start"] or options["end"]):
+            raise CommandError("Use either --date or --from/--to.")
+        if options["start"]:
+            start = self._date(options["start"], "--from")
+            end = self._date(options["end"], "--to") if options["end"] else yesterday
+        elif options["end"]:
+            raise CommandError("--to needs --from.")
+        else:
+            start = end = self._date(options["date"], "--date") if options["date"] else yesterday
+
+        started = time.perf_counter()
+        try:
+            result = accrual.accrue(start, end, options["chunk_size"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f"Accrued {result['interest']} interest in {result['accruals']} entries on {result['loans']} loans "
+            f"for {start} to {end} in {time.perf_counter() - started:.2f}s."
+        ))
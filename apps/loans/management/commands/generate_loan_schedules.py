@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.loans import schedule
+from apps.loans.models import Loan
+
+
+class Command(BaseCommand):
+    help = "Regenerate the installment schedules of approved and completed loans. Safe to re-run."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loan", type=int, action="append", help="Only this loan ID (repeatable).")
+        parser.add_argument("--chunk-size", type=int, default=schedule.CHUNK_SIZE, help="Loans per batch.")
+
+    def handle(self, *args, **options):
+        queryset = Loan.objects.all()
+        if options["loan"]:
+            queryset = queryset.filter(pk__in=options["loan"])
+        started = time.perf_counter()
+        loans, installments = schedule.regenerate(options["chunk_size"], queryset)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {installments} installments for {loans} loans in {time.perf_counter() - started:.2f}s."
+        ))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0002_loan_approved_by'),
+        ('members', '0005_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['member', '-requested_on', '-id'], name='loan_member_requested_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['-requested_on', '-id'], name='loan_requested_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['status', 'requested_on'], name='loan_status_requested_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanrepayment',
+            index=models.Index(fields=['loan', '-date', '-id'], name='repayment_loan_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanrepayment',
+            index=models.Index(fields=['-date', '-id'], name='repayment_date_idx'),
+        ),
+    ]
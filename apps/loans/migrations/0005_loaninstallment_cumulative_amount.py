@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+def fill_cumulative_amount(apps, schema_editor):
+    """Running total of amount per loan, for schedules generated before the column existed."""
+    LoanInstallment = apps.get_model('loans', 'LoanInstallment')
+    running_total = (
+        LoanInstallment.objects.filter(loan=models.OuterRef('loan'), number__lte=models.OuterRef('number'))
+        .order_by().values('loan').annotate(total=models.Sum('amount')).values('total')
+    )
+    LoanInstallment.objects.update(cumulative_amount=models.Subquery(running_total))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0004_loaninstallment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loaninstallment',
+            name='cumulative_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(fill_cumulative_amount, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0005_loaninstallment_cumulative_amount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterestAccrual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('principal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('interest_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('posted_at', models.DateTimeField()),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accruals', to='loans.loan')),
+            ],
+            options={
+                'ordering': ['loan', 'date'],
+                'indexes': [models.Index(fields=['date'], name='accrual_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('loan', 'date'), name='unique_loan_accrual_date')],
+            },
+        ),
+    ]
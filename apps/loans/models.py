@@ -11,11 +11,17 @@ class Loan(models.Model):
         ('rejected', 'Rejected'),
         ('completed', 'Completed'),
     ]
+    INTEREST_METHOD_CHOICES = [
+        ('flat', 'Flat rate'),
+        ('reducing', 'Reducing balance'),
+    ]
 
     member = models.ForeignKey('members.Member', on_delete=models.CASCADE, related_name='loans')
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     interest_rate = models.DecimalField(max_digits=5, decimal_places=2, default=10.00)  # 10% default
     duration_months = models.PositiveIntegerField(default=12)
+    # How interest is charged over the repayment schedule (apps/loans/schedule.py)
+    interest_method = models.CharField(max_length=10, choices=INTEREST_METHOD_CHOICES, default='flat')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     requested_on = models.DateTimeField(default=timezone.now)
     approved_on = models.DateTimeField(null=True, blank=True)
@@ -24,6 +30,15 @@ class Loan(models.Model):
 
 
 
+    class Meta:
+        indexes = [
+            # A member's loans and the admin list, newest first (id breaks ties)
+            models.Index(fields=['member', '-requested_on', '-id'], name='loan_member_requested_idx'),
+            models.Index(fields=['-requested_on', '-id'], name='loan_requested_idx'),
+            # Approval queues and status + date range reports
+            models.Index(fields=['status', 'requested_on'], name='loan_status_requested_idx'),
+        ]
+
     def __str__(self):
         return f"Loan #{self.id} - {self.member.user.username} - {self.status}"
     
@@ -37,10 +52,77 @@ class Loan(models.Model):
 approved_on = models.DateTimeField(null=True, blank=True)
     
 
+class LoanInstallment(models.Model):
+    """
+    One monthly installment of an approved loan's repayment schedule.
+    Generated by apps/loans/schedule.py; `balance` is the principal still
+    outstanding once this installment is paid and `cumulative_amount` the
+    total due up to and including it, so the oldest unpaid installment is
+    the first whose cumulative_amount exceeds what has been repaid.
+    """
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name='installments')
+    number = models.PositiveSmallIntegerField()
+    due_date = models.DateField()
+    principal = models.DecimalField(max_digits=12, decimal_places=2)
+    interest = models.DecimalField(max_digits=12, decimal_places=2)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    cumulative_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['loan', 'number']
+        constraints = [
+            models.UniqueConstraint(fields=['loan', 'number'], name='unique_loan_installment'),
+        ]
+        indexes = [
+            # Installments falling due in a date range, for arrears reports
+            models.Index(fields=['due_date', 'loan'], name='installment_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Loan #{self.loan_id} installment {self.number}: {self.amount} due {self.due_date}"
+
+
+class InterestAccrual(models.Model):
+    """
+    Interest charged on an approved loan for one day (apps/loans/accrual.py).
+    At most one row per loan and day, which is what makes accrual safe to
+    re-run; `posted_at` is the end of that day, when the interest is added
+    to the loan and member balances and the ledger.
+    """
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name='accruals')
+    date = models.DateField()
+    # Principal the day's interest was charged on, and the yearly rate used
+    principal = models.DecimalField(max_digits=12, decimal_places=2)
+    interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    posted_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['loan', 'date']
+        constraints = [
+            models.UniqueConstraint(fields=['loan', 'date'], name='unique_loan_accrual_date'),
+        ]
+        indexes = [
+            # Interest accrued over a date range, for income reports
+            models.Index(fields=['date'], name='accrual_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Loan #{self.loan_id} interest {self.amount} for {self.date}"
+
+
 class LoanRepayment(models.Model):
     loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name='repayments')
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     date = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # A loan's repayments and the admin list, newest first (id breaks ties)
+            models.Index(fields=['loan', '-date', '-id'], name='repayment_loan_date_idx'),
+            models.Index(fields=['-date', '-id'], name='repayment_date_idx'),
+        ]
+
     def __str__(self):
-        return f"Repayment of {self.amount} for Loan #{self.loan.id}"
+        return f"Repayment of {self.amount} for Loan #{self.loan_id}"
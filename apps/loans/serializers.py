@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Loan, LoanRepayment
+from .models import Loan, LoanInstallment, LoanRepayment
 
 class LoanSerializer(serializers.ModelSerializer):
     member_name = serializers.CharField(source='member.user.username', read_only=True)
@@ -8,13 +8,22 @@ class LoanSerializer(serializers.ModelSerializer):
         model = Loan
         fields = [
             'id', 'member', 'member_name', 'amount', 'interest_rate',
-            'duration_months', 'status', 'requested_on',
+            'duration_months', 'interest_method', 'status', 'requested_on',
             'approved_on', 'due_date', 'balance'
         ]
         read_only_fields = ['status', 'approved_on', 'balance']
 
 
 class LoanRepaymentSerializer(serializers.ModelSerializer):
+    # Loan choices are rendered with Loan.__str__, which reads member.user
+    loan = serializers.PrimaryKeyRelatedField(queryset=Loan.objects.select_related('member__user'))
+
     class Meta:
         model = LoanRepayment
         fields = ['id', 'loan', 'amount', 'date']
+
+
+class LoanInstallmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LoanInstallment
+        fields = ['number', 'due_date', 'principal', 'interest', 'amount', 'balance']
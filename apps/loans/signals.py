@@ -1,45 +1,118 @@
-from django.db.models.signals import post_save
+"""
+Loan balance side effects.
+
+Approving a loan (creating it approved, or saving a pending loan as
+approved) and recording a repayment only store an outbox event; the
+balance changes, and the ledger entry of an approval, are applied after
+commit by the handlers below with plain UPDATEs, so they never re-enter these receivers and a batch of events
+costs one statement per loan or member. Re-saving an approved loan
+records nothing.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
-from .models import Loan, LoanRepayment
+from django.utils.dateparse import parse_datetime
+
+from apps.core import ledger, outbox
+from apps.core.updates import add_by_pk
 from apps.members.models import Member
+from .models import Loan, LoanRepayment
+
 
 @receiver(post_save, sender=Loan)
 def set_loan_balance(sender, instance, created, **kwargs):
     """
-    Automatically calculate total loan balance when approved.
+    A loan created approved starts out owing its principal. Interest is
+    added to the balance day by day as it accrues (apps/loans/accrual.py).
     """
     if created and instance.status == 'approved':
-        principal = instance.amount
-        interest = (instance.interest_rate / 100) * principal
-        total = principal + interest
-        instance.balance = total
-        instance.save()
+        outbox.publish(
+            "loans.loan_created_approved",
+            loan_id=instance.pk, amount=instance.amount,
+        )
+
+
+@receiver(pre_save, sender=Loan)
+def note_approval(sender, instance, update_fields=None, **kwargs):
+    """
+    Flag a save that moves the loan to approved, reading the stored status
+    only when the save could be one.
+    """
+    instance._becomes_approved = False
+    if instance.status != 'approved' or (update_fields is not None and 'status' not in update_fields):
+        return
+    if instance._state.adding:
+        instance._becomes_approved = True
+    else:
+        stored = Loan.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+        instance._becomes_approved = stored not in ('approved', 'completed')
+
+
+def publish_approval(loan):
+    """Record the event that raises the member's loan balance for an approved loan."""
+    outbox.publish(
+        "loans.loan_approved_saved",
+        loan_id=loan.pk, member_id=loan.member_id, amount=loan.amount,
+        occurred_at=loan.approved_on or loan.requested_on,
+    )
 
 
 # When a loan is approved → update the member's loan balance
 @receiver(post_save, sender=Loan)
 def update_member_balance_on_approval(sender, instance, created, **kwargs):
-    if instance.status == 'approved':  # Only update when loan is approved
-        member = instance.member
-        member.loan_balance += instance.amount
-        member.save()
+    if getattr(instance, '_becomes_approved', False):  # Only on the save that approves it
+        instance._becomes_approved = False
+        publish_approval(instance)
 
 
 #  When a repayment is made → reduce member's loan balance
 @receiver(post_save, sender=LoanRepayment)
 def update_member_balance_on_repayment(sender, instance, created, **kwargs):
     if created:
-        loan = instance.loan
-        member = loan.member
-        # Reduce the outstanding balance on both the loan and the member
-        loan.balance -= instance.amount
-        if loan.balance < 0:
-            loan.balance = 0
-        loan.save()
+        outbox.publish(
+            "loans.repayment_created",
+            repayment_id=instance.pk, loan_id=instance.loan_id, amount=instance.amount,
+        )
+
+
+@outbox.handler("loans.loan_created_approved")
+def set_balances(payloads):
+    # The principal is posted to the ledger by credit_member_loan_balances(),
+    # which runs for loans created approved as well
+    loans = [Loan(pk=payload["loan_id"], balance=Decimal(payload["amount"])) for payload in payloads]
+    Loan.objects.bulk_update(loans, ["balance"])
+
 
-        member.loan_balance -= instance.amount
-        if member.loan_balance < 0:
-            member.loan_balance = 0
-        member.save()
+@outbox.handler("loans.loan_approved_saved")
+def credit_member_loan_balances(payloads):
+    totals = defaultdict(Decimal)
+    for payload in payloads:
+        totals[payload["member_id"]] += Decimal(payload["amount"])
+    add_by_pk(Member, {pk: {"loan_balance": total} for pk, total in totals.items()}, ["loan_balance"])
+    ledger.post_many([
+        {"member_id": payload["member_id"], "account": "loan", "amount": Decimal(payload["amount"]),
+         "source_type": "loan", "source_id": payload["loan_id"],
+         "occurred_at": parse_datetime(payload["occurred_at"]) if payload.get("occurred_at") else None}
+        for payload in payloads
+    ])
 
 
+@outbox.handler("loans.repayment_created")
+def apply_repayments(payloads):
+    # Reduce the outstanding balance on both the loan and the member, never
+    # below zero, and close the loans that are paid off
+    members = dict(
+        Loan.objects.filter(pk__in={payload["loan_id"] for payload in payloads}).values_list("pk", "member_id")
+    )
+    loans, member_totals = defaultdict(Decimal), defaultdict(Decimal)
+    for payload in payloads:
+        if payload["loan_id"] not in members:
+            continue
+        amount = Decimal(payload["amount"])
+        loans[payload["loan_id"]] -= amount
+        member_totals[members[payload["loan_id"]]] -= amount
+    add_by_pk(Loan, {pk: {"balance": total} for pk, total in loans.items()}, ["balance"], floor=0)
+    add_by_pk(Member, {pk: {"loan_balance": total} for pk, total in member_totals.items()}, ["loan_balance"], floor=0)
+    Loan.objects.filter(pk__in=list(loans), status="approved", balance__lte=0).update(status="completed")
@@ -0,0 +1,11 @@
+"""Background tasks for loans (run by `manage.py runworker`)."""
+from datetime import date
+
+from apps.core.jobs import task
+
+from . import accrual
+
+
+@task("loans.accrue_interest", priority=-10)
+def accrue_interest(start, end=None):
+    return accrual.accrue(date.fromisoformat(start), date.fromisoformat(end) if end else None)
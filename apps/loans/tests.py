@@ -1,3 +1,295 @@
-from django.test import TestCase
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.core import ledger, outbox, reconcile
+from apps.core.dates import add_months, day_start
+from apps.core.models import LedgerEntry, OutboxEvent
+from apps.core.testing import ListQueryCountMixin
+from apps.members.models import Member
+
+from . import accrual, schedule
+from .models import InterestAccrual, Loan, LoanInstallment, LoanRepayment
+
+User = get_user_model()
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False)
+class ListQueryCountTests(ListQueryCountMixin, TestCase):
+    """List and detail endpoints must not run a query per row."""
+
+    def add_rows(self, model, n):
+        """n approved loans spread over every member, each with two repayments."""
+        loans = Loan.objects.bulk_create([
+            Loan(member=self.members[i % len(self.members)], amount=Decimal("1000.00"),
+                 balance=Decimal("800.00"), status="approved", approved_by=self.admin)
+            for i in range(n)
+        ])
+        LoanRepayment.objects.bulk_create([
+            LoanRepayment(loan=loan, amount=Decimal("100.00")) for loan in loans for _ in range(2)
+        ])
+
+    def test_loan_list_queries_are_flat(self):
+        self.assert_flat(Loan, "/api/loans/loans/")
+
+    def test_repayment_list_queries_are_flat(self):
+        self.assert_flat(LoanRepayment, "/api/loans/repayments/", member_field="loan__member")
+
+
+class ScheduleTests(TestCase):
+    """Installment schedules for both interest methods."""
+
+    def loan(self, **fields):
+        fields.setdefault("approved_on", timezone.make_aware(datetime(2025, 1, 31, 12)))
+        return Loan(amount=Decimal("12000.00"), interest_rate=Decimal("12.00"), status="approved", **fields)
+
+    def test_flat_rate_spreads_principal_and_interest_evenly(self):
+        [installments] = schedule.compute([self.loan(duration_months=6, interest_method="flat")])
+        self.assertEqual({i.principal for i in installments}, {Decimal("2000.00")})
+        self.assertEqual({i.interest for i in installments}, {Decimal("120.00")})
+        self.assertEqual(installments[-1].balance, Decimal("0.00"))
+        # Month ends are clamped: Jan 31 + 1 month is Feb 28
+        self.assertEqual([i.due_date for i in installments[:2]], [date(2025, 2, 28), date(2025, 3, 31)])
+
+    def test_reducing_balance_pays_equal_installments(self):
+        [installments] = schedule.compute([self.loan(duration_months=12, interest_method="reducing")])
+        self.assertEqual(len(installments), 12)
+        self.assertEqual({i.amount for i in installments[:-1]}, {Decimal("1066.19")})
+        self.assertEqual(installments[0].interest, Decimal("120.00"))
+        self.assertEqual(sum(i.principal for i in installments), Decimal("12000.00"))
+        self.assertEqual(installments[-1].balance, Decimal("0.00"))
+        self.assertLess(installments[-1].interest, installments[0].interest)
+
+    def test_batch_matches_single_loan_schedules(self):
+        terms = [("1000.01", "10.00", 3, "flat"), ("50000.00", "18.50", 24, "reducing"), ("700.00", "0.00", 5, "reducing")]
+        loans = [
+            Loan(amount=Decimal(amount), interest_rate=Decimal(rate), duration_months=months,
+                 interest_method=method, status="approved", approved_on=timezone.now())
+            for amount, rate, months, method in terms
+        ]
+        batch = schedule.compute(loans)
+        for loan, installments in zip(loans, batch):
+            self.assertEqual(installments, schedule.compute([loan])[0])
+            self.assertEqual(sum(i.principal for i in installments), loan.amount)
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False)
+class LoanScheduleApiTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        user = User.objects.create_user(username="member", email="member@example.com", password="x", role="member")
+        self.member = Member.objects.get(user=user)
+        self.loan = Loan.objects.create(
+            member=self.member, amount=Decimal("6000.00"), duration_months=6, interest_method="reducing",
+        )
+        self.client = APIClient()
+
+    def test_approval_stores_the_schedule_and_due_date(self):
+        self.client.force_authenticate(self.member.user)
+        preview = self.client.get(f"/api/loans/loans/{self.loan.pk}/schedule/").data
+        self.assertTrue(preview["preview"])
+        self.assertEqual(len(preview["installments"]), 6)
+
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.post(f"/api/loans/loans/{self.loan.pk}/approve/").status_code, 200)
+        self.loan.refresh_from_db()
+        self.assertEqual(LoanInstallment.objects.filter(loan=self.loan).count(), 6)
+        self.assertEqual(self.loan.due_date, LoanInstallment.objects.filter(loan=self.loan).last().due_date)
+        self.assertEqual(self.loan.due_date, schedule.due_date(self.loan))
+
+        stored = self.client.get(f"/api/loans/loans/{self.loan.pk}/schedule/").data
+        self.assertFalse(stored["preview"])
+        self.assertEqual(stored["total_principal"], Decimal("6000.00"))
+
+
+@override_settings(OUTBOX_DISPATCH="worker")
+class RepaymentApiTests(TestCase):
+    """Repayments are checked before anything is saved."""
+
+    def setUp(self):
+        users = [
+            User.objects.create_user(username=f"member{i}", email=f"member{i}@example.com", password="x",
+                                     role="member")
+            for i in range(2)
+        ]
+        self.member, self.other = (Member.objects.get(user=user) for user in users)
+        self.loan = Loan.objects.create(member=self.member, amount=Decimal("1000.00"), status="approved")
+        outbox.drain()
+        self.client = APIClient()
+
+    def repay(self, member, loan):
+        self.client.force_authenticate(member.user)
+        return self.client.post("/api/loans/repayments/", {"loan": loan.pk, "amount": "100.00"}, format="json")
+
+    def assert_nothing_recorded(self):
+        self.assertFalse(LoanRepayment.objects.exists())
+        self.assertFalse(OutboxEvent.objects.filter(topic="loans.repayment_created").exists())
+        self.assertFalse(LedgerEntry.objects.filter(source_type="repayment").exists())
+
+    def test_repaying_someone_elses_loan_is_forbidden(self):
+        self.assertEqual(self.repay(self.other, self.loan).status_code, 403)
+        self.assert_nothing_recorded()
+
+    def test_repaying_a_loan_not_approved_is_rejected(self):
+        pending = Loan.objects.create(member=self.member, amount=Decimal("500.00"))
+        response = self.repay(self.member, pending)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("loan", response.data)
+        self.assert_nothing_recorded()
+
+    def test_repayment_is_saved_with_its_event_and_ledger_entry(self):
+        self.assertEqual(self.repay(self.member, self.loan).status_code, 201)
+        outbox.drain()
+        self.assertEqual(Loan.objects.get(pk=self.loan.pk).balance, Decimal("900.00"))
+        self.assertEqual(ledger.balance_at(self.member.pk, "loan", timezone.now()), Decimal("900.00"))
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False, OUTBOX_DISPATCH="sync")
+class ConcurrentApprovalTests(TransactionTestCase):
+    """Staff approving the same loan at once must approve it only once."""
+    threads = 8
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("needs a database that supports concurrent connections")
+        self.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        user = User.objects.create_user(username="member", email="member@example.com", password="x", role="member")
+        self.member = Member.objects.get(user=user)
+
+    def test_concurrent_approvals_of_one_loan_apply_once(self):
+        loan = Loan.objects.create(member=self.member, amount=Decimal("6000.00"), duration_months=6)
+        barrier = threading.Barrier(self.threads)
+
+        def approve(_):
+            client = APIClient()
+            client.force_authenticate(self.admin)
+            barrier.wait()
+            try:
+                return client.post(f"/api/loans/loans/{loan.pk}/approve/").status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.threads) as pool:
+            codes = list(pool.map(approve, range(self.threads)))
+
+        self.assertEqual(codes.count(200), 1)
+        self.assertEqual(codes.count(400), self.threads - 1)
+        self.assertEqual(LoanInstallment.objects.filter(loan=loan).count(), 6)
+        self.assertEqual(Member.objects.get(pk=self.member.pk).loan_balance, Decimal("6000.00"))
+        self.assertEqual(list(LedgerEntry.objects.filter(member=self.member).values_list("amount", flat=True)),
+                         [Decimal("6000.00")])
+
+
+class InterestAccrualTests(TestCase):
+    """Daily interest following the schedule, written once per loan and day."""
+
+    def setUp(self):
+        user = User.objects.create_user(username="member", email="member@example.com", password="x", role="member")
+        self.member = Member.objects.get(user=user)
+        approved_on = timezone.make_aware(datetime(2025, 1, 10, 12))
+        self.flat, self.reducing = Loan.objects.bulk_create([
+            Loan(member=self.member, amount=Decimal("36500.00"), balance=Decimal("36500.00"),
+                 interest_rate=Decimal("10.00"), duration_months=months, interest_method=method,
+                 status="approved", approved_on=approved_on, due_date=add_months(date(2025, 1, 10), months))
+            for months, method in ((2, "flat"), (12, "reducing"))
+        ])
+        schedule.generate([self.flat, self.reducing])
+        Member.objects.filter(pk=self.member.pk).update(loan_balance=Decimal("73000.00"))
+
+    def interest(self, loan, number=None):
+        installments = LoanInstallment.objects.filter(loan=loan)
+        if number:
+            installments = installments.filter(number=number)
+        return sum(i.interest for i in installments)
+
+    def accrued(self, loan):
+        return sum(a.amount for a in InterestAccrual.objects.filter(loan=loan))
+
+    def test_overlapping_runs_accrue_each_day_once(self):
+        first = accrual.accrue(date(2025, 1, 1), date(2025, 1, 20))
+        second = accrual.accrue(date(2025, 1, 15), date(2025, 2, 15))
+        self.assertEqual(accrual.accrue(date(2025, 2, 15))["accruals"], 0)
+
+        # From January 11: the whole first period (to February 10), then 5
+        # of the 28 days of the second, in whole cents
+        self.assertEqual(first["accruals"] + second["accruals"], 36 * 2)
+        expected = {}
+        for loan in (self.flat, self.reducing):
+            second_period = int(self.interest(loan, 2).scaleb(2)) * 5 // 28
+            expected[loan.pk] = self.interest(loan, 1) + Decimal(second_period).scaleb(-2)
+            self.assertEqual(self.accrued(loan), expected[loan.pk])
+        self.assertEqual(expected[self.flat.pk], Decimal("304.16") + Decimal("54.31"))
+
+        total = sum(expected.values())
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.loan_balance, Decimal("73000.00") + total)
+        self.flat.refresh_from_db()
+        self.assertEqual(self.flat.balance, Decimal("36500.00") + expected[self.flat.pk])
+        # Posted at the end of each accrued day
+        entry = LedgerEntry.objects.filter(member=self.member, account="loan").order_by("seq").first()
+        self.assertEqual(entry.occurred_at, timezone.make_aware(datetime(2025, 1, 12)))
+        self.assertEqual(ledger.balance_at(self.member.pk, "loan", timezone.now()), total)
+        self.assertEqual(reconcile.expected_balances({"member_id": self.member.pk})[self.member.pk]["loan"],
+                         self.member.loan_balance)
+
+    def test_whole_schedule_accrues_its_interest_and_stops_at_the_due_date(self):
+        result = accrual.accrue(date(2025, 1, 1), date(2025, 3, 31))
+        self.assertEqual(result["loans"], 2)
+        self.assertEqual(InterestAccrual.objects.filter(loan=self.flat).count(), 31 + 28)
+        self.assertEqual(self.accrued(self.flat), self.interest(self.flat))
+        self.assertEqual(self.accrued(self.flat), Decimal("608.33"))
+        with self.assertRaises(ValueError):
+            accrual.accrue(timezone.localdate())
+
+    def test_backfill_matches_day_by_day_for_a_loan_repaid_since(self):
+        # Paid off on January 20, before any interest was accrued: the
+        # backfill still charges the days it was owing, and only those
+        when = timezone.make_aware(datetime(2025, 1, 20, 12))
+        LoanRepayment.objects.create(loan=self.reducing, amount=Decimal("40000.00"), date=when)
+        ledger.post(self.member.pk, "loan", Decimal("-36500.00"), "repayment", None, when, floor=0)
+
+        def reset():
+            InterestAccrual.objects.all().delete()
+            Loan.objects.filter(pk=self.flat.pk).update(balance=Decimal("36500.00"))
+            Loan.objects.filter(pk=self.reducing.pk).update(balance=Decimal("0.00"), status="completed")
+            Member.objects.filter(pk=self.member.pk).update(loan_balance=Decimal("36500.00"))
+
+        def state():
+            return (
+                list(InterestAccrual.objects.order_by("loan", "date").values_list("loan", "date", "amount")),
+                list(Loan.objects.order_by("pk").values_list("balance", "status")),
+                Member.objects.get(pk=self.member.pk).loan_balance,
+            )
+
+        reset()
+        accrual.accrue(date(2025, 1, 1), date(2025, 1, 31))
+        backfilled = state()
+        reset()
+        day = date(2025, 1, 1)
+        while day <= date(2025, 1, 31):
+            accrual.accrue(day)
+            day += timedelta(days=1)
+        self.assertEqual(state(), backfilled)
+
+        # January 11 to 20: 10 of the 31 days of the first period
+        charged = Decimal(int(self.interest(self.reducing, 1).scaleb(2)) * 10 // 31).scaleb(-2)
+        self.assertEqual(self.accrued(self.reducing), charged)
+        self.reducing.refresh_from_db()
+        self.assertEqual((self.reducing.balance, self.reducing.status), (Decimal("0.00"), "completed"))
+        # The interest predates the repayment entry: the member's ledger was rebuilt in time order
+        entries = list(LedgerEntry.objects.filter(member=self.member, account="loan").order_by("seq")
+                       .values_list("occurred_at", flat=True))
+        self.assertEqual(entries, sorted(entries))
+        self.assertEqual(ledger.balance_at(self.member.pk, "loan", day_start(date(2025, 2, 1))),
+                         Decimal("73000.00") + charged + self.accrued(self.flat) - Decimal("40000.00"))
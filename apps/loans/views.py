@@ -1,10 +1,18 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
 from django.utils import timezone
 from .models import Loan, LoanRepayment
-from .serializers import LoanSerializer, LoanRepaymentSerializer
+from .serializers import LoanSerializer, LoanRepaymentSerializer, LoanInstallmentSerializer
+from . import schedule as loan_schedule
+from .signals import publish_approval
 from apps.members.models import Member
+from apps.core import ledger
+from apps.core.exports import ExportMixin
+from apps.core.idempotency import IdempotentCreateMixin
+from apps.core.signals import row_updated
 
 
 class IsAdminOrOwner(permissions.BasePermission):
@@ -15,27 +23,28 @@ class IsAdminOrOwner(permissions.BasePermission):
         if request.user.is_staff:
             return True
         if hasattr(obj, "member"):
-            return obj.member.user == request.user
+            return obj.member.user_id == request.user.pk
         if hasattr(obj, "loan"):
-            return obj.loan.member.user == request.user
+            return obj.loan.member.user_id == request.user.pk
         return False
 
 
-class LoanViewSet(viewsets.ModelViewSet):
+class LoanViewSet(ExportMixin, viewsets.ModelViewSet):
     """
-    Handles loan applications, viewing, and admin approval.
+    Handles loan applications, viewing, admin approval and bulk export.
     """
-    queryset = Loan.objects.all().order_by('-requested_on')
+    queryset = Loan.objects.select_related('member__user').order_by('-requested_on')
     serializer_class = LoanSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrOwner]
+    export_kind = "loans"
 
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
-            return Loan.objects.all().order_by('-requested_on')
+            return self.queryset
         try:
             member = Member.objects.get(user=user)
-            return Loan.objects.filter(member=member).order_by('-requested_on')
+            return self.queryset.filter(member=member)
         except Member.DoesNotExist:
             return Loan.objects.none()
 
@@ -53,26 +62,58 @@ class LoanViewSet(viewsets.ModelViewSet):
     def approve(self, request, pk=None):
         """
         Admin/Staff-only: Approve a pending loan and mark who approved it.
+        The status change is one conditional UPDATE, so of concurrent
+        approvals only one generates the schedule and raises the balance.
         """
         loan = self.get_object()
 
         if loan.status != 'pending':
             return Response({'detail': 'Loan already processed.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Record approval details
-        loan.status = 'approved'
-        loan.approved_on = timezone.now()
-        loan.approved_by = request.user  #record the approving admin/staff
-        loan.due_date = timezone.now().date().replace(year=timezone.now().year + 1)
-        loan.save()
-
-        # Update member’s total loan balance
-        loan.member.loan_balance += loan.amount
-        loan.member.save()
+        with transaction.atomic():
+            # Record approval details
+            approved_on = timezone.now()
+            due_date = loan_schedule.due_date(loan, timezone.localdate(approved_on))  # last installment
+            claimed = Loan.objects.filter(pk=loan.pk, status='pending').update(
+                status='approved', approved_on=approved_on, approved_by=request.user, due_date=due_date,
+            )
+            if not claimed:
+                return Response({'detail': 'Loan already processed.'}, status=status.HTTP_400_BAD_REQUEST)
+            loan.status, loan.approved_on, loan.approved_by, loan.due_date = (
+                'approved', approved_on, request.user, due_date
+            )
+            row_updated.send(sender=Loan, instance=loan,
+                             update_fields=['status', 'approved_on', 'approved_by', 'due_date'])
+            loan_schedule.generate([loan])
+            # The member's loan balance is raised, and the principal posted to
+            # the ledger, after commit (apps/loans/signals.py)
+            publish_approval(loan)
 
         return Response({'detail': f'Loan #{loan.id} approved successfully by {request.user.username}.'},
                         status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=['get'])
+    def schedule(self, request, pk=None):
+        """
+        The loan's repayment schedule. Loans not approved yet get a preview
+        counted from today, which is not stored.
+        """
+        loan = self.get_object()
+        installments = list(loan.installments.all())
+        preview = not installments
+        if preview:
+            installments = loan_schedule.compute([loan])[0]
+        data = LoanInstallmentSerializer(installments, many=True).data
+        return Response({
+            'loan': loan.pk,
+            'interest_method': loan.interest_method,
+            'preview': preview,
+            'total_principal': sum((i.principal for i in installments), 0),
+            'total_interest': sum((i.interest for i in installments), 0),
+            'total_amount': sum((i.amount for i in installments), 0),
+            'installments': data,
+        }, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
     def reject(self, request, pk=None):
         """
@@ -90,45 +131,40 @@ class LoanViewSet(viewsets.ModelViewSet):
                         status=status.HTTP_200_OK)
 
 
-class LoanRepaymentViewSet(viewsets.ModelViewSet):
+class LoanRepaymentViewSet(IdempotentCreateMixin, ExportMixin, viewsets.ModelViewSet):
     """
-    Handles recording and viewing of loan repayments.
+    Handles recording (with Idempotency-Key support), viewing and bulk export of loan repayments.
     """
-    queryset = LoanRepayment.objects.all().order_by('-date')
+    # Object permissions read loan.member
+    queryset = LoanRepayment.objects.select_related('loan__member').order_by('-date')
     serializer_class = LoanRepaymentSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrOwner]
+    export_kind = "repayments"
 
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
-            return LoanRepayment.objects.all().order_by('-date')
+            return self.queryset
         try:
             member = Member.objects.get(user=user)
-            return LoanRepayment.objects.filter(loan__member=member).order_by('-date')
+            return self.queryset.filter(loan__member=member)
         except Member.DoesNotExist:
             return LoanRepayment.objects.none()
 
     def perform_create(self, serializer):
-        repayment = serializer.save()
-        loan = repayment.loan
+        loan = serializer.validated_data['loan']
 
         # only owner can repay their own loan
-        if loan.member.user != self.request.user:
-            raise PermissionError("You can only repay your own loan.")
+        if loan.member.user_id != self.request.user.pk:
+            raise PermissionDenied("You can only repay your own loan.")
 
         # only approved loans can be repaid
         if loan.status != 'approved':
-            raise ValueError("You can only repay approved loans.")
-
-        # Deduct repayment amount from balance
-        loan.balance -= repayment.amount
-        if loan.balance <= 0:
-            loan.balance = 0
-            loan.status = 'completed'
-
-        loan.save()
-
-        # Update member loan balance too
-        member = loan.member
-        member.loan_balance = max(member.loan_balance - repayment.amount, 0)
-        member.save()
+            raise ValidationError({'loan': "You can only repay approved loans."})
+
+        with transaction.atomic():
+            # The loan and member balances are reduced after commit, and the loan
+            # closed once paid off (apps/loans/signals.py)
+            repayment = serializer.save()
+            ledger.post(loan.member_id, 'loan', -repayment.amount, 'repayment', repayment.pk, repayment.date,
+                        floor=0)
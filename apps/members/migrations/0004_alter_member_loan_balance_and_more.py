@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0003_member_loan_balance_member_savings_balance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='member',
+            name='loan_balance',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='member',
+            name='savings_balance',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0.0, max_digits=12),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0004_alter_member_loan_balance_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['-joined_on', '-id'], name='member_joined_idx'),
+        ),
+    ]
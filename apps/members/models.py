@@ -15,8 +15,15 @@ class Member(models.Model):
     date_of_birth = models.DateField(blank=True, null=True)
     joined_on = models.DateTimeField(auto_now_add=True)
 
-    savings_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
-    loan_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    # Indexed for the all-time top savers/borrowers leaderboards
+    savings_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00, db_index=True)
+    loan_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Member list, newest first
+            models.Index(fields=['-joined_on', '-id'], name='member_joined_idx'),
+        ]
 
     def __str__(self):
         return f"Member Profile: {self.user.username}"
@@ -0,0 +1,153 @@
+"""
+One chronological statement of a member's deposits, withdrawals, loan
+disbursements and repayments.
+
+The four sources are merged in the database with UNION ALL and ordered by
+(occurred_at, kind, id). Pages are keyset-paginated on that key: each
+branch only reads rows after the cursor, so a deep page costs the same as
+the first. Where the database allows it, every branch is also ordered and
+limited to the page size, so each one is a bounded index range scan.
+"""
+from django.apps import apps
+from django.db import connections, router
+from django.db.models import CharField, F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+
+from apps.core import exports
+from apps.core.dates import datetime_range_filter
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# kind -> model, member path, timestamp, account, sign, extra filters, status
+SOURCES = {
+    "deposit": {
+        "model": "savings.Deposit",
+        "member": "member_id",
+        "timestamp": F("created_at"),
+        "account": "savings",
+        "sign": 1,
+        "filters": {},
+        "status": F("status"),
+    },
+    "loan": {
+        "model": "loans.Loan",
+        "member": "member_id",
+        "timestamp": Coalesce("approved_on", "requested_on"),
+        "account": "loan",
+        "sign": 1,
+        "filters": {"status__in": ("approved", "completed")},
+        "status": F("status"),
+    },
+    "repayment": {
+        "model": "loans.LoanRepayment",
+        "member": "loan__member_id",
+        "timestamp": F("date"),
+        "account": "loan",
+        "sign": -1,
+        "filters": {},
+        "status": Value("completed", output_field=CharField()),
+    },
+    "withdrawal": {
+        "model": "savings.Withdrawal",
+        "member": "member_id",
+        "timestamp": F("created_at"),
+        "account": "savings",
+        "sign": -1,
+        "filters": {},
+        "status": F("status"),
+    },
+}
+ORDERING = ("occurred_at", "kind", "id")
+COLUMNS = ("occurred_at", "kind", "id", "amount", "entry_status")
+STATUSES = ("pending", "approved", "rejected", "completed")
+
+
+def parse_filters(params):
+    """
+    Read ?from=&to= (inclusive dates) and ?status= for a statement. ?member=
+    is refused rather than ignored: the member is the one in the URL.
+    Raises ValueError on malformed input.
+    """
+    if params.get("member"):
+        raise ValueError("'member' cannot be filtered on: the statement is of the member in the URL.")
+    filters = exports.parse_filters(params)
+    if filters.get("status") and filters["status"] not in STATUSES:
+        raise ValueError(f"'status' must be one of: {', '.join(STATUSES)}.")
+    return filters
+
+
+def parse_key(key):
+    """Validate a decoded cursor as (occurred_at, kind, id). Raises ValueError."""
+    if len(key) != 3:
+        raise ValueError("Invalid cursor.")
+    occurred_at, kind, pk = key
+    moment = parse_datetime(occurred_at) if isinstance(occurred_at, str) else None
+    if moment is None or kind not in SOURCES or not isinstance(pk, int):
+        raise ValueError("Invalid cursor.")
+    return moment, kind, pk
+
+
+def _after(kind, after):
+    """Keyset predicate for one branch: rows sorting after `after`."""
+    moment, after_kind, after_pk = after
+    if kind < after_kind:
+        return Q(occurred_at__gt=moment)
+    if kind > after_kind:
+        return Q(occurred_at__gte=moment)
+    return Q(occurred_at__gt=moment) | Q(occurred_at=moment, id__gt=after_pk)
+
+
+def _branch(kind, member_id, start, end, after, limit, status=None):
+    spec = SOURCES[kind]
+    queryset = (
+        apps.get_model(spec["model"]).objects
+        .filter(**{spec["member"]: member_id}, **spec["filters"])
+        .annotate(
+            occurred_at=spec["timestamp"],
+            kind=Value(kind, output_field=CharField()),
+            entry_status=spec["status"],
+        )
+        .filter(**datetime_range_filter("occurred_at", start, end))
+    )
+    if status:
+        queryset = queryset.filter(entry_status=status)
+    if after:
+        queryset = queryset.filter(_after(kind, after))
+    queryset = queryset.values_list(*COLUMNS)
+    if limit:
+        queryset = queryset.order_by(*ORDERING)[:limit]
+    else:
+        queryset = queryset.order_by()
+    return queryset
+
+
+def page(member_id, start=None, end=None, after=None, size=DEFAULT_PAGE_SIZE, status=None):
+    """
+    Return (entries, next_key) for one page of the member's statement,
+    optionally only the entries with `status`.
+    `after` is the (occurred_at, kind, id) key of the last entry already seen;
+    `next_key` is None on the last page.
+    """
+    db = router.db_for_read(apps.get_model("savings", "Deposit"))
+    per_branch = size + 1 if connections[db].features.supports_slicing_ordering_in_compound else None
+    first, *rest = [_branch(kind, member_id, start, end, after, per_branch, status) for kind in SOURCES]
+    rows = list(first.union(*rest, all=True).order_by(*ORDERING)[:size + 1])
+
+    entries = [
+        {
+            "occurred_at": occurred_at,
+            "type": kind,
+            "id": pk,
+            "account": SOURCES[kind]["account"],
+            "amount": SOURCES[kind]["sign"] * amount,
+            "status": status,
+        }
+        for occurred_at, kind, pk, amount, status in rows[:size]
+    ]
+    next_key = None
+    if len(rows) > size:
+        last = entries[-1]
+        next_key = (last["occurred_at"], last["type"], last["id"])
+    return entries, next_key
@@ -1,3 +1,90 @@
-from django.test import TestCase
+from datetime import date, datetime
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.loans.models import Loan, LoanRepayment
+from apps.savings.models import Deposit, Withdrawal
+
+from .models import Member
+
+User = get_user_model()
+
+
+def moment(day, hour=12):
+    return timezone.make_aware(datetime(day.year, day.month, day.day, hour))
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False, OUTBOX_DISPATCH="worker")
+class StatementTests(TestCase):
+    """A member's statement: merged order, paging and filters."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [
+            User.objects.create_user(username=name, email=f"{name}@example.com", password="x", role="member")
+            for name in ("member", "other")
+        ]
+        cls.user, cls.other = users
+        cls.member = Member.objects.get(user=cls.user)
+        rows = [
+            (Deposit.objects.create(member=cls.member, amount=Decimal("100.00")), "approved", date(2025, 1, 1)),
+            (Deposit.objects.create(member=cls.member, amount=Decimal("20.00")), "pending", date(2025, 1, 3)),
+            (Withdrawal.objects.create(member=cls.member, amount=Decimal("30.00")), "rejected", date(2025, 1, 2)),
+        ]
+        for row, row_status, day in rows:
+            type(row).objects.filter(pk=row.pk).update(status=row_status, created_at=moment(day))
+        cls.deposit, cls.pending, cls.withdrawal = (row for row, _, _ in rows)
+        cls.loan = Loan.objects.create(member=cls.member, amount=Decimal("500.00"), status="approved",
+                                       requested_on=moment(date(2025, 1, 4)), approved_on=moment(date(2025, 1, 5)))
+        cls.repayment = LoanRepayment.objects.create(loan=cls.loan, amount=Decimal("50.00"),
+                                                     date=moment(date(2025, 1, 6)))
+        # Another member's activity never shows
+        Deposit.objects.create(member=Member.objects.get(user=cls.other), amount=Decimal("1.00"))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/members/{self.member.pk}/statement/"
+
+    def entries(self, query=""):
+        response = self.client.get(f"{self.url}?{query}")
+        self.assertEqual(response.status_code, 200)
+        return [(entry["type"], entry["id"], entry["amount"], entry["status"]) for entry in response.data["results"]]
+
+    def test_entries_are_merged_and_paged_in_order(self):
+        expected = [
+            ("deposit", self.deposit.pk, Decimal("100.00"), "approved"),
+            ("withdrawal", self.withdrawal.pk, Decimal("-30.00"), "rejected"),
+            ("deposit", self.pending.pk, Decimal("20.00"), "pending"),
+            ("loan", self.loan.pk, Decimal("500.00"), "approved"),
+            ("repayment", self.repayment.pk, Decimal("-50.00"), "completed"),
+        ]
+        self.assertEqual(self.entries(), expected)
+
+        pages, url = [], f"{self.url}?page_size=2"
+        while url:
+            response = self.client.get(url)
+            pages.append([(entry["type"], entry["id"]) for entry in response.data["results"]])
+            url = response.data["next"]
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual([entry for page in pages for entry in page], [row[:2] for row in expected])
+
+    def test_date_and_status_filters(self):
+        self.assertEqual([row[1] for row in self.entries("from=2025-01-02&to=2025-01-03")],
+                         [self.withdrawal.pk, self.pending.pk])
+        self.assertEqual(self.entries("status=pending"), [("deposit", self.pending.pk, Decimal("20.00"), "pending")])
+        self.assertEqual([row[0] for row in self.entries("status=approved")], ["deposit", "loan"])
+        self.assertEqual([row[0] for row in self.entries("status=completed")], ["repayment"])
+
+    def test_unsupported_filters_are_rejected(self):
+        for query in (f"member={self.member.pk}", "status=done", "from=2025-02-01&to=2025-01-01", "cursor=abc",
+                      "page_size=0"):
+            self.assertEqual(self.client.get(f"{self.url}?{query}").status_code, 400, query)
+
+    def test_members_only_see_their_own_statement(self):
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import MemberListView, MemberDetailView, MyProfileView
+from .views import MemberListView, MemberDetailView, MyProfileView, MemberStatementView
 
 urlpatterns = [
     path('', MemberListView.as_view(), name='member-list'),
     path('<int:pk>/', MemberDetailView.as_view(), name='member-detail'),
+    path('<int:pk>/statement/', MemberStatementView.as_view(), name='member-statement'),
     path('me/', MyProfileView.as_view(), name='member-profile'),
 ]
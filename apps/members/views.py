@@ -1,17 +1,25 @@
-from rest_framework import generics, permissions
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+
+from apps.core.pagination import decode_cursor, encode_cursor, page_size
+from . import statement
 from .models import Member
 from .serializers import MemberSerializer
 from .permissions import IsAdminOrStaff
 
 # --- Admin/Staff: View all members ---
 class MemberListView(generics.ListAPIView):
-    queryset = Member.objects.all()
+    queryset = Member.objects.select_related('user').order_by('-joined_on')
     serializer_class = MemberSerializer
     permission_classes = [IsAdminOrStaff]
 
 # --- Admin/Staff: View individual member details ---
 class MemberDetailView(generics.RetrieveAPIView):
-    queryset = Member.objects.all()
+    queryset = Member.objects.select_related('user')
     serializer_class = MemberSerializer
     permission_classes = [IsAdminOrStaff]
 
@@ -22,3 +30,33 @@ class MyProfileView(generics.RetrieveAPIView):
 
     def get_object(self):
         return self.request.user.member_profile
+
+# --- Admin/Staff or the member: Chronological statement ---
+class MemberStatementView(APIView):
+    """
+    Deposits, withdrawals, loan disbursements and repayments in one
+    chronological list, oldest first.
+    Query params: ?from=&to= (inclusive dates), ?status=, ?page_size=, ?cursor=
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        member = get_object_or_404(Member.objects.only("id", "user_id"), pk=pk)
+        if request.user.role not in ("admin", "staff") and member.user_id != request.user.pk:
+            raise PermissionDenied("You can only view your own statement.")
+
+        try:
+            filters = statement.parse_filters(request.query_params)
+            size = page_size(request.query_params, statement.DEFAULT_PAGE_SIZE, statement.MAX_PAGE_SIZE)
+            cursor = request.query_params.get("cursor")
+            after = statement.parse_key(decode_cursor(cursor)) if cursor else None
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        entries, next_key = statement.page(
+            member.pk, filters.get("from"), filters.get("to"), after=after, size=size, status=filters.get("status"),
+        )
+        next_url = None
+        if next_key:
+            next_url = replace_query_param(request.build_absolute_uri(), "cursor", encode_cursor(next_key))
+        return Response({"member": member.pk, "next": next_url, "results": entries})
@@ -0,0 +1,161 @@
+"""
+Member savings balances for the admin balances screen.
+
+- member_balances() is the filtered, sorted queryset the screen pages
+  through with cursor pagination
+- distribution() computes SACCO-wide totals, percentiles and a band
+  histogram in the database: one aggregate query, plus one ROW_NUMBER()
+  query picking every percentile's row in a single pass over the
+  savings_balance index
+- snapshot() serves the last stored distribution(). Once it is older
+  than SNAPSHOT_TTL the savings.refresh_balance_distribution job
+  recomputes it, while reads keep getting the stored copy. Only a cold
+  cache computes inline, so a busy SACCO's writes never make the screen
+  re-run the aggregates
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Max, Min, Q, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apps.core import jobs
+from apps.core.cache import KEY_PREFIX
+from apps.core.dates import datetime_range_filter
+from apps.members.models import Member
+
+# name -> [low, high) savings balance; None is unbounded
+BANDS = {
+    "under_1k": (None, Decimal("1000")),
+    "1k_10k": (Decimal("1000"), Decimal("10000")),
+    "10k_50k": (Decimal("10000"), Decimal("50000")),
+    "50k_100k": (Decimal("50000"), Decimal("100000")),
+    "100k_plus": (Decimal("100000"), None),
+}
+PERCENTILES = (25, 50, 75, 90, 99)
+ORDERINGS = ("-savings_balance", "savings_balance", "-joined_on", "joined_on")
+SNAPSHOT_KEY = f"{KEY_PREFIX}:balance-distribution"
+# Age in seconds after which a snapshot read queues a refresh
+SNAPSHOT_TTL = 300
+REFRESH_TASK = "savings.refresh_balance_distribution"
+CENTS = Decimal("0.01")
+
+
+def _money(value):
+    return Decimal(value or 0).quantize(CENTS)
+
+
+def _band_q(band):
+    low, high = BANDS[band]
+    q = Q()
+    if low is not None:
+        q &= Q(savings_balance__gte=low)
+    if high is not None:
+        q &= Q(savings_balance__lt=high)
+    return q
+
+
+def parse_params(params):
+    """
+    Read ?band=, ?min_balance=, ?max_balance=, ?joined_from=, ?joined_to=
+    and ?ordering= from query params. Raises ValueError on malformed input.
+    """
+    parsed = {"ordering": params.get("ordering", "-savings_balance")}
+    if parsed["ordering"] not in ORDERINGS:
+        raise ValueError(f"ordering must be one of: {', '.join(ORDERINGS)}.")
+    band = params.get("band")
+    if band:
+        if band not in BANDS:
+            raise ValueError(f"band must be one of: {', '.join(BANDS)}.")
+        parsed["band"] = band
+    for name in ("min_balance", "max_balance"):
+        if params.get(name):
+            try:
+                parsed[name] = Decimal(params[name])
+            except ArithmeticError:
+                raise ValueError(f"'{name}' must be a number.")
+    for name in ("joined_from", "joined_to"):
+        if params.get(name):
+            parsed[name] = parse_date(params[name])
+            if parsed[name] is None:
+                raise ValueError(f"'{name}' must be a date in YYYY-MM-DD format.")
+    return parsed
+
+
+def member_balances(filters):
+    """Members matching the parsed filters, in the requested order."""
+    queryset = Member.objects.select_related("user").only(
+        "id", "joined_on", "savings_balance", "loan_balance", "user__username",
+    )
+    if filters.get("band"):
+        queryset = queryset.filter(_band_q(filters["band"]))
+    if "min_balance" in filters:
+        queryset = queryset.filter(savings_balance__gte=filters["min_balance"])
+    if "max_balance" in filters:
+        queryset = queryset.filter(savings_balance__lte=filters["max_balance"])
+    queryset = queryset.filter(
+        **datetime_range_filter("joined_on", filters.get("joined_from"), filters.get("joined_to"))
+    )
+    return queryset.order_by(filters["ordering"])
+
+
+def _percentiles(count):
+    """{p: nearest-rank percentile p of the savings balances}, in one query."""
+    ranks = {p: max(-(-p * count // 100), 1) for p in PERCENTILES}  # ceil(p/100 * n), 1-based
+    rows = (
+        Member.objects.annotate(rank=Window(RowNumber(), order_by=F("savings_balance").asc()))
+        .filter(rank__in=set(ranks.values()))
+        .values_list("rank", "savings_balance")
+    )
+    by_rank = dict(rows)
+    return {p: by_rank[rank] for p, rank in ranks.items()}
+
+
+def distribution():
+    """SACCO-wide savings balance totals, percentiles and band counts."""
+    figures = Member.objects.aggregate(
+        members=Count("id"),
+        total=Sum("savings_balance"),
+        average=Avg("savings_balance"),
+        minimum=Min("savings_balance"),
+        maximum=Max("savings_balance"),
+        total_loans=Sum("loan_balance"),
+        **{f"band_{name}": Count("id", filter=_band_q(name)) for name in BANDS},
+    )
+    count = figures["members"]
+    percentiles = _percentiles(count) if count else {}
+    return {
+        "members": count,
+        "total_savings": _money(figures["total"]),
+        "average_savings": _money(figures["average"]),
+        "min_savings": _money(figures["minimum"]),
+        "max_savings": _money(figures["maximum"]),
+        "total_loan_balance": _money(figures["total_loans"]),
+        "percentiles": {f"p{p}": _money(percentiles.get(p)) for p in PERCENTILES},
+        "bands": {name: figures[f"band_{name}"] for name in BANDS},
+        "computed_at": timezone.now(),
+    }
+
+
+def refresh_snapshot():
+    """Recompute distribution() and store it as the snapshot."""
+    data = distribution()
+    cache.set(SNAPSHOT_KEY, data, timeout=None)
+    return data
+
+
+def snapshot():
+    """
+    The stored distribution(), computed inline only on a cold cache. A
+    snapshot older than SNAPSHOT_TTL is still returned, and one refresh
+    job is queued per SNAPSHOT_TTL.
+    """
+    data = cache.get(SNAPSHOT_KEY)
+    if data is None:
+        return refresh_snapshot()
+    age = (timezone.now() - data["computed_at"]).total_seconds()
+    if age >= SNAPSHOT_TTL and cache.add(f"{SNAPSHOT_KEY}:queued", 1, timeout=SNAPSHOT_TTL):
+        jobs.enqueue(REFRESH_TASK)
+    return data
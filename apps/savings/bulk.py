@@ -0,0 +1,160 @@
+"""
+Bulk approval and rejection of pending deposits and withdrawals.
+
+IDs are processed in chunks, each in its own short transaction:
+- lock the chunk's rows (and, for withdrawals, their members' balances)
+- move every pending row to the new status with one conditional UPDATE
+- apply one aggregated balance change per member, batched in one executemany()
+- post the approved rows to the ledger with one insert
+- send rows_updated once so the rollup, leaderboards and cache follow
+
+Every ID gets a result: approved, rejected, not_found, already_processed
+or insufficient_funds. Large reviews can run as a background job
+(tasks.bulk_review).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core import ledger
+from apps.core.dates import datetime_range_filter
+from apps.core.exports import parse_filters
+from apps.core.signals import rows_updated
+from apps.core.updates import add_by_pk
+from apps.members.models import Member
+
+from .models import Withdrawal
+
+CHUNK_SIZE = 500
+MAX_ITEMS = 10000
+DECISIONS = ("approved", "rejected")
+
+
+def select_ids(model, data):
+    """
+    Read the IDs to process from a request body: either {"ids": [...]} or
+    {"filter": {"from", "to", "member"}} matching pending rows.
+    Returns (ids, more) where `more` says the filter matched over MAX_ITEMS.
+    Raises ValueError on malformed input.
+    """
+    if "ids" in data:
+        ids = data["ids"]
+        if not isinstance(ids, list) or not ids:
+            raise ValueError("'ids' must be a non-empty list.")
+        if len(ids) > MAX_ITEMS:
+            raise ValueError(f"At most {MAX_ITEMS} ids per request.")
+        try:
+            return [int(pk) for pk in ids], False
+        except (TypeError, ValueError):
+            raise ValueError("'ids' must contain integer ids.")
+
+    if "filter" in data:
+        if not isinstance(data["filter"], dict):
+            raise ValueError("'filter' must be an object.")
+        filters = parse_filters(data["filter"])
+        queryset = model.objects.filter(
+            status="pending", **datetime_range_filter("created_at", filters.get("from"), filters.get("to"))
+        )
+        if filters.get("member"):
+            queryset = queryset.filter(member_id=filters["member"])
+        ids = list(queryset.order_by("created_at", "id").values_list("id", flat=True)[:MAX_ITEMS + 1])
+        return ids[:MAX_ITEMS], len(ids) > MAX_ITEMS
+
+    raise ValueError("Provide 'ids' or 'filter'.")
+
+
+def _balance_deltas(model, rows, decision, results):
+    """
+    Return {member_id: change to savings_balance} for the rows being decided,
+    marking withdrawals the member cannot cover as insufficient_funds.
+    """
+    deltas = defaultdict(Decimal)
+    if decision != "approved":
+        return deltas
+    if model is not Withdrawal:
+        for row in rows:
+            deltas[row.member_id] += row.amount
+        return deltas
+
+    balances = dict(
+        Member.objects.select_for_update()
+        .filter(pk__in={row.member_id for row in rows})
+        .order_by("pk")
+        .values_list("pk", "savings_balance")
+    )
+    for row in rows:
+        if balances[row.member_id] + deltas[row.member_id] >= row.amount:
+            deltas[row.member_id] -= row.amount
+        else:
+            results[row.pk] = "insufficient_funds"
+    return deltas
+
+
+def _review_chunk(model, ids, decision, user):
+    results = {}
+    with transaction.atomic():
+        rows = model.objects.select_for_update().filter(pk__in=ids).order_by("pk")
+        found = {row.pk: row for row in rows}
+        pending = []
+        for pk in ids:
+            row = found.get(pk)
+            if row is None:
+                results[pk] = "not_found"
+            elif row.status != "pending":
+                results[pk] = "already_processed"
+            else:
+                pending.append(row)
+
+        deltas = _balance_deltas(model, pending, decision, results)
+        decided = [row for row in pending if row.pk not in results]
+        if not decided:
+            return results
+
+        now = timezone.now()
+        model.objects.filter(pk__in=[row.pk for row in decided], status="pending").update(
+            status=decision, approved_by=user, approved_on=now,
+        )
+        # One relative UPDATE per member, sent as a single batch
+        add_by_pk(
+            Member,
+            {member_id: {"savings_balance": amount} for member_id, amount in deltas.items() if amount},
+            ["savings_balance"],
+        )
+
+        if decision == "approved":
+            sign = -1 if model is Withdrawal else 1
+            ledger.post_many([
+                {"member_id": row.member_id, "account": "savings", "amount": sign * row.amount,
+                 "source_type": model._meta.model_name, "source_id": row.pk, "occurred_at": now}
+                for row in decided
+            ])
+
+        for row in decided:
+            row.status, row.approved_by, row.approved_on = decision, user, now
+            results[row.pk] = decision
+        rows_updated.send(sender=model, instances=decided, update_fields=["status", "approved_by", "approved_on"])
+    return results
+
+
+def review(model, ids, decision, user, chunk_size=CHUNK_SIZE):
+    """
+    Approve or reject the given deposit/withdrawal IDs.
+    Returns [{"id", "result"}] in the order the IDs were given.
+    """
+    if decision not in DECISIONS:
+        raise ValueError(f"decision must be one of: {', '.join(DECISIONS)}.")
+    ordered = sorted(set(ids))
+    results = {}
+    for start in range(0, len(ordered), chunk_size):
+        results.update(_review_chunk(model, ordered[start:start + chunk_size], decision, user))
+    return [{"id": pk, "result": results[pk]} for pk in dict.fromkeys(ids)]
+
+
+def summarize(results):
+    """{result: count} for the output of review()."""
+    summary = {}
+    for item in results:
+        summary[item["result"]] = summary.get(item["result"], 0) + 1
+    return summary
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0005_hot_path_indexes'),
+        ('savings', '0004_alter_deposit_options_alter_withdrawal_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['member', '-created_at', '-id'], name='deposit_member_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['-created_at', '-id'], name='deposit_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='deposit_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawal',
+            index=models.Index(fields=['member', '-created_at', '-id'], name='withdrawal_member_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawal',
+            index=models.Index(fields=['-created_at', '-id'], name='withdrawal_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawal',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='withdrawal_status_created_idx'),
+        ),
+    ]
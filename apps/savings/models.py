@@ -33,6 +33,13 @@ class Deposit(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A member's history and the admin list, newest first (id breaks ties)
+            models.Index(fields=['member', '-created_at', '-id'], name='deposit_member_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='deposit_created_idx'),
+            # Approval queues and status + date range reports
+            models.Index(fields=['status', 'created_at', 'id'], name='deposit_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"Deposit {self.amount} by {self.member.user.username} ({self.status})"
@@ -68,6 +75,13 @@ class Withdrawal(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A member's history and the admin list, newest first (id breaks ties)
+            models.Index(fields=['member', '-created_at', '-id'], name='withdrawal_member_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='withdrawal_created_idx'),
+            # Approval queues and status + date range reports
+            models.Index(fields=['status', 'created_at', 'id'], name='withdrawal_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"Withdrawal {self.amount} by {self.member.user.username} ({self.status})"
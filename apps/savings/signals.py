@@ -1,34 +1,98 @@
-# apps/savings/signals.py
+"""
+Savings balance side effects.
+
+Deposits and withdrawals normally start pending and move the balance when
+staff approve them (the approve actions and bulk review). Only one created
+already approved records an outbox event here; the balance change and its
+ledger entry are then applied after commit by the handlers below, one
+UPDATE per member and one ledger insert for a whole batch of events.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from .models import Deposit, Withdrawal
+from django.utils.dateparse import parse_datetime
+
+from apps.core import ledger, outbox
+from apps.core.updates import add_by_pk
 from apps.members.models import Member
+from .models import Deposit, Withdrawal
+
+logger = logging.getLogger(__name__)
+
 
 @receiver(post_save, sender=Deposit)
 def update_balance_after_deposit(sender, instance, created, **kwargs):
     """
-    When a deposit is created, add the deposited amount
+    When a deposit is created already approved, add the deposited amount
     to the member's savings balance.
     """
-    if created:
-        member = instance.member
-        member.savings_balance += instance.amount
-        member.save()
+    if created and instance.status == "approved":
+        outbox.publish(
+            "savings.deposit_created",
+            deposit_id=instance.pk, member_id=instance.member_id, amount=instance.amount,
+            occurred_at=instance.approved_on or instance.created_at,
+        )
+
 
 @receiver(post_save, sender=Withdrawal)
 def update_balance_after_withdrawal(sender, instance, created, **kwargs):
     """
-    When a withdrawal is created, deduct the withdrawn amount
-    from the member's savings balance (if sufficient balance exists).
+    When a withdrawal is created already approved, deduct the withdrawn
+    amount from the member's savings balance (if sufficient balance exists).
     """
-    if created:
-        member = instance.member
+    if created and instance.status == "approved":
+        outbox.publish(
+            "savings.withdrawal_created",
+            withdrawal_id=instance.pk, member_id=instance.member_id, amount=instance.amount,
+            occurred_at=instance.approved_on or instance.created_at,
+        )
+
+
+def _movement(payload, amount, source_type, source_key):
+    """The ledger.post_many() movement for one event's payload."""
+    occurred_at = payload.get("occurred_at")
+    return {
+        "member_id": payload["member_id"], "account": "savings", "amount": amount,
+        "source_type": source_type, "source_id": payload[source_key],
+        "occurred_at": parse_datetime(occurred_at) if occurred_at else None,
+    }
+
+
+@outbox.handler("savings.deposit_created")
+def credit_deposits(payloads):
+    totals = defaultdict(Decimal)
+    for payload in payloads:
+        totals[payload["member_id"]] += Decimal(payload["amount"])
+    add_by_pk(Member, {pk: {"savings_balance": total} for pk, total in totals.items()}, ["savings_balance"])
+    ledger.post_many([_movement(payload, Decimal(payload["amount"]), "deposit", "deposit_id") for payload in payloads])
+
 
+@outbox.handler("savings.withdrawal_created")
+def debit_withdrawals(payloads):
+    # Each debit depends on the balance left by the previous one: lock the
+    # members, replay the withdrawals in order, then write the net per member
+    member_ids = {payload["member_id"] for payload in payloads}
+    balances = dict(
+        Member.objects.select_for_update().filter(pk__in=member_ids).order_by("pk")
+        .values_list("pk", "savings_balance")
+    )
+    debits, movements = defaultdict(Decimal), []
+    for payload in payloads:
+        member_id, amount = payload["member_id"], Decimal(payload["amount"])
+        if member_id not in balances:
+            continue
         # Only deduct if the balance is sufficient
-        if member.savings_balance >= instance.amount:
-            member.savings_balance -= instance.amount
-            member.save()
+        if balances[member_id] >= amount:
+            balances[member_id] -= amount
+            debits[member_id] -= amount
+            movements.append(_movement(payload, -amount, "withdrawal", "withdrawal_id"))
         else:
-            # Optional: handle insufficient funds
-            # (In production you might raise a validation error instead)
-            print(f"Insufficient funds for member {member.user.username}. Withdrawal not processed properly.")
+            logger.warning(
+                "Insufficient funds for member %s; withdrawal %s not debited.",
+                member_id, payload["withdrawal_id"],
+            )
+    add_by_pk(Member, {pk: {"savings_balance": total} for pk, total in debits.items()}, ["savings_balance"])
+    ledger.post_many(movements)
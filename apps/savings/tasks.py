@@ -0,0 +1,26 @@
+"""Background tasks for savings (run by `manage.py runworker`)."""
+from django.apps import apps
+from django.contrib.auth import get_user_model
+
+from apps.core.jobs import task
+
+from . import balances, bulk
+
+
+@task("savings.bulk_review", priority=10, max_attempts=3)
+def bulk_review(model, ids, decision, user_id, more=False):
+    """
+    bulk.review() for a bulk_approve/bulk_reject request sent with
+    "background": true. Safe to repeat: rows a previous attempt decided are
+    reported as already_processed.
+    """
+    user = get_user_model().objects.filter(pk=user_id).first()
+    results = bulk.review(apps.get_model("savings", model), ids, decision, user)
+    return {"summary": bulk.summarize(results), "more": more, "results": results}
+
+
+@task(balances.REFRESH_TASK, priority=-5)
+def refresh_balance_distribution():
+    """Recompute the admin balances screen's distribution snapshot."""
+    data = balances.refresh_snapshot()
+    return {"members": data["members"], "computed_at": data["computed_at"].isoformat()}
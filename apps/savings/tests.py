@@ -1,3 +1,318 @@
-from django.test import TestCase
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.analytics import rollup
+from apps.core.dates import day_start
+from apps.core.models import Job, LedgerEntry
+from apps.core.testing import ListQueryCountMixin
+from apps.members.models import Member
+
+from . import balances, bulk, tasks
+from .models import Deposit, Withdrawal
+
+User = get_user_model()
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False, OUTBOX_DISPATCH="sync")
+class ConcurrentApprovalTests(TransactionTestCase):
+    """
+    Many staff approving at once must not lose balance updates, process a
+    transaction twice, or overdraw a member.
+    """
+    threads = 8
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("needs a database that supports concurrent connections")
+        self.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        user = User.objects.create_user(username="member", email="member@example.com", password="x", role="member")
+        self.member = Member.objects.get(user=user)
+
+    def set_balance(self, amount):
+        Member.objects.filter(pk=self.member.pk).update(savings_balance=amount)
+
+    def balance(self):
+        return Member.objects.get(pk=self.member.pk).savings_balance
+
+    def approve_all(self, urls):
+        """POST every url from a pool of threads released together; return the status codes."""
+        barrier = threading.Barrier(self.threads)
+
+        def worker(batch):
+            client = APIClient()
+            client.force_authenticate(self.admin)
+            barrier.wait()
+            try:
+                return [client.post(url).status_code for url in batch]
+            finally:
+                connection.close()
+
+        batches = [urls[i::self.threads] for i in range(self.threads)]
+        with ThreadPoolExecutor(self.threads) as pool:
+            return [code for codes in pool.map(worker, batches) for code in codes]
+
+    def test_concurrent_deposit_approvals_credit_every_deposit_once(self):
+        deposits = [Deposit.objects.create(member_id=self.member.pk, amount=Decimal("100.00")) for _ in range(40)]
+
+        # Every deposit is approved by two threads at once
+        urls = [f"/api/savings/deposits/{d.pk}/approve/" for d in deposits] * 2
+        codes = self.approve_all(urls)
+
+        self.assertEqual(codes.count(200), 40)
+        self.assertEqual(codes.count(400), 40)
+        self.assertEqual(self.balance(), Decimal("4000.00"))
+        self.assertFalse(Deposit.objects.exclude(status="approved").exists())
+        summary = rollup.summarize()
+        self.assertEqual(summary[("deposit", "approved")]["count"], 40)
+        self.assertEqual(summary[("deposit", "pending")]["count"], 0)
+
+    def test_concurrent_withdrawal_approvals_never_overdraw(self):
+        withdrawals = [Withdrawal.objects.create(member_id=self.member.pk, amount=Decimal("100.00")) for _ in range(40)]
+        self.set_balance(Decimal("2500.00"))
+
+        codes = self.approve_all([f"/api/savings/withdrawals/{w.pk}/approve/" for w in withdrawals])
+
+        self.assertEqual(codes.count(200), 25)
+        self.assertEqual(codes.count(400), 15)
+        self.assertEqual(self.balance(), Decimal("0.00"))
+        self.assertEqual(Withdrawal.objects.filter(status="approved").count(), 25)
+        self.assertEqual(Withdrawal.objects.filter(status="pending").count(), 15)
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False)
+class ListQueryCountTests(ListQueryCountMixin, TestCase):
+    """List and detail endpoints must not run a query per row."""
+
+    def add_rows(self, model, n):
+        """n approved rows spread over every member."""
+        model.objects.bulk_create([
+            model(member=self.members[i % len(self.members)], amount=Decimal("10.00"),
+                  status="approved", approved_by=self.admin, approved_on=timezone.now())
+            for i in range(n)
+        ])
+
+    def test_deposit_list_queries_are_flat(self):
+        self.assert_flat(Deposit, "/api/savings/deposits/")
+
+    def test_withdrawal_list_queries_are_flat(self):
+        self.assert_flat(Withdrawal, "/api/savings/withdrawals/")
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False)
+class BalanceScreenTests(TestCase):
+    """Filters, paging and the distribution snapshot of the admin balances screen."""
+
+    BALANCES = ("500.00", "900.00", "1000.00", "5000.00", "20000.00", "60000.00", "150000.00")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        for i, balance in enumerate(cls.BALANCES):
+            user = User.objects.create_user(
+                username=f"member{i}", email=f"member{i}@example.com", password="x", role="member",
+            )
+            Member.objects.filter(user=user).update(
+                savings_balance=Decimal(balance), joined_on=day_start(date(2025, 1, 1) + timedelta(days=i)),
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def balances(self, query):
+        response = self.client.get(f"/api/savings/balance/?{query}")
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row["savings_balance"] for row in response.data["results"]], response.data
+
+    def test_distribution_percentiles_and_bands(self):
+        with self.assertNumQueries(2):
+            data = balances.distribution()
+
+        self.assertEqual(data["members"], 7)
+        self.assertEqual(data["total_savings"], Decimal("237400.00"))
+        # Nearest rank: p25 is the 2nd of 7, p50 the 4th, p75 the 6th, p90 and p99 the 7th
+        self.assertEqual(data["percentiles"], {
+            "p25": Decimal("900.00"), "p50": Decimal("5000.00"), "p75": Decimal("60000.00"),
+            "p90": Decimal("150000.00"), "p99": Decimal("150000.00"),
+        })
+        self.assertEqual(data["bands"], {"under_1k": 2, "1k_10k": 2, "10k_50k": 1, "50k_100k": 1, "100k_plus": 1})
+
+    def test_filters(self):
+        self.assertEqual(self.balances("band=1k_10k")[0], [Decimal("5000.00"), Decimal("1000.00")])
+        self.assertEqual(self.balances("min_balance=900&max_balance=20000&ordering=savings_balance")[0],
+                         [Decimal("900.00"), Decimal("1000.00"), Decimal("5000.00"), Decimal("20000.00")])
+        self.assertEqual(self.balances("joined_from=2025-01-06&ordering=joined_on")[0],
+                         [Decimal("60000.00"), Decimal("150000.00")])
+        for query in ("band=huge", "min_balance=lots", "joined_to=2025-13-01", "ordering=username"):
+            self.assertEqual(self.client.get(f"/api/savings/balance/?{query}").status_code, 400, query)
+
+    def test_cursor_pages_cover_every_member_once(self):
+        seen, url = [], "/api/savings/balance/?page_size=3&ordering=-savings_balance"
+        while url:
+            response = self.client.get(url)
+            seen += [row["savings_balance"] for row in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(seen, sorted((Decimal(b) for b in self.BALANCES), reverse=True))
+
+    def test_stale_snapshot_is_served_while_a_job_refreshes_it(self):
+        self.assertEqual(self.balances("")[1]["summary"]["members"], 7)
+        Member.objects.filter(savings_balance=Decimal("500.00")).update(savings_balance=Decimal("700.00"))
+        # Writes alone do not recompute it
+        self.assertEqual(balances.snapshot()["total_savings"], Decimal("237400.00"))
+        self.assertFalse(Job.objects.exists())
+
+        old = dict(balances.snapshot(), computed_at=balances.snapshot()["computed_at"] - timedelta(minutes=10))
+        cache.set(balances.SNAPSHOT_KEY, old)
+        self.assertEqual(balances.snapshot()["total_savings"], Decimal("237400.00"))
+        self.assertEqual(balances.snapshot()["total_savings"], Decimal("237400.00"))
+        self.assertEqual(Job.objects.filter(name=balances.REFRESH_TASK).count(), 1)
+
+        tasks.refresh_balance_distribution()
+        self.assertEqual(balances.snapshot()["total_savings"], Decimal("237600.00"))
+
+
+class IdempotentPostMixin:
+    """A member POSTing deposits with an Idempotency-Key."""
+
+    def create_member(self):
+        user = User.objects.create_user(username="member", email="member@example.com", password="x", role="member")
+        self.member = Member.objects.get(user=user)
+
+    def post(self, key, amount="250.00"):
+        client = APIClient()
+        client.force_authenticate(self.member.user)
+        return client.post("/api/savings/deposits/", {"amount": amount}, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False, OUTBOX_DISPATCH="sync")
+class IdempotentDepositTests(IdempotentPostMixin, TransactionTestCase):
+    """Retried deposit POSTs with one Idempotency-Key create one deposit."""
+    threads = 8
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("needs a database that supports concurrent connections")
+        self.create_member()
+
+    def test_concurrent_retries_create_one_deposit(self):
+        barrier = threading.Barrier(self.threads)
+
+        def worker(_):
+            barrier.wait()
+            try:
+                response = self.post("retry-1")
+                return response.status_code, response.data["id"], response.get("Idempotent-Replayed")
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.threads) as pool:
+            results = list(pool.map(worker, range(self.threads)))
+
+        self.assertEqual({code for code, _, _ in results}, {201})
+        self.assertEqual(len({pk for _, pk, _ in results}), 1)
+        self.assertEqual(sum(1 for _, _, replayed in results if replayed), self.threads - 1)
+        self.assertEqual(Deposit.objects.count(), 1)
+        # Pending until approved: creating it moves no balance
+        self.assertEqual(Member.objects.get(pk=self.member.pk).savings_balance, Decimal("0.00"))
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False)
+class IdempotencyKeyReuseTests(IdempotentPostMixin, TestCase):
+    """A key is bound to the request it was first used with."""
+
+    def setUp(self):
+        self.create_member()
+
+    def test_key_reused_for_a_different_request_is_rejected(self):
+        self.assertEqual(self.post("retry-2").status_code, 201)
+        self.assertEqual(self.post("retry-2", amount="999.00").status_code, 422)
+        self.assertEqual(self.post("retry-3").status_code, 201)
+        self.assertEqual(Deposit.objects.count(), 2)
+
+
+@override_settings(REQUEST_TIMING_ENABLED=False, OUTBOX_DISPATCH="worker")
+class BulkReviewTests(TestCase):
+    """Every ID gets a result, and balances move by exactly the approved amounts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="x", role="admin", is_staff=True,
+        )
+        cls.saver, cls.other = (
+            Member.objects.get(user=User.objects.create_user(
+                username=name, email=f"{name}@example.com", password="x", role="member"))
+            for name in ("saver", "other")
+        )
+        Member.objects.filter(pk=cls.saver.pk).update(savings_balance=Decimal("100.00"))
+        Member.objects.filter(pk=cls.other.pk).update(savings_balance=Decimal("500.00"))
+
+    def balance(self, member):
+        return Member.objects.values_list("savings_balance", flat=True).get(pk=member.pk)
+
+    def results(self, model, ids, decision, chunk_size=bulk.CHUNK_SIZE):
+        return [(item["id"], item["result"]) for item in bulk.review(model, ids, decision, self.admin, chunk_size)]
+
+    def test_deposit_results_and_balances(self):
+        first, second = (Deposit.objects.create(member=self.saver, amount=Decimal(a)) for a in ("25.00", "5.50"))
+        done = Deposit.objects.create(member=self.other, amount=Decimal("40.00"), status="rejected")
+        missing = done.pk + 1000
+
+        ids = [second.pk, missing, first.pk, done.pk, second.pk]
+        self.assertEqual(self.results(Deposit, ids, "approved", chunk_size=1), [
+            (second.pk, "approved"), (missing, "not_found"), (first.pk, "approved"), (done.pk, "already_processed"),
+        ])
+        self.assertEqual(self.balance(self.saver), Decimal("130.50"))
+        self.assertEqual(self.balance(self.other), Decimal("500.00"))
+        self.assertEqual(
+            sorted(LedgerEntry.objects.filter(source_type="deposit").values_list("source_id", "amount")),
+            [(first.pk, Decimal("25.00")), (second.pk, Decimal("5.50"))],
+        )
+        # Approving again changes nothing
+        self.assertEqual(self.results(Deposit, [first.pk], "approved"), [(first.pk, "already_processed")])
+        self.assertEqual(self.balance(self.saver), Decimal("130.50"))
+
+    def test_withdrawals_stop_at_the_balance(self):
+        big, medium, small = (Withdrawal.objects.create(member=self.saver, amount=Decimal(a))
+                              for a in ("60.00", "30.00", "20.00"))
+        others = Withdrawal.objects.create(member=self.other, amount=Decimal("20.00"))
+
+        # Decided in ID order: after 60 and 30 only 10.00 is left for the 20.00
+        self.assertEqual(self.results(Withdrawal, [small.pk, big.pk, medium.pk, others.pk], "approved"), [
+            (small.pk, "insufficient_funds"), (big.pk, "approved"), (medium.pk, "approved"), (others.pk, "approved"),
+        ])
+        self.assertEqual(self.balance(self.saver), Decimal("10.00"))
+        self.assertEqual(self.balance(self.other), Decimal("480.00"))
+        small.refresh_from_db()
+        self.assertEqual(small.status, "pending")
+        self.assertEqual(
+            sorted(LedgerEntry.objects.filter(source_type="withdrawal").values_list("source_id", "amount")),
+            [(big.pk, Decimal("-60.00")), (medium.pk, Decimal("-30.00")), (others.pk, Decimal("-20.00"))],
+        )
+
+    def test_rejections_leave_balances_alone(self):
+        withdrawal = Withdrawal.objects.create(member=self.saver, amount=Decimal("500.00"))
+        deposit = Deposit.objects.create(member=self.saver, amount=Decimal("5.00"))
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        for path, row in (("withdrawals", withdrawal), ("deposits", deposit)):
+            response = client.post(f"/api/savings/{path}/bulk_reject/", {"ids": [row.pk]}, format="json")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["summary"], {"rejected": 1})
+        self.assertEqual(self.balance(self.saver), Decimal("100.00"))
+        self.assertFalse(LedgerEntry.objects.exists())
@@ -2,10 +2,35 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.views import APIView
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from .models import Deposit, Withdrawal
 from .serializers import DepositSerializer, WithdrawalSerializer
 from apps.members.models import Member
+from apps.core import jobs, ledger
+from apps.core.exports import ExportMixin
+from apps.core.idempotency import IdempotentCreateMixin
+from apps.core.pagination import KeysetPagination
+from apps.core.signals import row_updated
+from . import balances, bulk
+from .tasks import bulk_review
+
+
+def claim_pending(row, new_status, user):
+    """
+    Move a pending deposit/withdrawal to `new_status` with one conditional
+    UPDATE. Returns False if another request processed it first.
+    """
+    now = timezone.now()
+    claimed = type(row).objects.filter(pk=row.pk, status="pending").update(
+        status=new_status, approved_by=user, approved_on=now,
+    )
+    if not claimed:
+        return False
+    row.status, row.approved_by, row.approved_on = new_status, user, now
+    row_updated.send(sender=type(row), instance=row, update_fields=["status", "approved_by", "approved_on"])
+    return True
 
 
 class IsAdminOrMember(permissions.BasePermission):
@@ -19,19 +44,58 @@ class IsAdminOrMember(permissions.BasePermission):
         return request.user.is_authenticated
 
 
-class DepositViewSet(viewsets.ModelViewSet):
+class BulkReviewMixin:
+    """
+    Adds POST .../bulk_approve/ and .../bulk_reject/ to a viewset (admin only).
+    Body: {"ids": [1, 2, ...]} or {"filter": {"from": "YYYY-MM-DD", "to": ..., "member": id}}.
+    With "background": true the review is queued as a job and the response
+    is 202 with the job to poll at /api/core/jobs/<id>/.
+    """
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def bulk_approve(self, request):
+        return self._bulk_review(request, "approved")
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def bulk_reject(self, request):
+        return self._bulk_review(request, "rejected")
+
+    def _bulk_review(self, request, decision):
+        model = self.queryset.model
+        try:
+            ids, more = bulk.select_ids(model, request.data)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.data.get("background"):
+            job = jobs.enqueue(
+                bulk_review, user=request.user,
+                model=model._meta.model_name, ids=ids, decision=decision, user_id=request.user.pk, more=more,
+            )
+            return Response({"job": job.pk, "status": job.status, "items": len(ids), "more": more},
+                            status=status.HTTP_202_ACCEPTED)
+
+        results = bulk.review(model, ids, decision, request.user)
+        return Response({"summary": bulk.summarize(results), "more": more, "results": results},
+                        status=status.HTTP_200_OK)
+
+
+class DepositViewSet(IdempotentCreateMixin, BulkReviewMixin, ExportMixin, viewsets.ModelViewSet):
     """
-    Handles deposit creation, listing, and admin approval/rejection.
+    Handles deposit creation (with Idempotency-Key support), listing,
+    admin approval/rejection (single or bulk) and bulk export.
     """
-    queryset = Deposit.objects.all().order_by('-created_at')
+    # Serializers and __str__ read member.user and approved_by: join them up front
+    queryset = Deposit.objects.select_related('member__user', 'approved_by').order_by('-created_at')
     serializer_class = DepositSerializer
     permission_classes = [IsAdminOrMember]
+    export_kind = "deposits"
 
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:  # Admin can view all deposits
-            return Deposit.objects.all().order_by('-created_at')
-        return Deposit.objects.filter(member=user.member_profile).order_by('-created_at')
+            return self.queryset
+        return self.queryset.filter(member=user.member_profile)
 
     def perform_create(self, serializer):
         """
@@ -45,19 +109,20 @@ class DepositViewSet(viewsets.ModelViewSet):
     def approve(self, request, pk=None):
         """
         Admin approves a pending deposit.
+        Status change and balance credit are single UPDATEs committed together,
+        so concurrent approvals neither double-process nor lose credits.
         """
         deposit = self.get_object()
         if deposit.status != "pending":
             return Response({"detail": "Deposit already processed."}, status=status.HTTP_400_BAD_REQUEST)
 
-        deposit.status = "approved"
-        deposit.approved_by = request.user
-        deposit.approved_on = timezone.now()
-        deposit.save()
-
-        # Update member’s balance
-        deposit.member.savings_balance += deposit.amount
-        deposit.member.save()
+        with transaction.atomic():
+            if not claim_pending(deposit, "approved", request.user):
+                return Response({"detail": "Deposit already processed."}, status=status.HTTP_400_BAD_REQUEST)
+            Member.objects.filter(pk=deposit.member_id).update(
+                savings_balance=F("savings_balance") + deposit.amount
+            )
+            ledger.post(deposit.member_id, "savings", deposit.amount, "deposit", deposit.pk, deposit.approved_on)
 
         return Response({"detail": f"Deposit #{deposit.id} approved successfully."}, status=status.HTTP_200_OK)
 
@@ -67,30 +132,28 @@ class DepositViewSet(viewsets.ModelViewSet):
         Admin rejects a pending deposit.
         """
         deposit = self.get_object()
-        if deposit.status != "pending":
+        if deposit.status != "pending" or not claim_pending(deposit, "rejected", request.user):
             return Response({"detail": "Deposit already processed."}, status=status.HTTP_400_BAD_REQUEST)
 
-        deposit.status = "rejected"
-        deposit.approved_by = request.user
-        deposit.approved_on = timezone.now()
-        deposit.save()
-
         return Response({"detail": f"Deposit #{deposit.id} rejected."}, status=status.HTTP_200_OK)
 
 
-class WithdrawalViewSet(viewsets.ModelViewSet):
+class WithdrawalViewSet(IdempotentCreateMixin, BulkReviewMixin, ExportMixin, viewsets.ModelViewSet):
     """
-    Handles withdrawal creation, listing, and admin approval/rejection.
+    Handles withdrawal creation (with Idempotency-Key support), listing,
+    admin approval/rejection (single or bulk) and bulk export.
     """
-    queryset = Withdrawal.objects.all().order_by('-created_at')
+    # Serializers and __str__ read member.user and approved_by: join them up front
+    queryset = Withdrawal.objects.select_related('member__user', 'approved_by').order_by('-created_at')
     serializer_class = WithdrawalSerializer
     permission_classes = [IsAdminOrMember]
+    export_kind = "withdrawals"
 
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
-            return Withdrawal.objects.all().order_by('-created_at')
-        return Withdrawal.objects.filter(member=user.member_profile).order_by('-created_at')
+            return self.queryset
+        return self.queryset.filter(member=user.member_profile)
 
     def perform_create(self, serializer):
         """
@@ -106,23 +169,25 @@ class WithdrawalViewSet(viewsets.ModelViewSet):
     def approve(self, request, pk=None):
         """
         Admin approves a pending withdrawal.
+        The debit only applies while savings_balance >= amount; if it does not,
+        the status change is rolled back with it.
         """
         withdrawal = self.get_object()
         if withdrawal.status != "pending":
             return Response({"detail": "Withdrawal already processed."}, status=status.HTTP_400_BAD_REQUEST)
 
-        member = withdrawal.member
-        if withdrawal.amount > member.savings_balance:
-            return Response({"error": "Insufficient funds to approve withdrawal."}, status=status.HTTP_400_BAD_REQUEST)
-
-        withdrawal.status = "approved"
-        withdrawal.approved_by = request.user
-        withdrawal.approved_on = timezone.now()
-        withdrawal.save()
-
-        # Deduct amount from member balance
-        member.savings_balance -= withdrawal.amount
-        member.save()
+        with transaction.atomic():
+            if not claim_pending(withdrawal, "approved", request.user):
+                return Response({"detail": "Withdrawal already processed."}, status=status.HTTP_400_BAD_REQUEST)
+            debited = Member.objects.filter(
+                pk=withdrawal.member_id, savings_balance__gte=withdrawal.amount,
+            ).update(savings_balance=F("savings_balance") - withdrawal.amount)
+            if not debited:
+                transaction.set_rollback(True)
+                return Response({"error": "Insufficient funds to approve withdrawal."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            ledger.post(withdrawal.member_id, "savings", -withdrawal.amount, "withdrawal", withdrawal.pk,
+                        withdrawal.approved_on)
 
         return Response({"detail": f"Withdrawal #{withdrawal.id} approved successfully."}, status=status.HTTP_200_OK)
 
@@ -132,14 +197,9 @@ class WithdrawalViewSet(viewsets.ModelViewSet):
         Admin rejects a pending withdrawal.
         """
         withdrawal = self.get_object()
-        if withdrawal.status != "pending":
+        if withdrawal.status != "pending" or not claim_pending(withdrawal, "rejected", request.user):
             return Response({"detail": "Withdrawal already processed."}, status=status.HTTP_400_BAD_REQUEST)
 
-        withdrawal.status = "rejected"
-        withdrawal.approved_by = request.user
-        withdrawal.approved_on = timezone.now()
-        withdrawal.save()
-
         return Response({"detail": f"Withdrawal #{withdrawal.id} rejected."}, status=status.HTTP_200_OK)
 
 
@@ -147,7 +207,12 @@ class BalanceView(APIView):
     """
     Endpoint to check a member's total savings balance.
     - Members see their own balance.
-    - Admins can view all members’ balances.
+    - Admins get a page of members' balances plus SACCO-wide totals,
+      percentiles and band counts (a snapshot refreshed in the background
+      every few minutes; see apps/savings/balances.py).
+      Query params: ?band=, ?min_balance=, ?max_balance=, ?joined_from=,
+      ?joined_to=, ?ordering=-savings_balance|savings_balance|-joined_on|joined_on,
+      ?page_size=, ?cursor= (or ?mode=offset&offset=)
     """
 
     def get(self, request):
@@ -162,9 +227,23 @@ class BalanceView(APIView):
                 "balance": member.savings_balance
             })
 
-        # Admin → all members’ balances
-        all_members = Member.objects.all().values("user__username", "savings_balance")
-        return Response({
-            "total_members": all_members.count(),
-            "balances": list(all_members)
-        })
+        # Admin → one page of members' balances + the cached distribution
+        try:
+            filters = balances.parse_params(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(balances.member_balances(filters), request, view=self)
+        response = paginator.get_paginated_response([
+            {
+                "member_id": member.pk,
+                "username": member.user.username,
+                "savings_balance": member.savings_balance,
+                "loan_balance": member.loan_balance,
+                "joined_on": member.joined_on,
+            }
+            for member in page
+        ])
+        response.data["summary"] = balances.snapshot()
+        return response
@@ -11,7 +11,12 @@ def create_staff_profile(sender, instance, created, **kwargs):
     """
     When a User is created or updated and their role is 'STAFF', ensure a Staff record exists.
     If role changes away from STAFF, optional: delete staff profile (or keep for audit).
+    Saves limited to other fields (e.g. last_login) cannot change the role and are skipped.
     """
+    update_fields = kwargs.get("update_fields")
+    if not created and update_fields is not None and "role" not in update_fields:
+        return
+
     try:
         role = getattr(instance, "role", "").lower()
     except Exception:
@@ -59,6 +59,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.core.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -102,6 +103,61 @@ DATABASES = {
     }
 }
 
+# DB_ENGINE=sqlite runs against a local SQLite file instead (benchmarks, local seeding)
+if os.getenv('DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME') or BASE_DIR / 'db.sqlite3',
+            # BEGIN IMMEDIATE: a transaction that reads before it writes waits
+            # for the write lock instead of failing with "database is locked"
+            # when a worker thread or the outbox writes at the same time
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+        }
+    }
+
+
+# Cache
+# Local memory by default; set CACHE_BACKEND/CACHE_LOCATION to share the
+# cache between processes (e.g. django.core.cache.backends.filebased.FileBasedCache)
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'saccolink'),
+    }
+}
+
+# Dashboard response cache (apps/core/cache.py), in seconds
+RESPONSE_CACHE_TTL = 60
+RESPONSE_CACHE_STALE_TTL = 300
+RESPONSE_CACHE_LOCK_TTL = 30
+
+
+# Request instrumentation (apps/core/middleware.py)
+# Query count, SQL time and render time per request, sent as Server-Timing
+# and logged to apps.core.middleware; slow requests are logged as warnings,
+# the rest at INFO (set REQUEST_TIMING_LOG_LEVEL=INFO to log every request).
+
+REQUEST_TIMING_ENABLED = os.getenv('REQUEST_TIMING_ENABLED', 'True') == 'True'
+REQUEST_TIMING_HEADER = os.getenv('REQUEST_TIMING_HEADER', 'True') == 'True'
+REQUEST_TIMING_SLOW_MS = int(os.getenv('REQUEST_TIMING_SLOW_MS', '500'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'apps.core.middleware': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_TIMING_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -151,5 +207,28 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Cursor pagination on every list view; ?page_size= up to PAGINATION_MAX_PAGE_SIZE
+    'DEFAULT_PAGINATION_CLASS': 'apps.core.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.getenv('API_PAGE_SIZE', '50')),
 }
+PAGINATION_MAX_PAGE_SIZE = int(os.getenv('PAGINATION_MAX_PAGE_SIZE', '200'))
+
+# Seconds a create response is replayed for a repeated Idempotency-Key
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', str(24 * 60 * 60)))
+
+# Who applies balance side effects after commit: 'thread' (in-process
+# background thread), 'sync' (the committing request) or 'worker'
+# (only `manage.py dispatch_outbox --loop`)
+OUTBOX_DISPATCH = os.getenv('OUTBOX_DISPATCH', 'thread')
+
+# Background jobs (`manage.py runworker`): retry backoff doubles from
+# JOB_BACKOFF_BASE up to JOB_BACKOFF_MAX seconds; workers refresh the lock
+# of their running jobs every JOB_HEARTBEAT seconds, and a job whose lock
+# is older than JOB_LOCK_TIMEOUT is assumed lost and queued again; finished
+# jobs are deleted after JOB_RETENTION seconds
+JOB_BACKOFF_BASE = int(os.getenv('JOB_BACKOFF_BASE', '10'))
+JOB_BACKOFF_MAX = int(os.getenv('JOB_BACKOFF_MAX', str(60 * 60)))
+JOB_HEARTBEAT = int(os.getenv('JOB_HEARTBEAT', '60'))
+JOB_LOCK_TIMEOUT = int(os.getenv('JOB_LOCK_TIMEOUT', str(15 * 60)))
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', str(7 * 24 * 60 * 60)))
 from datetime import timedelta
\ No newline at end of file
@@ -24,6 +24,7 @@ urlpatterns = [
     path('api/savings/', include('apps.savings.urls')),
     path('api/loans/', include('apps.loans.urls')),
     path('api/analytics/', include('apps.analytics.urls')),
+    path('api/core/', include('apps.core.urls')),
     path('api/', include('apps.staff.urls')),
     path('api/admin/', include('apps.admin_dashboard.urls')),    
 